@@ -15,42 +15,44 @@ df['group'] = pd.Categorical(df['group'], categories=['sit', 'bike', 'swim'], or
 
 #%% Define sport categories
 categories = ["swim", "run", "gym", "yoga", "footb.", "bike", "tennis", "volleyb.", "climb", "dance", "handb."]
-def categorize_sport(sport):
-    sport = sport.strip().lower()
-    if sport in categories:
-        return sport
-    return "etc"
 
+# spelling variants in the free-text answers -> category
+aliases = {"swimming": "swim", "running": "run", "jogging": "run", "fitness": "gym",
+           "football": "footb.", "soccer": "footb.", "cycling": "bike", "biking": "bike",
+           "volleyball": "volleyb.", "climbing": "climb", "bouldering": "climb",
+           "dancing": "dance", "handball": "handb."}
 
-# Split sports into lists
-df["sport_list"] = df["sport"].str.split(",")
 
-# Split sports into lists (handle NaN safely)
-df["sport_list"] = df["sport"].fillna("").apply(lambda x: x.split(",") if x else [])
+def categorize_sports(df, categories, aliases):
+    """ 
+    Split the free-text sport column and map every entry to its category.
+    Returns one row per participant & category (unknown sports -> "etc").
+    """
+    lookup = {**{c: c for c in categories}, **aliases}
 
-# Normalize and categorize
-df["sport_list"] = df["sport_list"].apply(
-    lambda x: [categorize_sport(s.strip()) for s in x]
-)
+    long_df = df[["ID", "group"]].assign(sport=df["sport"].str.lower().str.split(",")).explode("sport")
+    long_df["sport"] = long_df["sport"].str.strip()
+    long_df = long_df[long_df["sport"].fillna("") != ""]                 # no / empty answers
+    long_df["sport"] = long_df["sport"].map(lookup).fillna("etc")
+
+    return long_df.drop_duplicates(["ID", "sport"])                     # avoid double-counting per person
 
-#%% One-hot encode participants' sports ---
-rows = []
-for _, row in df.iterrows():
-    for s in set(row["sport_list"]):  # set() avoids double-counting per person
-        rows.append({"ID": row["ID"], "group": row["group"], "sport": s})
 
-long_df = pd.DataFrame(rows)
+def count_sports(long_df, df):
+    """ 
+    Number & percentage of participants per group and sport category.
+    """
+    counts = pd.crosstab(long_df["sport"], long_df["group"], dropna=False)
+    totals = df.groupby("group", observed=False)["ID"].nunique()
 
-# Count per group & sport
-counts = long_df.groupby(["group", "sport"])["ID"].nunique().reset_index(name="count")
-group_order = ["sit", "bike", "swim"]
-counts["group"] = pd.Categorical(counts["group"], categories=group_order, ordered=True)
+    counts = counts.stack().rename("count").reset_index()
+    counts["total"] = counts["group"].map(totals).astype(int)
+    counts["percentage"] = 100 * counts["count"] / counts["total"]
+    return counts
 
 
-# Convert to percentages
-group_sizes = df.groupby("group")["ID"].nunique().rename("total")
-counts = counts.merge(group_sizes, on="group")
-counts["percentage"] = 100 * counts["count"] / counts["total"]
+long_df = categorize_sports(df, categories, aliases)
+counts = count_sports(long_df, df)
 
 
 #%% Plot
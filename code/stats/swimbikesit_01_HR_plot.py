@@ -4,7 +4,15 @@ import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pingouin as pg
+from swimbikesit_cache import mixed_anova
+import swimbikesit_results as results
+import swimbikesit_correction as correction
+import swimbikesit_memory as memory
+from swimbikesit_downsample import lineplot
+from swimbikesit_kde import kdeplot
+import swimbikesit_exclusion as exclusion
+from swimbikesit_tables import load_table
+from swimbikesit_posthoc import from_long, pairwise
 
 
 
@@ -18,14 +26,15 @@ palette = ["#C0C0C0", "#CC3D3D","#1E90FF" ]
 # Load and prepare data
 df = pd.read_csv(os.path.join(path_datin, 'mek_sports01_sub_info.txt'), sep = "\t")
 df = df.iloc[:97, :]
-df = df.drop([3, 15, 22, 27, 36, 51, 58])  # Remove excluded subjects
-df = df.reset_index(drop = True)
 
-df = df.drop([10, 13, 28, 56, 61, 67, 76, 88]) # remove the other excluded subjects
+# Remove excluded subjects (no behavioural data, accuracy < 0.5)
+table = load_table([path_datin, 'Q:/data/projects/mek_sports01/eegl/derivatives/'], sources = ['sub_info', 'behav'])
+df = df.loc[~df['ID'].isin(exclusion.excluded_ids(table, [exclusion.NO_BEHAV, exclusion.ACCURACY]))]
 
 my_subs = df["ID"].tolist()
 n_subs = len(my_subs)
 
+# length [s] the recordings are cut to for the time-aligned line plots
 min_length = 1112
 
 
@@ -76,25 +85,24 @@ heart_rates_long["block"] = heart_rates_long["block"].astype("category").cat.reo
 
 # calculate ANOVA ------------------------------------------------------------
 
-my_aov = pg.mixed_anova(data = heart_rates_long, dv = 'HF', within = 'block', between = 'group', subject = 'ID')
+my_aov = mixed_anova(data = heart_rates_long, dv = 'HF', within = 'block', between = 'group', subject = 'ID')
+results.record_anova('01', 'HR', my_aov, data = heart_rates_long)
 my_aov.round(3)
 
 # significant main effects & interaction effect -> go for pairwise t-tests
 
 # pairwise t-tests to make sure all potential differences are captured
 
-# Perform pairwise comparisons
-posthoc = pg.pairwise_ttests(
-    dv="HF",  # Dependent variable
-    between="group",  # Between-group variable
-    within="block",  # Within-group variable
-    subject="ID",  # Random effect (participant)
-    data=heart_rates_long,
-    padjust="bonferroni"
-)
+# Perform pairwise comparisons (same tests as pg.pairwise_ttests, all from the per-cell statistics)
+cells = from_long(heart_rates_long, dv = 'HF', within = 'block', between = 'group', subject = 'ID')
+posthoc = pairwise(cells, test = 'auto', padjust = 'bonferroni')
 
 print(posthoc)
 
+families = results.record_pairwise('01', posthoc, outcome = 'HR', params = {'padjust': 'bonferroni'},
+                                   data = heart_rates_long, family = '01_posthoc_{contrast}')
+correction.correct('bonferroni', families = families)
+
 """ - Main effect of block for int vs. pre and int. vs. post (but not pre vs. post)
         -> HR significantly higher in int as compared to pre and post across groups
         
@@ -112,7 +120,9 @@ print(posthoc)
 
 
 # %% Initialize an empty list to hold all participant data
+memory.begin('hr_ingest')
 all_data = []
+all_samples = []
 
 df = df.reset_index(drop = True)
 
@@ -131,7 +141,8 @@ for idx, sub in enumerate(my_subs):
     # Process pre, int, post files
     for i, block in enumerate(["pre", "int", "post"]):
         
-        heart_rate_series = pd.read_csv(HR_files[i], sep=",").dropna().iloc[:min_length, 1]
+        heart_rate_full = pd.read_csv(HR_files[i], sep=",").dropna().iloc[:, 1]
+        heart_rate_series = heart_rate_full.iloc[:min_length]
         heart_rate_data = heart_rate_series.to_frame(name="heart_rate")
         
         heart_rate_data["ID"] = sub
@@ -140,6 +151,9 @@ for idx, sub in enumerate(my_subs):
         heart_rate_data["time"] = range(1, len(heart_rate_data) + 1)
                     
         all_data.append(heart_rate_data)
+        # untruncated recording for the sample-level intensity
+        all_samples.append(pd.DataFrame({'ID': sub, 'Group': df.loc[idx, 'group'], 'Block': block,
+                                         'heart_rate': heart_rate_full.to_numpy()}))
         
         
 # Combine all data into a single DataFrame
@@ -148,10 +162,29 @@ final_df = pd.concat(all_data)
 # Move the 'HR' column to the end
 columns = [col for col in final_df.columns if col != "heart_rate"] + ["heart_rate"]
 final_df = final_df[columns]
+memory.end()
+
+
+# %% sample-level intensity: every second of every recording as % HR_max --------
+
+samples = pd.concat(all_samples, ignore_index = True).merge(df[['ID', 'HR_max']], on = 'ID')
+samples['rel_hr'] = samples['heart_rate'] / samples['HR_max'] * 100
+# every subject gets the same weight per block, independent of the recording length
+samples['weight'] = 1 / samples.groupby(['ID', 'Block'])['heart_rate'].transform('size')
+samples['Group'] = pd.Categorical(samples['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
+
+fig0 = plt.figure(figsize=(3.25, 2.5))
+sns.set_style("ticks")
+ax = kdeplot(data = samples[samples['Block'] == 'int'], x = 'rel_hr', hue = 'Group', weights = 'weight',
+             palette = palette, fill = True, alpha = 0.5)
+sns.despine()
+plt.xlabel("HR intervention [% HR_max]", fontsize=10)
+plt.show()
 
 
 # %% plot -----------------------------------------------------------------------
 
+memory.begin('hr_plot')
 final_df['Group'] = pd.Categorical(final_df['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
 
 # Pre -----------------------------------------------------------------------
@@ -162,7 +195,7 @@ df_pre = final_df[final_df['Block'].str.contains("pre")]
 
 fig1 = plt.figure(figsize=(2.15, 1.4))
 sns.set_style("ticks")
-ax = sns.lineplot(data=df_pre, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
+ax = lineplot(data=df_pre, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
 sns.despine()
 
 ax.set_ylim(60, 150)
@@ -188,7 +221,7 @@ df_int = final_df[final_df['Block'].str.contains("int")]
 
 fig2 = plt.figure(figsize=(2.15, 1.4))
 sns.set_style("ticks")
-ax = sns.lineplot(data=df_int, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
+ax = lineplot(data=df_int, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
 sns.despine()
 ax.legend_.remove()
 
@@ -211,7 +244,7 @@ df_post = final_df[final_df['Block'].str.contains("post")]
 
 fig3 = plt.figure(figsize=(2.15, 1.4))
 sns.set_style("ticks")
-ax = sns.lineplot(data=df_post, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
+ax = lineplot(data=df_post, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
 sns.despine()
 sns.move_legend(ax, 'upper right',
                 ncol=1, title=None, frameon=True)
@@ -229,8 +262,8 @@ plt.show()
 
 
 fig3.savefig("hr_post.svg", dpi=300, bbox_inches='tight')
+memory.end()
 
-
-
-
-
+# memory use per stage (only with SWIMBIKESIT_MEMORY=1)
+if memory.is_enabled():
+    print(memory.report().round(1))
@@ -4,9 +4,13 @@ import seaborn as sns
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
-from statsmodels.stats.multitest import multipletests
 import numpy as np
-from scipy.stats import mannwhitneyu
+from swimbikesit_nonparametric import mannwhitney_batch, kruskal_batch
+import swimbikesit_results as results
+import swimbikesit_correction as correction
+from swimbikesit_scoring import PANAS, score, item_descriptives
+import swimbikesit_exclusion as exclusion
+from swimbikesit_tables import load_table
 
 
 file_path = 'Q:/data/projects/mek_sports01/eegl/rawdata/'
@@ -18,8 +22,9 @@ palette = ["#C0C0C0", "#CC3D3D","#1E90FF" ]
 
 df = pd.read_csv(os.path.join(file_path, 'mek_sports01_all_questionnaires.txt'), sep = "\t")
 
-# Remove already excluded subjects
-df = df.drop([3, 15, 22, 27, 36, 51, 58])
+# Remove already excluded subjects (no behavioural data)
+table = load_table([file_path, 'Q:/data/projects/mek_sports01/eegl/derivatives/'], sources = ['sub_info', 'behav'])
+df = df.loc[~df['ID'].isin(exclusion.excluded_ids(table, [exclusion.NO_BEHAV]))]
 df = df.reset_index(drop = True)
 
 ''' 
@@ -40,60 +45,47 @@ ACCURACY
 '''
 
 # remove subjects with accuracies < 0.5
-df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
+df = df.loc[~df['ID'].isin(exclusion.excluded_ids(table, [exclusion.ACCURACY]))]
 
 df['group'] = pd.Categorical(df['group'], categories=['sit', 'bike', 'swim'], ordered=True)
 
 
 #%% PANAS
 
-positive_items = ['P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8','P9', 'P10']
-negative_items = ['N1', 'N2', 'N3', 'N4', 'N5', 'N6',  'N7', 'N8',  'N9', 'N10']
-
-df['mean_positive'] = df[positive_items].mean(axis=1)
-df['mean_negative'] = df[negative_items].mean(axis=1)
+scores = score(df, [PANAS])
+df['mean_positive'] = scores['panas_positive']
+df['mean_negative'] = scores['panas_negative']
 
 
 df_long = pd.melt(df, id_vars=["ID", 'group'], value_vars= ['mean_positive', 'mean_negative'],
                   var_name="Question", value_name="Score")
 
 
-df_sit = df.loc[df['group'] == "sit"]
-df_bike = df.loc[df['group'] == "bike"]
-df_swim = df.loc[df['group'] == "swim"]
-df_PE = df.loc[df['group'] != "sit"]
-
-
 # Statistics ----------------------------------------------------------------------------------------
 
-# Positive scale difference
-u_pos, p_pos = mannwhitneyu(df_sit['mean_positive'], df_PE['mean_positive'], alternative='two-sided')
-print(f"Positive scale: U={u_pos}, p={p_pos:.4f}")
-
-# Negative scale difference
-u_neg, p_neg = mannwhitneyu(df_sit['mean_negative'], df_PE['mean_negative'], alternative='two-sided')
-print(f"Negative scale: U={u_neg}, p={p_neg:.4f}")
-
-'''Positive scale: U=456.0, p=0.0033
-Negative scale: U=606.5, p=0.1268'''
-
+# sit vs. exercise (bike & swim) and bike vs. swim, positive & negative scale
+panas_tests = mannwhitney_batch(df, ['mean_positive', 'mean_negative'], group = 'group',
+                                contrasts = [('sit-exercise', ['sit'], ['bike', 'swim']),
+                                             ('bike-swim', ['bike'], ['swim'])])
+print(panas_tests.round(4))
 
-# Positive scale difference
-u_pos, p_pos_2 = mannwhitneyu(df_bike['mean_positive'], df_swim['mean_positive'], alternative='two-sided')
-print(f"Positive scale: U={u_pos}, p={p_pos_2:.4f}")
+for _, row in panas_tests.iterrows():
+    results.record('02', 'mannwhitneyu', row['item'].replace('mean', 'panas'), statistic = row['U'], p = row['p'],
+                   groups = row['contrast'], effect_size = row['r_rb'], effect_size_type = 'rank_biserial', data = df,
+                   family = '02_panas' if row['contrast'] == 'sit-exercise' else '')
 
-# Negative scale difference
-u_neg, p_neg_2 = mannwhitneyu(df_bike['mean_negative'], df_swim['mean_negative'], alternative='two-sided')
-print(f"Negative scale: U={u_neg}, p={p_neg_2:.4f}")
+'''sit-exercise: Positive scale: U=456.0, p=0.0033
+                Negative scale: U=606.5, p=0.1268
 
+   bike-swim:   Positive scale: U=319.0, p=0.5160
+                Negative scale: U=471.0, p=0.0349'''
 
-'''Positive scale: U=319.0, p=0.5160
-Negative scale: U=471.0, p=0.0349'''
+# across all three groups
+print(kruskal_batch(df, ['mean_positive', 'mean_negative'], group = 'group').round(4))
 
 
 # correct for multiple testing with Bonferroni
-pvals = [p_pos, p_neg]
-_, pvals_bonf, _, _ = multipletests(pvals, method='bonferroni')
+pvals_bonf = correction.correct('bonferroni', families = ['02_panas'])['p_adj'].to_numpy()
 
 print("Bonferroni-corrected p-values:", pvals_bonf)
 'Bonferroni-corrected p-values: [0.00666993 0.25363515]'
@@ -150,25 +142,22 @@ plt.show()
 #%% NASA TLX
 
 item_names = ['tlx-1', 'tlx-2', 'tlx-4']
-pvals = []
-us = []
 
-df = df.drop([12])
+# remove subjects with an incomplete TLX
+df, _ = exclusion.apply(df, [exclusion.TLX_INCOMPLETE])
 
-for item in item_names:
-    u, p = mannwhitneyu(
-        df[df['group'] == 'sit'][item],
-        df[df['group'] != 'sit'][item],
-        alternative='two-sided'
-    )
-    pvals.append(p)
-    us.append(u)
+tlx_tests = mannwhitney_batch(df, item_names, group = 'group', contrasts = [('sit-exercise', ['sit'], ['bike', 'swim'])])
+
+for _, row in tlx_tests.iterrows():
+    results.record('02', 'mannwhitneyu', row['item'], statistic = row['U'], p = row['p'], groups = row['contrast'],
+                   effect_size = row['r_rb'], effect_size_type = 'rank_biserial', data = df,
+                   family = '02_tlx')
 
 # Apply Bonferroni correction
-_, pvals_bonf, _, _ = multipletests(pvals, method='bonferroni')
+tlx_corrected = correction.correct('bonferroni', families = ['02_tlx'])
 
 # Print results
-for item, raw_p, adj_p in zip(item_names, pvals, pvals_bonf):
+for item, raw_p, adj_p in zip(tlx_corrected['outcome'], tlx_corrected['p'], tlx_corrected['p_adj']):
     print(f"{item}: raw p = {raw_p:.4f}, Bonferroni-corrected p = {adj_p:.4f}")
 
    
@@ -217,92 +206,13 @@ plt.show()
 
 #%% calculate mean answers NASA tlx --------------------------------------------
 
-# separate for groups
-df_sit = df.loc[df['group'] == "sit"]
-df_bike = df.loc[df['group'] == "bike"]
-df_swim = df.loc[df['group'] == "swim"]
-
-mean_sit_mental = df_sit['tlx-1'].mean()
-std_sit_mental = df_sit['tlx-1'].std()
-
-mean_sit_physical = df_sit['tlx-2'].mean()
-std_sit_physical = df_sit['tlx-2'].std()
-
-mean_sit_effort = df_sit['tlx-4'].mean()
-std_sit_effort = df_sit['tlx-4'].std()
-
-
-
-mean_bike_mental = df_bike['tlx-1'].mean()
-std_bike_mental = df_bike['tlx-1'].std()
-
-mean_bike_physical = df_bike['tlx-2'].mean()
-std_bike_physical = df_bike['tlx-2'].std()
-
-mean_bike_effort = df_bike['tlx-4'].mean()
-std_bike_effort = df_bike['tlx-4'].std()
-
-
-mean_swim_mental = df_swim['tlx-1'].mean()
-std_swim_mental = df_swim['tlx-1'].std()
-
-mean_swim_physical = df_swim['tlx-2'].mean()
-std_swim_physical = df_swim['tlx-2'].std()
-
-mean_swim_effort = df_swim['tlx-4'].mean()
-std_swim_effort = df_swim['tlx-4'].std()
+tlx_items = item_descriptives(df, ['tlx-1', 'tlx-2', 'tlx-4'], group = 'group',
+                              labels = {'tlx-1': 'mental', 'tlx-2': 'physical', 'tlx-4': 'effort'})
+print(tlx_items)
 
 
 #%% calculate mean answers PANAS -----------------------------------------------
 
-mean_sit_active = df_sit['P1'].mean()
-std_sit_active = df_sit['P1'].std()
-
-mean_sit_strong = df_sit['P4'].mean()
-std_sit_strong = df_sit['P4'].std()
-
-mean_sit_proud = df_sit['P6'].mean()
-std_sit_proud = df_sit['P6'].std()
-
-mean_sit_alert = df_sit['P8'].mean()
-std_sit_alert = df_sit['P8'].std()
-
-
-
-mean_bike_active = df_bike['P1'].mean()
-std_bike_active = df_bike['P1'].std()
-
-mean_bike_strong = df_bike['P4'].mean()
-std_bike_strong = df_bike['P4'].std()
-
-mean_bike_proud = df_bike['P6'].mean()
-std_bike_proud = df_bike['P6'].std()
-
-mean_bike_alert = df_bike['P8'].mean()
-std_bike_alert = df_bike['P8'].std()
-
-
-
-mean_swim_active = df_swim['P1'].mean()
-std_swim_active = df_swim['P1'].std()
-
-mean_swim_strong = df_swim['P4'].mean()
-std_swim_strong = df_swim['P4'].std()
-
-mean_swim_proud = df_swim['P6'].mean()
-std_swim_proud = df_swim['P6'].std()
-
-mean_swim_alert = df_swim['P8'].mean()
-std_swim_alert = df_swim['P8'].std()
-
-
-
-
-
-
-
-
-
-
-
-
+panas_items = item_descriptives(df, ['P1', 'P4', 'P6', 'P8'], group = 'group',
+                                labels = {'P1': 'active', 'P4': 'strong', 'P6': 'proud', 'P8': 'alert'})
+print(panas_items)
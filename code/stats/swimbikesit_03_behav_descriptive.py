@@ -4,6 +4,9 @@ import pandas as pd
 import numpy as np
 import os
 import pingouin as pg
+import swimbikesit_results as results
+import swimbikesit_exclusion as exclusion
+from swimbikesit_subblocks import to_long
 
 
 file_path = 'Q:/Neuro/data/projects/mek_sports01/eegl/derivatives/'
@@ -19,41 +22,33 @@ df = pd.read_csv(os.path.join(file_path, 'performance_behav.txt'), sep="\t")
 
 # Check for outliers -------------------------------------------------------
 
-df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['accuracy_pre', 'accuracy_post'], var_name="Block", value_name="Accuracy")
-
 'Accuracy values are bounded (0–1), so the distribution is non-normal by nature, especially when values cluster near 1.'
 'Standard deviation–based criteria assume a roughly symmetric, unbounded distribution — which doesn’t hold here.'
 
 accuracy_cutoff = 0.50
 
-# Flag outliers
-df_long['Outlier'] = df_long['Accuracy'] < accuracy_cutoff
-
-# View outliers
-outliers = df_long[df_long['Outlier']]
-print(outliers)
+# Flag, view & drop outliers (accuracy below the cutoff in the pre or post block)
+df, audit = exclusion.apply(df, [exclusion.ACCURACY._replace(threshold = accuracy_cutoff)])
+print(audit)
 
-''' 
+'''
 
 ACCURACY
-            ID Group          Block  Accuracy  Outlier
-13   sports_15  swim   accuracy_pre      0.33     True
-28   sports_34  bike   accuracy_pre      0.34     True
-61   sports_70  bike   accuracy_pre      0.44     True
-88   sports_97  swim   accuracy_pre      0.34     True
-100  sports_12  swim  accuracy_post      0.40     True
-118  sports_34  bike  accuracy_post      0.33     True
-146  sports_65   sit  accuracy_post      0.46     True
-157  sports_76   sit  accuracy_post      0.34     True
-166  sports_85   sit  accuracy_post      0.38     True
-178  sports_97  swim  accuracy_post      0.33     True
+           ID      rule         column  value  threshold
+10  sports_12  accuracy  accuracy_post   0.40        0.5
+13  sports_15  accuracy   accuracy_pre   0.33        0.5
+28  sports_34  accuracy   accuracy_pre   0.34        0.5
+28  sports_34  accuracy  accuracy_post   0.33        0.5
+56  sports_65  accuracy  accuracy_post   0.46        0.5
+61  sports_70  accuracy   accuracy_pre   0.44        0.5
+67  sports_76  accuracy  accuracy_post   0.34        0.5
+76  sports_85  accuracy  accuracy_post   0.38        0.5
+88  sports_97  accuracy   accuracy_pre   0.34        0.5
+88  sports_97  accuracy  accuracy_post   0.33        0.5
 
 '''
 
 
-df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
-
-
 # %% collect descriptive data & store in table
 ### Recalled Words ###
 
@@ -249,15 +244,23 @@ summary_data.insert(loc=0, column='variable', value=variables)
 #summary_data.to_excel('descriptive_data.xlsx')
 
 
+#%% Sub-blocks (pre1, pre2, post3, post4) ----------------------------------------------------
+
+df_blocks = to_long(df, id_vars = ['ID', 'Group'], measures = ['recall', 'accuracy', 'd_prime', 'RT'])
+block_means = df_blocks.groupby(['Group', 'Block'])[['recall', 'accuracy', 'd_prime', 'RT']].mean()
+print(block_means.round(2))
+
+
 #%% List difficulty -----------------------------------------------------------------------------
 
 df = pd.read_csv(os.path.join(file_path, 'performance_table.txt'), sep="\t")  # Adjust sep as needed
-df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
+df = df.loc[~df['ID'].isin(audit['ID'])]
 
 df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['per_list_1', 'per_list_2', 'per_list_3', 'per_list_4'], var_name="Block", value_name="Recall")
 
 
 my_aov = pg.anova(data = df_long, dv = 'Recall', between = 'Block')
+results.record_anova('03', 'list_recall', my_aov, test = 'anova', data = df_long)
 my_aov.round(3)
 
 '''  Source  ddof1  ddof2      F  p-unc    np2
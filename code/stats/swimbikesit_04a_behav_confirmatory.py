@@ -7,12 +7,16 @@ import matplotlib.pyplot as plt
 from matplotlib.legend_handler import HandlerTuple
 import os
 import scipy
-import pingouin as pg
+from swimbikesit_cache import mixed_anova
+from swimbikesit_models import fit_batch
+import swimbikesit_results as results
+import swimbikesit_exclusion as exclusion
+from swimbikesit_influence import influence, summary
+import swimbikesit_assumptions as assumptions
 import math
 from matplotlib.collections import PolyCollection
 from matplotlib.colors import to_rgb
 from statsmodels.stats.weightstats import ttest_ind
-import statsmodels.formula.api as smf
 
 
 file_path = 'Q:/data/projects/mek_sports01/eegl/derivatives/'
@@ -28,7 +32,6 @@ sns.set(style="ticks", rc={"lines.linewidth": 0.7})
 
 os.chdir(file_path)
 df = pd.read_csv(os.path.join(file_path, 'performance_behav.txt'), sep="\t")
-df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['accuracy_pre', 'accuracy_post'], var_name="Block", value_name="Accuracy")
 
 
 'Accuracy values are bounded (0–1), so the distribution is non-normal by nature, especially when values cluster near 1.'
@@ -37,30 +40,27 @@ df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['accuracy_pre', 'acc
 
 accuracy_cutoff = 0.50
 
-# Flag & view outliers
-df_long['Outlier'] = df_long['Accuracy'] < accuracy_cutoff
-outliers = df_long[df_long['Outlier']]
-print(outliers)
+# Flag, view & drop outliers (accuracy below the cutoff in the pre or post block)
+df, audit = exclusion.apply(df, [exclusion.ACCURACY._replace(threshold = accuracy_cutoff)])
+print(audit)
 
-''' 
+'''
 
 ACCURACY
-            ID Group          Block  Accuracy  Outlier
-13   sports_15  swim   accuracy_pre      0.33     True
-28   sports_34  bike   accuracy_pre      0.34     True
-61   sports_70  bike   accuracy_pre      0.44     True
-88   sports_97  swim   accuracy_pre      0.34     True
-100  sports_12  swim  accuracy_post      0.40     True
-118  sports_34  bike  accuracy_post      0.33     True
-146  sports_65   sit  accuracy_post      0.46     True
-157  sports_76   sit  accuracy_post      0.34     True
-166  sports_85   sit  accuracy_post      0.38     True
-178  sports_97  swim  accuracy_post      0.33     True
+           ID      rule         column  value  threshold
+10  sports_12  accuracy  accuracy_post   0.40        0.5
+13  sports_15  accuracy   accuracy_pre   0.33        0.5
+28  sports_34  accuracy   accuracy_pre   0.34        0.5
+28  sports_34  accuracy  accuracy_post   0.33        0.5
+56  sports_65  accuracy  accuracy_post   0.46        0.5
+61  sports_70  accuracy   accuracy_pre   0.44        0.5
+67  sports_76  accuracy  accuracy_post   0.34        0.5
+76  sports_85  accuracy  accuracy_post   0.38        0.5
+88  sports_97  accuracy   accuracy_pre   0.34        0.5
+88  sports_97  accuracy  accuracy_post   0.33        0.5
 
 '''
 
-df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
-
 # additionally exclude swim group as they are only analyzed exploratorily
 df = df.loc[df['Group'] != "swim"] 
 
@@ -69,6 +69,32 @@ df_sit = df.loc[df['Group'] == "sit"]
 df_bike = df.loc[df['Group'] == "bike"]
 
 
+#%% test ANOVA assumptions for all outcomes ------------------------------------
+
+# normality per group (Shapiro-Wilk, D'Agostino, skew, kurtosis), homoscedasticity
+# (Levene, Brown-Forsythe) and sphericity (Mauchly) of pre, post and the change scores
+# of all outcomes in one table (passed: p > 0.2)
+# -> RT: checked in the reaction time section (analysed without the accuracy exclusion)
+checks = assumptions.check_wide(df, ['recall', 'accuracy'], groups = ['sit', 'bike'])
+models = assumptions.recommend(checks)
+print(models)
+
+'''
+          normal  homoscedastic  spherical  min_n  epsilon        model
+outcome
+recall      True           True       True     28      1.0  mixed_anova
+accuracy   False           True       True     25      1.0      kruskal
+
+'''
+
+# robust test of the interaction (change scores) for the outcomes failing an assumption
+robust = assumptions.robust_interaction(df, ['recall', 'accuracy'], models, groups = ['sit', 'bike'])
+for row in robust.itertuples():
+    results.record('04a', row.test, row.outcome, statistic = row.statistic, df1 = row.df1, df2 = row.df2, p = row.p,
+                   effect = 'Interaction', groups = 'bike-sit', effect_size = row.effect_size,
+                   effect_size_type = row.effect_size_type, params = {'dv': 'change'}, data = df)
+
+
 # %% Recalled words -------------------------------------------------------------
 
 
@@ -111,26 +137,16 @@ df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike'],
 
 #%% test for ANOVA assumptions -------------------------------------------------
 
-normalitytest = pg.normality(df_long['standardized_score'])
-sns.kdeplot(df_long['standardized_score'])
-
-# test for normality (p should be > 0.2)
-# -> normal distribution
-
-boxtest = pg.sphericity(df_long, dv = "standardized_score", within = "Block", subject = "ID")
+checks.loc[checks['outcome'] == 'recall']
 
-# test for sphericity (equal variances in within-subject var; p > 0.2)
-# -> sphericity is given
-
-homtest = pg.homoscedasticity(df_long, dv = "standardized_score", group = "Group")
-
-# test for homoscedasticity (equality of variance in between-subs; p > 0.2)
-# -> homoscedasticity is given
+# normality per group, homoscedasticity & sphericity (p > 0.2): see assumption checks of all outcomes
+# -> normality, homoscedasticity and sphericity are given
 
 
 #%% calculate ANOVA ------------------------------------------------------------
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('04a', 'recall', my_aov, data = df_long)
 my_aov.round(3)
 
 # -> Significant Interaction
@@ -175,6 +191,8 @@ pooled_sd = np.sqrt(((len(change_control) - 1) * np.var(change_control, ddof=1)
 cohen_d = mean_diff / pooled_sd
 
 print(f"Cohen's d = {cohen_d:.3f}")
+results.record('04a', 'welch_t', 'recall_change', statistic = tstat, df1 = df_, p = pval, groups = 'bike-sit',
+               effect_size = cohen_d, effect_size_type = 'cohen_d', data = df_wide)
 
 # Cohen's d = 0.563, medium effect size!
 
@@ -263,25 +281,16 @@ df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike'],
 
 #%% test for ANOVA assumptions -------------------------------------------------
 
-normalitytest = pg.normality(df_long['standardized_score'])
-sns.kdeplot(df_long['standardized_score'])
-
-# test for normality (p should be > 0.2)
-# -> no normal distribution, but sample size large, soo it's okay
-
-boxtest = pg.sphericity(df_long, dv = "standardized_score", within = "Block", subject = "ID")
+checks.loc[checks['outcome'] == 'accuracy']
 
-# test for sphericity (equal variances in within-subject var; p > 0.2)
-# -> sphericity is given
-
-homtest = pg.homoscedasticity(df_long, dv = "standardized_score", group = "Group")
-
-# test for homoscedasticity (equality of variance in between-subs; p > 0.2)
-# -> homoscedasticity!
+# normality per group, homoscedasticity & sphericity (p > 0.2): see assumption checks of all outcomes
+# -> change scores not normal in both groups, homoscedasticity and sphericity are given
+# -> Kruskal-Wallis test of the change scores recorded as robust alternative
 
 #%% calculate ANOVA ------------------------------------------------------------
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('04a', 'accuracy', my_aov, data = df_long)
 my_aov.round(3)
 
 # ->Interaction effect
@@ -328,6 +337,8 @@ pooled_sd = np.sqrt(((len(change_control) - 1) * np.var(change_control, ddof=1)
 cohen_d = mean_diff / pooled_sd
 
 print(f"Cohen's d = {cohen_d:.3f}")
+results.record('04a', 'welch_t', 'accuracy_change', statistic = tstat, df1 = df_, p = pval, groups = 'bike-sit',
+               effect_size = cohen_d, effect_size_type = 'cohen_d', data = df_wide)
 
 # Cohen's d = 0.567, medium effect size!
 
@@ -364,28 +375,32 @@ plt.show()
 #%% check for covariation with age
 
 # Step 1: Baseline model (replicates mixed ANOVA: Group × Time)
+# Step 2: Add Age as covariate (confounder check)
+# Step 3: Test moderation (Age × Group × Time)
+# -> nested models, fitted by ML on the same rows & compared by likelihood-ratio tests
 
 df_long = df_long.dropna()
 
-model1 = smf.mixedlm("standardized_score ~ Group * Block",
-                     data=df_long,
-                     groups=df_long["ID"])
-res1 = model1.fit()
-print(res1.summary())
+coefs, lrt = fit_batch(df_long, outcomes = ['standardized_score'],
+                       formulas = ['Group * Block', 'Group * Block + age', 'Group * Block * age'],
+                       groups = 'ID')
+print(coefs.round(3))
+print(lrt.round(3))
 
-# Step 2: Add Age as covariate (confounder check)
-model2 = smf.mixedlm("standardized_score ~ Group * Block + age",
-                     data=df_long,
-                     groups=df_long["ID"])
-res2 = model2.fit()
-print(res2.summary())
+for _, row in lrt.iterrows():
+    results.record('04a', 'mixedlm_lrt', 'accuracy', statistic = row['lr'], df1 = row['df'], p = row['p'],
+                   effect = row['formula'], params = {'parent': row['parent']}, data = df_long)
 
-# Step 3: Test moderation (Age × Group × Time)
-model3 = smf.mixedlm("standardized_score ~ Group * Block * age",
-                     data=df_long,
-                     groups=df_long["ID"])
-res3 = model3.fit()
-print(res3.summary())
+
+#%% Leave-one-subject-out influence on the interaction -----------------------
+
+# change in interaction F, p, np2 and Cohen's d of the change scores when one subject
+# is removed (all subjects & outcomes at once from downdated group sums)
+# -> RT: see the reaction time section (analysed without the accuracy exclusion)
+
+loo = influence(df, measures = ['recall', 'accuracy'], group = 'Group', groups = ['sit', 'bike'])
+print(summary(loo))
+print(loo.loc[loo['flips'], ['outcome', 'ID', 'Group', 'F', 'p', 'delta_F', 'delta_cohen_d']].round(3))
 
 
 # %% Reaction time
@@ -437,26 +452,32 @@ df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike'],
 
 # test for ANOVA assumptions -------------------------------------------------
 
-normalitytest = pg.normality(df_long['standardized_score'])
-sns.kdeplot(df_long['standardized_score'])
-
-# test for normality (p should be > 0.2)
-# -> no normal distribution, but sample size large, soo it's okay
+# normality per group, homoscedasticity & sphericity (p > 0.2) on the same sample as the ANOVA
+checks_rt = assumptions.check_wide(df, ['RT'], groups = ['sit', 'bike'])
+models_rt = assumptions.recommend(checks_rt)
+print(models_rt)
 
-boxtest = pg.sphericity(df_long, dv = "standardized_score", within = "Block", subject = "ID")
+'''
+         normal  homoscedastic  spherical  min_n  epsilon    model
+outcome
+RT        False           True       True     28      1.0  kruskal
 
-# test for sphericity (equal variances in within-subject var; p > 0.2)
-# -> sphericity is given
+'''
 
-homtest = pg.homoscedasticity(df_long, dv = "standardized_score", group = "Group")
+robust_rt = assumptions.robust_interaction(df, ['RT'], models_rt, groups = ['sit', 'bike'])
+for row in robust_rt.itertuples():
+    results.record('04a', row.test, row.outcome, statistic = row.statistic, df1 = row.df1, df2 = row.df2, p = row.p,
+                   effect = 'Interaction', groups = 'bike-sit', effect_size = row.effect_size,
+                   effect_size_type = row.effect_size_type, params = {'dv': 'change'}, data = df)
 
-# test for homoscedasticity (equality of variance in between-subs; p > 0.2)
-# -> no homoscedasticity!
+# -> change scores not normal in sit, homoscedasticity and sphericity are given
+# -> Kruskal-Wallis test of the change scores recorded as robust alternative
 
 
 #%% ANOVA
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('04a', 'RT', my_aov, data = df_long)
 my_aov.round(3)
 
 # main effect of block 
@@ -467,6 +488,14 @@ my_aov.round(3)
 2  Interaction  0.182    1   50  0.182  1.469  0.231  0.029  NaN'''
 
 
+#%% Leave-one-subject-out influence on the interaction -----------------------
+
+# same sample as the RT ANOVA (no accuracy exclusion)
+loo_rt = influence(df, measures = ['RT'], group = 'Group', groups = ['sit', 'bike'])
+print(summary(loo_rt))
+print(loo_rt.loc[loo_rt['flips'], ['outcome', 'ID', 'Group', 'F', 'p', 'delta_F', 'delta_cohen_d']].round(3))
+
+
 #%% Plotting
 
 
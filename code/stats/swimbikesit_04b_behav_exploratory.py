@@ -8,6 +8,14 @@ from matplotlib.legend_handler import HandlerTuple
 import os
 import scipy
 import pingouin as pg
+from swimbikesit_cache import mixed_anova
+import swimbikesit_results as results
+import swimbikesit_correction as correction
+import swimbikesit_exclusion as exclusion
+from swimbikesit_tables import change_scores, load_table, subject_code
+from swimbikesit_correlation import correlate
+from swimbikesit_posthoc import from_wide, pairwise
+import swimbikesit_assumptions as assumptions
 import math
 from matplotlib.collections import PolyCollection
 from matplotlib.colors import to_rgb
@@ -32,6 +40,7 @@ df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['per_list_1', 'per_l
 
 
 my_aov = pg.anova(data = df_long, dv = 'Recall', between = 'Block')
+results.record_anova('04b', 'list_recall', my_aov, test = 'anova', data = df_long)
 my_aov.round(3)
 
 '''  Source  ddof1  ddof2      F  p-unc    np2
@@ -44,7 +53,6 @@ my_aov.round(3)
 
 os.chdir(file_path)
 df = pd.read_csv(os.path.join(file_path, 'performance_behav.txt'), sep="\t")  # Adjust sep as needed
-df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['accuracy_pre', 'accuracy_post'], var_name="Block", value_name="Accuracy")
 
 
 'Accuracy values are bounded (0–1), so the distribution is non-normal by nature, especially when values cluster near 1.'
@@ -53,38 +61,59 @@ df_long = pd.melt(df, id_vars=["ID", 'Group'], value_vars= ['accuracy_pre', 'acc
 
 accuracy_cutoff = 0.50
 
-# Flag & view outliers
-df_long['Outlier'] = df_long['Accuracy'] < accuracy_cutoff
-outliers = df_long[df_long['Outlier']]
-print(outliers)
+# Flag, view & drop outliers (accuracy below the cutoff in the pre or post block)
+df, audit = exclusion.apply(df, [exclusion.ACCURACY._replace(threshold = accuracy_cutoff)])
+print(audit)
 
-''' 
+'''
 
 ACCURACY
-            ID Group          Block  Accuracy  Outlier
-13   sports_15  swim   accuracy_pre      0.33     True
-28   sports_34  bike   accuracy_pre      0.34     True
-61   sports_70  bike   accuracy_pre      0.44     True
-88   sports_97  swim   accuracy_pre      0.34     True
-100  sports_12  swim  accuracy_post      0.40     True
-118  sports_34  bike  accuracy_post      0.33     True
-146  sports_65   sit  accuracy_post      0.46     True
-157  sports_76   sit  accuracy_post      0.34     True
-166  sports_85   sit  accuracy_post      0.38     True
-178  sports_97  swim  accuracy_post      0.33     True
+           ID      rule         column  value  threshold
+10  sports_12  accuracy  accuracy_post   0.40        0.5
+13  sports_15  accuracy   accuracy_pre   0.33        0.5
+28  sports_34  accuracy   accuracy_pre   0.34        0.5
+28  sports_34  accuracy  accuracy_post   0.33        0.5
+56  sports_65  accuracy  accuracy_post   0.46        0.5
+61  sports_70  accuracy   accuracy_pre   0.44        0.5
+67  sports_76  accuracy  accuracy_post   0.34        0.5
+76  sports_85  accuracy  accuracy_post   0.38        0.5
+88  sports_97  accuracy   accuracy_pre   0.34        0.5
+88  sports_97  accuracy  accuracy_post   0.33        0.5
 
 '''
 
-
-
-df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
-
 # separate for groups
 df_sit = df.loc[df['Group'] == "sit"]
 df_bike = df.loc[df['Group'] == "bike"]
 df_swim = df.loc[df['Group'] == "swim"]
 
 
+#%% test ANOVA assumptions for all outcomes ------------------------------------
+
+# normality per group (Shapiro-Wilk, D'Agostino, skew, kurtosis), homoscedasticity
+# (Levene, Brown-Forsythe) and sphericity (Mauchly) of pre, post and the change scores
+# of all outcomes in one table (passed: p > 0.2)
+checks = assumptions.check_wide(df, ['recall', 'accuracy', 'RT'], groups = ['sit', 'bike', 'swim'])
+models = assumptions.recommend(checks)
+print(models)
+
+'''
+          normal  homoscedastic  spherical  min_n  epsilon        model
+outcome
+recall      True           True       True     23      1.0  mixed_anova
+accuracy   False           True       True     22      1.0      kruskal
+RT         False           True       True     22      1.0      kruskal
+
+'''
+
+# robust test of the interaction (change scores) for the outcomes failing an assumption
+robust = assumptions.robust_interaction(df, ['recall', 'accuracy', 'RT'], models, groups = ['sit', 'bike', 'swim'])
+for row in robust.itertuples():
+    results.record('04b', row.test, row.outcome, statistic = row.statistic, df1 = row.df1, df2 = row.df2, p = row.p,
+                   effect = 'Interaction', effect_size = row.effect_size, effect_size_type = row.effect_size_type,
+                   params = {'dv': 'change'}, data = df, family = '04b_robust')
+
+
 # %% Recalled words -------------------------------------------------------------
 
 df_long = pd.melt(df, id_vars=["ID", 'Group', 'age'], value_vars= ['recall_pre', 'recall_post'], var_name="Block", value_name="Recall")
@@ -129,27 +158,16 @@ df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', '
 
 #%% test for ANOVA assumptions -------------------------------------------------
 
-# test for normality (p should be > 0.2)
-# -> no normal distribution
-
-normalitytest = pg.normality(df_long['standardized_score'])
-sns.kdeplot(df_long['standardized_score'])
-
-# test for sphericity (equal variances in within-subject var; p > 0.2)
-# -> sphericity is given
+checks.loc[checks['outcome'] == 'recall']
 
-boxtest = pg.sphericity(df_long, dv = "standardized_score", within = "Block", subject = "ID")
-
-
-# test for homoscedasticity (equality of variance in between-subs; p > 0.2)
-# -> homoscedasticity is given
-
-homtest = pg.homoscedasticity(df_long, dv = "standardized_score", group = "Group")
+# normality per group, homoscedasticity & sphericity (p > 0.2): see assumption checks of all outcomes
+# -> normality, homoscedasticity and sphericity are given
 
 
 #%% calculate ANOVA ------------------------------------------------------------
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('04b', 'recall', my_aov, data = df_long, family = '04b_{effect}')
 my_aov.round(3)
 
 
@@ -185,12 +203,15 @@ ax.set_xticklabels(['Pre','Post'])
 
 #%% correlate change with age -------------------------------------------------
 
-df['change_recall'] = np.array(df_long[df_long['Block'] == 'recall_post']['standardized_score']) - np.array(df_long[df_long['Block'] == 'recall_pre']['standardized_score'])
+df['change_recall'] = df['ID'].map(change_scores(df_long, 'standardized_score', 'Block', 'recall_pre', 'recall_post'))
 df['Group'] = pd.Categorical(df['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
 
 df_long = pd.melt(df, id_vars=["ID", 'Group', 'age'], value_vars= 'change_recall', value_name="Recall")
 
-print(scipy.stats.pearsonr(df_long['Recall'], df_long['age']))
+corr = scipy.stats.pearsonr(df_long['Recall'], df_long['age'])
+print(corr)
+results.record('04b', 'pearsonr', 'recall_change', statistic = corr.statistic, df1 = len(df_long) - 2, p = corr.pvalue,
+               groups = 'age', data = df_long, family = '04b_age')
 
 # PearsonRResult(r = -0.042, pvalue = 0.71)
 
@@ -254,27 +275,18 @@ df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', '
 
 #%% test for ANOVA assumptions -------------------------------------------------
 
-normalitytest = pg.normality(df_long['standardized_score'])
-sns.kdeplot(df_long['standardized_score'])
-
-# test for normality (p should be > 0.2)
-# -> no normal distribution, but sample size large, soo it's okay
+checks.loc[checks['outcome'] == 'accuracy']
 
-boxtest = pg.sphericity(df_long, dv = "standardized_score", within = "Block", subject = "ID")
-
-# test for sphericity (equal variances in within-subject var; p > 0.2)
-# -> sphericity is given
-
-homtest = pg.homoscedasticity(df_long, dv = "standardized_score", group = "Group")
-
-# test for homoscedasticity (equality of variance in between-subs; p > 0.2)
-# -> homoscedasticity!
+# normality per group, homoscedasticity & sphericity (p > 0.2): see assumption checks of all outcomes
+# -> change scores not normal in all groups, homoscedasticity and sphericity are given
+# -> Kruskal-Wallis test of the change scores recorded as robust alternative
 
 
 #%% calculate ANOVA ------------------------------------------------------------
 
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('04b', 'accuracy', my_aov, data = df_long, family = '04b_{effect}')
 my_aov.round(3)
 
 # ->Interaction effect!!!
@@ -316,14 +328,17 @@ plt.show()
 
 #%% correlate change with age -------------------------------
 
-df['change_acc'] = np.array(df_long[df_long['Block'] == 'accuracy_post']['standardized_score']) - np.array(df_long[df_long['Block'] == 'accuracy_pre']['standardized_score'])
+df['change_acc'] = df['ID'].map(change_scores(df_long, 'standardized_score', 'Block', 'accuracy_pre', 'accuracy_post'))
 df['Group'] = pd.Categorical(df['Group'], categories=['sit', 'bike', 'swim' ], ordered=True)
 
 df_long_test = pd.melt(df, id_vars=["ID", 'Group', 'age'], value_vars= 'change_acc', value_name="Acc")
 
 # correlation between column 1 and column2
 df_test = df_long_test.dropna()
-print(scipy.stats.pearsonr(df_test['Acc'], df_test['age']))
+corr = scipy.stats.pearsonr(df_test['Acc'], df_test['age'])
+print(corr)
+results.record('04b', 'pearsonr', 'accuracy_change', statistic = corr.statistic, df1 = len(df_test) - 2, p = corr.pvalue,
+               groups = 'age', data = df_test, family = '04b_age')
 
 # PearsonRResult(statistic=-0.244, pvalue=0.035)
 
@@ -387,26 +402,17 @@ df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', '
 
 #%% test for ANOVA assumptions -------------------------------------------------
 
-normalitytest = pg.normality(df_long['standardized_score'])
-sns.kdeplot(df_long['standardized_score'])
-
-# test for normality (p should be > 0.2)
-# -> no normal distribution, but sample size large, soo it's okay
-
-boxtest = pg.sphericity(df_long, dv = "standardized_score", within = "Block", subject = "ID")
+checks.loc[checks['outcome'] == 'RT']
 
-# test for sphericity (equal variances in within-subject var; p > 0.2)
-# -> sphericity is given
-
-homtest = pg.homoscedasticity(df_long, dv = "standardized_score", group = "Group")
-
-# test for homoscedasticity (equality of variance in between-subs; p > 0.2)
-# -> no homoscedasticity!
+# normality per group, homoscedasticity & sphericity (p > 0.2): see assumption checks of all outcomes
+# -> change scores not normal in sit, homoscedasticity and sphericity are given
+# -> Kruskal-Wallis test of the change scores recorded as robust alternative
 
 
 #%% ANOVA
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('04b', 'RT', my_aov, data = df_long, family = '04b_{effect}')
 my_aov.round(3)
 
 # main effect of block
@@ -444,16 +450,40 @@ fig5.savefig("rt.svg", dpi=300, bbox_inches='tight')
 
 #%% correlate change with age -------------------------------
 
-df['change_rt'] = np.array(df_long[df_long['Block'] == 'RT_post']['standardized_score']) - np.array(df_long[df_long['Block'] == 'RT_pre']['standardized_score'])
+df['change_rt'] = df['ID'].map(change_scores(df_long, 'standardized_score', 'Block', 'RT_pre', 'RT_post'))
 df['Group'] = pd.Categorical(df['Group'], categories=['sit', 'bike', 'swim' ], ordered=True)
 
 df_long = pd.melt(df, id_vars=["ID", 'Group', 'age'], value_vars= 'change_rt', value_name="RT")
 
 df_test = df_long.dropna()
-print(scipy.stats.pearsonr(df_test['RT'], df_test['age']))
+corr = scipy.stats.pearsonr(df_test['RT'], df_test['age'])
+print(corr)
+results.record('04b', 'pearsonr', 'RT_change', statistic = corr.statistic, df1 = len(df_test) - 2, p = corr.pvalue,
+               groups = 'age', data = df_test, family = '04b_age')
 
 # PearsonRResult(statistic=-0.124, pvalue=0.292)
 
+#%% post hoc tests for all outcomes -----------------------------------------
+
+# Block, Group and Group-within-Block comparisons of the standardized scores (as pg.pairwise_ttests),
+# for recall, accuracy & RT at once from the per-cell means and covariances
+# -> group pairs in the pre block are zero after the standardization and are not tested
+
+cells = from_wide(df, ['recall', 'accuracy', 'RT'], groups = ['sit', 'bike', 'swim'], standardize = True)
+posthoc = pairwise(cells, test = 'auto', padjust = 'bonferroni', baseline = 'pre')
+print(posthoc.round(3))
+
+# Bonferroni per outcome and contrast, as p_corr
+families = results.record_pairwise('04b', posthoc, params = {'padjust': 'bonferroni'}, data = df,
+                                   family = '04b_posthoc_{outcome}_{contrast}')
+correction.correct('bonferroni', families = families)
+
+
+#%% correct the exploratory tests for multiple testing (Holm, per ANOVA term and for the age correlations)
+
+corrected = correction.correct('holm', families = ['04b_Group', '04b_Block', '04b_Interaction', '04b_age'])
+print(corrected[['family', 'outcome', 'effect', 'p', 'p_adj']].round(4))
+
 
 fig6 = plt.figure(figsize=(3.25,2.5))
 sns.set_style("ticks")
@@ -473,3 +503,23 @@ plt.show()
 
 #fig6.savefig("rt_age.svg", dpi=300, bbox_inches='tight')
 
+
+#%% correlate all change scores with the participant covariates -------------------------------
+
+# remaining TLX items and the relative HR intensity during the exercise block (% HR_max) from sub_info
+sub_info = load_table([file_path, 'Q:/data/projects/mek_sports01/eegl/rawdata/'], sources = ['sub_info'])
+sub_info = sub_info.reindex(subject_code(df['ID']))
+for column in ['tlx-1', 'tlx-3', 'tlx-5']:
+    df[column] = sub_info[column].to_numpy()
+df['hr_intensity'] = sub_info['relInt_int'].to_numpy()
+
+covariates = ['age', 'yot', 'regular', 'panas-p', 'panas-n', 'tlx-1', 'tlx-2', 'tlx-3', 'tlx-4', 'tlx-5', 'hr_intensity']
+corr_table = correlate(df, outcomes = ['change_recall', 'change_acc', 'change_rt'], covariates = covariates,
+                       method = 'spearman', group = 'Group', n_boot = 2000)
+print(corr_table.round(3).to_string())
+
+for row in corr_table.loc[corr_table['group'] == 'all'].itertuples():
+    results.record('04b', 'spearmanr', row.outcome, statistic = row.r, df1 = row.n - 2, p = row.p,
+                   groups = row.covariate, data = df, family = '04b_covariates')
+corrected = correction.correct('holm', families = ['04b_covariates'])
+print(corrected[['outcome', 'groups', 'statistic', 'p', 'p_adj']].round(4))
@@ -7,7 +7,12 @@ import matplotlib.pyplot as plt
 from matplotlib.legend_handler import HandlerTuple
 import os
 import scipy
-import pingouin as pg
+from swimbikesit_cache import mixed_anova
+import swimbikesit_results as results
+from swimbikesit_eeg_tables import to_array, add_contrasts, to_long
+import swimbikesit_exclusion as exclusion
+from swimbikesit_tables import load_table
+import swimbikesit_assumptions as assumptions
 import math
 from matplotlib.collections import PolyCollection
 from matplotlib.colors import to_rgb
@@ -23,6 +28,44 @@ sns.set(style="ticks", rc={"lines.linewidth": 1})
 palette = ["#C0C0C0", "#CC3D3D","#1E90FF" ]
 
 
+#%% test ANOVA assumptions for all outcomes ------------------------------------
+
+# normality per group (Shapiro-Wilk, D'Agostino, skew, kurtosis), homoscedasticity
+# (Levene, Brown-Forsythe) and sphericity (Mauchly) of pre, post and the change scores
+# of SME, NoGo amplitude & NoGo latency in one table (passed: p > 0.2); the accuracy
+# exclusions are the rows dropped below -> same subjects
+
+table = load_table([file_path, 'Q:/data/projects/mek_sports01/eegl/rawdata/'],
+                   sources = ['sub_info', 'behav', 'amp_gng', 'lat_gng', 'amp_sme'])
+table, _ = exclusion.apply(table, [exclusion.ACCURACY])
+outcomes = {'SME': ('amp_sme_Hit_Pre - amp_sme_Miss_Pre', 'amp_sme_Hit_Post - amp_sme_Miss_Post'),
+            'NoGo_amplitude': ('amp_gng_NoGo_Pre', 'amp_gng_NoGo_Post'),
+            'NoGo_latency': ('lat_gng_NoGo_Pre', 'lat_gng_NoGo_Post')}
+
+checks = assumptions.check_wide(table, outcomes, levels = ['Pre', 'Post'], groups = ['sit', 'bike'])
+models = assumptions.recommend(checks)
+print(models)
+
+'''
+                normal  homoscedastic  spherical  min_n  epsilon        model
+outcome
+SME               True          False       True     25      1.0  welch_anova
+NoGo_amplitude   False           True       True     25      1.0      kruskal
+NoGo_latency     False          False       True     25      1.0      kruskal
+
+'''
+
+# -> SME: change scores heteroscedastic (Brown-Forsythe p = 0.13) -> Welch ANOVA
+# -> NoGo amplitude & latency: change scores not normal in sit -> Kruskal-Wallis
+
+# robust test of the interaction (change scores) for the outcomes failing an assumption
+robust = assumptions.robust_interaction(table, outcomes, models, levels = ['Pre', 'Post'], groups = ['sit', 'bike'])
+for row in robust.itertuples():
+    results.record('05a', row.test, row.outcome, statistic = row.statistic, df1 = row.df1, df2 = row.df2, p = row.p,
+                   effect = 'Interaction', groups = 'bike-sit', effect_size = row.effect_size,
+                   effect_size_type = row.effect_size_type, params = {'dv': 'change'}, data = table)
+
+
 ################################################################################################
 #%% SME Metrics
 ################################################################################################
@@ -52,21 +95,23 @@ df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
 # additionally exclude swim group as they are only analyzed exploratorily
 df = df.loc[df['Group'] != "swim"] 
 
-df['SME_Pre'] = df['Hit_Pre'] - df['Miss_Pre']
-df['SME_Post'] = df['Hit_Post'] - df['Miss_Post']
+# SME = Hit - Miss
+eeg = add_contrasts(to_array(df), {'SME': ('Hit', 'Miss')})
 #%%
-df_long = pd.melt(df, id_vars=["ID", "Group"], value_vars=["SME_Pre", "SME_Post"], var_name="Block", value_name="Amplitude")
-df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
+df_long = to_long(eeg, conditions = ['SME'], value_name = 'Amplitude')
 
 # test for general SME
 my_ttest = scipy.stats.ttest_1samp(df_long['Amplitude'], 0, nan_policy = 'omit', alternative = 'greater')
+results.record('05a', 'one_sample_t', 'SME', statistic = my_ttest.statistic, df1 = my_ttest.df, p = my_ttest.pvalue,
+               params = {'popmean': 0, 'alternative': 'greater'}, data = df_long)
 my_ttest
 
 #%% TtestResult(statistic=np.float64(3.4), pvalue=np.float64(0.0005), df=np.int64(110))
 # SME is generally present
 
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('05a', 'SME', my_aov, data = df_long)
 my_aov.round(3)
 
 
@@ -114,19 +159,12 @@ df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
 df = df.loc[df['Group'] != "swim"] 
 
 
-df_long = pd.melt(df, id_vars=["ID", "Group"], value_vars=["NoGo_Pre", "NoGo_Post"],
-                  var_name="Block_Condition", value_name="Amplitude")
-
-df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
-df_long[['Condition', 'Block']] = df_long['Block_Condition'].str.split('_', expand=True)
-
-# Drop the original 'Block_Condition' column
-df_long = df_long.drop(columns=['Block_Condition'])
-df_long = df_long[['ID', 'Group', 'Block', 'Condition', 'Amplitude']]
+df_long = to_long(to_array(df), conditions = ['NoGo'], value_name = 'Amplitude')
 
 #%% test
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('05a', 'NoGo_amplitude', my_aov, data = df_long)
 my_aov.round(3)
 
 
@@ -169,20 +207,12 @@ df = pd.read_csv(os.path.join(file_path, 'Latencies_GNG.txt'), sep=",")
 df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
 df = df.loc[df['Group'] != "swim"] 
 
-df_long = pd.melt(df, id_vars=["ID", "Group"], value_vars=["NoGo_Pre", "NoGo_Post"],
-                  var_name="Block_Condition", value_name="Latency")
-df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
-
-# Split 'Block_Condition' into 'Condition' and 'Block'
-df_long[['Condition', 'Block']] = df_long['Block_Condition'].str.split('_', expand=True)
-
-# Drop the original 'Block_Condition' column
-df_long = df_long.drop(columns=['Block_Condition'])
-df_long = df_long[['ID', 'Group', 'Block', 'Condition', 'Latency']]
+df_long = to_long(to_array(df), conditions = ['NoGo'], value_name = 'Latency')
 
 #%%
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'Latency', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'Latency', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('05a', 'NoGo_latency', my_aov, data = df_long)
 my_aov.round(3)
 
 
@@ -8,6 +8,13 @@ from matplotlib.legend_handler import HandlerTuple
 import os
 import scipy
 import pingouin as pg
+from swimbikesit_cache import mixed_anova
+import swimbikesit_results as results
+from swimbikesit_eeg_tables import to_array, add_contrasts, to_long
+import swimbikesit_correction as correction
+import swimbikesit_exclusion as exclusion
+from swimbikesit_tables import load_table
+from swimbikesit_posthoc import from_wide, pairwise
 import math
 from matplotlib.collections import PolyCollection
 from matplotlib.colors import to_rgb
@@ -48,21 +55,23 @@ ACCURACY
 df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
 
 
-df['SME_Pre'] = df['Hit_Pre'] - df['Miss_Pre']
-df['SME_Post'] = df['Hit_Post'] - df['Miss_Post']
+# SME = Hit - Miss
+eeg = add_contrasts(to_array(df), {'SME': ('Hit', 'Miss')})
 #%%
-df_long = pd.melt(df, id_vars=["ID", "Group"], value_vars=["SME_Pre", "SME_Post"], var_name="Block", value_name="Amplitude")
-df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
+df_long = to_long(eeg, conditions = ['SME'], value_name = 'Amplitude')
 
 # test for general SME
 my_ttest = scipy.stats.ttest_1samp(df_long['Amplitude'], 0, nan_policy = 'omit', alternative = 'greater')
+results.record('05b', 'one_sample_t', 'SME', statistic = my_ttest.statistic, df1 = my_ttest.df, p = my_ttest.pvalue,
+               params = {'popmean': 0, 'alternative': 'greater'}, data = df_long)
 my_ttest
 
 #%% TtestResult(statistic=np.float64(4.26), pvalue=np.float64(1.7e-05), df=np.int64(151))
 # SME is generally present
 
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('05b', 'SME', my_aov, data = df_long, family = '05b_{effect}')
 my_aov.round(3)
 
 #%% plot
@@ -102,19 +111,12 @@ df = pd.read_csv(os.path.join(file_path, 'Amplitudes_GNG.txt'), sep=",")
 df = df.drop([10, 13, 28, 56, 61, 67, 76, 88]) 
 
 
-df_long = pd.melt(df, id_vars=["ID", "Group"], value_vars=["NoGo_Pre", "NoGo_Post"],
-                  var_name="Block_Condition", value_name="Amplitude")
-
-df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
-df_long[['Condition', 'Block']] = df_long['Block_Condition'].str.split('_', expand=True)
-
-# Drop the original 'Block_Condition' column
-df_long = df_long.drop(columns=['Block_Condition'])
-df_long = df_long[['ID', 'Group', 'Block', 'Condition', 'Amplitude']]
+df_long = to_long(to_array(df), conditions = ['NoGo'], value_name = 'Amplitude')
 
 #%% test
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'Amplitude', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('05b', 'NoGo_amplitude', my_aov, data = df_long, family = '05b_{effect}')
 my_aov.round(3)
 
 
@@ -156,20 +158,12 @@ os.chdir(file_path)
 df = pd.read_csv(os.path.join(file_path, 'Latencies_GNG.txt'), sep=",")
 df = df.drop([10, 13, 28, 56, 61, 67, 76, 88])
 
-df_long = pd.melt(df, id_vars=["ID", "Group"], value_vars=["NoGo_Pre", "NoGo_Post"],
-                  var_name="Block_Condition", value_name="Latency")
-df_long['Group'] = pd.Categorical(df_long['Group'], categories=['sit', 'bike', 'swim'], ordered=True)
-
-# Split 'Block_Condition' into 'Condition' and 'Block'
-df_long[['Condition', 'Block']] = df_long['Block_Condition'].str.split('_', expand=True)
-
-# Drop the original 'Block_Condition' column
-df_long = df_long.drop(columns=['Block_Condition'])
-df_long = df_long[['ID', 'Group', 'Block', 'Condition', 'Latency']]
+df_long = to_long(to_array(df), conditions = ['NoGo'], value_name = 'Latency')
 
 #%%
 
-my_aov = pg.mixed_anova(data = df_long, dv = 'Latency', within = 'Block', between = 'Group', subject = 'ID')
+my_aov = mixed_anova(data = df_long, dv = 'Latency', within = 'Block', between = 'Group', subject = 'ID')
+results.record_anova('05b', 'NoGo_latency', my_aov, data = df_long, family = '05b_{effect}')
 my_aov.round(3)
 
 
@@ -203,9 +197,38 @@ pooled_sd = np.sqrt(((len(change_control) - 1) * np.var(change_control, ddof=1)
 cohen_d = mean_diff / pooled_sd
 
 print(f"Cohen's d = {cohen_d:.3f}")
+results.record('05b', 'welch_t', 'NoGo_latency_change', statistic = tstat, df1 = df_, p = pval, groups = 'bike-sit',
+               effect_size = cohen_d, effect_size_type = 'cohen_d', data = df)
 
 # Cohen's d = 0.567, medium effect size!
 
+#%% post hoc tests for all EEG outcomes -------------------------------------
+
+# Block, Group and Group-within-Block comparisons (as pg.pairwise_ttests) of SME, NoGo amplitude
+# & NoGo latency at once; the dropped rows above are the accuracy exclusions -> same subjects
+
+table = load_table([file_path, 'Q:/data/projects/mek_sports01/eegl/rawdata/'],
+                   sources = ['sub_info', 'behav', 'amp_gng', 'lat_gng', 'amp_sme'])
+table, _ = exclusion.apply(table, [exclusion.ACCURACY])
+
+cells = from_wide(table, {'SME': ('amp_sme_Hit_Pre - amp_sme_Miss_Pre', 'amp_sme_Hit_Post - amp_sme_Miss_Post'),
+                          'NoGo_amplitude': ('amp_gng_NoGo_Pre', 'amp_gng_NoGo_Post'),
+                          'NoGo_latency': ('lat_gng_NoGo_Pre', 'lat_gng_NoGo_Post')},
+                  levels = ['Pre', 'Post'], groups = ['sit', 'bike', 'swim'])
+posthoc = pairwise(cells, test = 'auto', padjust = 'bonferroni')
+print(posthoc.round(3))
+
+# Bonferroni per outcome and contrast, as p_corr
+families = results.record_pairwise('05b', posthoc, params = {'padjust': 'bonferroni'}, data = table,
+                                   family = '05b_posthoc_{outcome}_{contrast}')
+correction.correct('bonferroni', families = families)
+
+
+#%% correct the exploratory ANOVAs for multiple testing (Holm, per ANOVA term)
+
+corrected = correction.correct('holm', families = ['05b_Group', '05b_Block', '05b_Interaction'])
+print(corrected[['family', 'outcome', 'effect', 'p', 'p_adj']].round(4))
+
 
 #%% group effect for noGO
 
@@ -0,0 +1,307 @@
+"""
+Assumption checks for the Group x Block ANOVAs of all outcomes at once.
+
+The scripts test every DV separately (pg.normality, pg.sphericity,
+pg.homoscedasticity plus a density plot). Here all outcomes of a wide table are one
+(subjects x levels x outcomes) array (see swimbikesit_posthoc.wide_values); with two
+levels the change scores (last - first level), on which the Group x Block interaction
+is the one-way ANOVA, are added as level 'change'. For every outcome x level x group
+cell the moments are computed for all cells together from group sums, and from them:
+    - skew, kurtosis : sample skewness and excess kurtosis (biased, as scipy.stats)
+                       with the z and p of the D'Agostino skewness / kurtosis tests
+    - dagostino      : D'Agostino-Pearson K^2 omnibus normality test (n >= 8)
+    - shapiro        : Shapiro-Wilk (scipy, one call per cell; no closed form)
+and per outcome x level across groups
+    - levene         : Levene's test (absolute deviations from the group means)
+    - brown_forsythe : Brown-Forsythe test (deviations from the group medians; the
+                       default of pg.homoscedasticity / scipy.stats.levene)
+and per outcome
+    - mauchly        : Mauchly's test and the Greenhouse-Geisser epsilon on the
+                       pooled within-group covariance; trivially W = 1 for two levels
+
+recommend() turns the table into one row per outcome with the model the ANOVA stage
+should use, and robust_interaction() runs the recommended rank or Welch test of the
+interaction (on the change scores) for all outcomes that need one. Following the
+comments of the scripts, assumption tests count as passed for p > 0.2, and
+non-normality is tolerated when every group has at least min_n subjects. Subjects missing a level are left out of that outcome (listwise, as the
+ANOVAs).
+
+Usage:
+    import swimbikesit_assumptions as assumptions
+
+    checks = assumptions.check_wide(df, ['recall', 'accuracy', 'RT'], groups = ['sit', 'bike'])
+    models = assumptions.recommend(checks)    # model per outcome: mixed_anova / welch_anova / kruskal / ...
+    robust = assumptions.robust_interaction(df, ['recall', 'accuracy', 'RT'], models, groups = ['sit', 'bike'])
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from swimbikesit_posthoc import cell_stats, wide_values, _onehot
+from swimbikesit_nonparametric import kruskal_batch
+
+
+COLUMNS = ['outcome', 'level', 'group', 'check', 'n', 'statistic', 'df1', 'df2', 'p', 'passed', 'epsilon']
+
+MODELS = ['mixed_anova', 'mixed_anova_gg', 'welch_anova', 'kruskal']
+
+
+#%% normality
+
+def _moments(x, onehot):
+    """ Counts, skewness g1 and kurtosis b2 (not excess) per group x column; x : subjects x columns, NaN = missing. """
+    valid = ~np.isnan(x)
+    x0 = np.where(valid, x, 0)
+    n = onehot.T @ valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (onehot.T @ x0) / n
+        dev = np.where(valid, x0 - onehot @ np.nan_to_num(mean), 0)
+        m2, m3, m4 = ((onehot.T @ dev ** k) / n for k in (2, 3, 4))
+        return n, m3 / m2 ** 1.5, m4 / m2 ** 2
+
+
+def _skewtest(g1, n):
+    """ z of D'Agostino's skewness test (as scipy.stats.skewtest), vectorised; NaN for n < 8. """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y = g1 * np.sqrt(((n + 1) * (n + 3)) / (6.0 * (n - 2)))
+        beta2 = (3.0 * (n ** 2 + 27 * n - 70) * (n + 1) * (n + 3)) / ((n - 2.0) * (n + 5) * (n + 7) * (n + 9))
+        w2 = -1 + np.sqrt(2 * (beta2 - 1))
+        delta = 1 / np.sqrt(0.5 * np.log(w2))
+        alpha = np.sqrt(2.0 / (w2 - 1))
+        y = np.where(y == 0, 1, y)
+        z = delta * np.log(y / alpha + np.sqrt((y / alpha) ** 2 + 1))
+    return np.where(n >= 8, z, np.nan)
+
+
+def _kurtosistest(b2, n):
+    """ z of the Anscombe-Glynn kurtosis test (as scipy.stats.kurtosistest), vectorised; NaN for n < 5. """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = 3.0 * (n - 1) / (n + 1)
+        var = 24.0 * n * (n - 2) * (n - 3) / ((n + 1) * (n + 1.0) * (n + 3) * (n + 5))
+        x = (b2 - expected) / np.sqrt(var)
+        sqrt_beta1 = 6.0 * (n * n - 5 * n + 2) / ((n + 7) * (n + 9)) * np.sqrt((6.0 * (n + 3) * (n + 5)) / (n * (n - 2) * (n - 3)))
+        a = 6.0 + 8.0 / sqrt_beta1 * (2.0 / sqrt_beta1 + np.sqrt(1 + 4.0 / sqrt_beta1 ** 2))
+        term1 = 1 - 2 / (9.0 * a)
+        denom = 1 + x * np.sqrt(2 / (a - 4.0))
+        term2 = np.sign(denom) * np.where(denom == 0, np.nan, ((1 - 2.0 / a) / np.abs(denom)) ** (1 / 3.0))
+        z = (term1 - term2) / np.sqrt(2 / (9.0 * a))
+    return np.where(n >= 5, z, np.nan)
+
+
+def _shapiro(x, onehot):
+    """ Shapiro-Wilk W and p per group x column (NaN for fewer than 3 values). """
+    w = np.full((onehot.shape[1], x.shape[1]), np.nan)
+    p = np.full_like(w, np.nan)
+    for g in range(onehot.shape[1]):
+        for c in range(x.shape[1]):
+            sample = x[onehot[:, g].astype(bool), c]
+            sample = sample[~np.isnan(sample)]
+            if len(sample) >= 3:
+                w[g, c], p[g, c] = stats.shapiro(sample)
+    return w, p
+
+
+#%% homoscedasticity and sphericity
+
+def _levene(x, onehot, center):
+    """ Levene (center = 'mean') or Brown-Forsythe (center = 'median') F and p per column across groups. """
+    valid = ~np.isnan(x)
+    centre = np.stack([(np.nanmean if center == 'mean' else np.nanmedian)(x[onehot[:, g].astype(bool)], axis=0)
+                       for g in range(onehot.shape[1])])
+    z = np.where(valid, np.abs(x - onehot @ np.nan_to_num(centre)), 0)
+    n, s, q = onehot.T @ valid, onehot.T @ z, onehot.T @ z ** 2
+    # groups without data of a column do not count as a group
+    k = (n > 0).sum(axis=0)
+    df_between, df_within = k - 1, n.sum(axis=0) - k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        between = np.where(n > 0, s ** 2 / n, 0).sum(axis=0)
+        ss_between = between - s.sum(axis=0) ** 2 / n.sum(axis=0)
+        ss_within = q.sum(axis=0) - between
+        f = (ss_between / df_between) / (ss_within / df_within)
+    return f, stats.f.sf(f, df_between, df_within), df_between, df_within
+
+
+def mauchly(cells):
+    """
+    Mauchly's W, chi2, df, p and the Greenhouse-Geisser epsilon per outcome, on the
+    within-group covariance pooled over the groups (df = N - groups) of CellStats.
+    """
+    n = cells.n                                                 # groups x outcomes
+    n_levels = cells.cov.shape[1]
+    k = n_levels - 1
+    if k < 2:
+        ones = np.ones(n.shape[1])
+        return ones, np.zeros_like(ones), np.zeros_like(ones), ones, ones
+    df_error = n.sum(axis=0) - (n > 0).sum(axis=0)
+    weights = np.where(n > 1, n - 1, 0)
+    pooled = np.einsum('go,gijo->oij', weights, np.nan_to_num(cells.cov)) / df_error[:, None, None]
+    # orthonormal contrasts of the levels
+    contrasts = np.linalg.qr(np.vstack([np.ones(n_levels), -np.eye(n_levels)[:k]]).T)[0][:, 1:]
+    t = np.einsum('ia,oij,jb->oab', contrasts, pooled, contrasts)
+    trace = np.trace(t, axis1=1, axis2=2)
+    w = np.linalg.det(t) / (trace / k) ** k
+    f = 1 - (2 * k ** 2 + k + 2) / (6 * k * df_error)
+    chi2 = -df_error * f * np.log(w)
+    dof = np.full_like(chi2, k * (k + 1) / 2 - 1)
+    # second-order approximation of the p-value (Anderson)
+    w2 = (k + 2) * (k - 1) * (k - 2) * (2 * k ** 3 + 6 * k ** 2 + 3 * k + 2) / (288 * (df_error * k * f) ** 2)
+    p = stats.chi2.sf(chi2, dof)
+    p = p + w2 * (stats.chi2.sf(chi2, dof + 4) - p)
+    epsilon = trace ** 2 / (k * np.einsum('oab,oba->o', t, t))
+    return w, chi2, dof, p, epsilon
+
+
+#%% table
+
+def check(values, labels, groups, levels, outcomes, alpha=0.2):
+    """
+    All assumption checks of a (subjects x levels x outcomes) array.
+    labels : group per subject; groups : group order
+    alpha : assumption tests pass for p > alpha
+    Returns a long table (COLUMNS); epsilon is the Greenhouse-Geisser epsilon (mauchly rows).
+    """
+    values = np.asarray(values, dtype=float)
+    levels, outcomes = list(levels), list(outcomes)
+    keep = pd.Series(labels).isin(groups).to_numpy()
+    values, labels = values[keep], np.asarray(labels, dtype=object)[keep]
+    # listwise per outcome: subjects missing a level are missing all levels of the outcome
+    values = np.where(np.isnan(values).any(axis=1, keepdims=True), np.nan, values)
+    cells = cell_stats(values, labels, groups, levels, outcomes)
+
+    level_names = levels + (['change'] if len(levels) == 2 else [])
+    if len(levels) == 2:
+        values = np.concatenate([values, values[:, -1:] - values[:, :1]], axis=1)
+    x = values.transpose(0, 2, 1).reshape(len(values), -1)     # subjects x (outcome, level)
+    onehot = _onehot(labels, groups)
+    n_columns = x.shape[1]
+    outcome_col = np.repeat(outcomes, len(level_names))
+    level_col = np.tile(level_names, len(outcomes))
+
+    n, g1, b2 = _moments(x, onehot)
+    z_skew, z_kurt = _skewtest(g1, n), _kurtosistest(b2, n)
+    k2 = z_skew ** 2 + z_kurt ** 2
+    w, p_shapiro = _shapiro(x, onehot)
+
+    tables = []
+    per_group = dict(outcome=np.tile(outcome_col, len(groups)), level=np.tile(level_col, len(groups)),
+                     group=np.repeat(groups, n_columns), n=n.ravel())
+    for name, statistic, df, p in (('shapiro', w, np.nan, p_shapiro),
+                                   ('dagostino', k2, 2, stats.chi2.sf(k2, 2)),
+                                   ('skew', g1, np.nan, 2 * stats.norm.sf(np.abs(z_skew))),
+                                   ('kurtosis', b2 - 3, np.nan, 2 * stats.norm.sf(np.abs(z_kurt)))):
+        tables.append(pd.DataFrame(dict(per_group, check=name, statistic=statistic.ravel(), df1=df, p=p.ravel())))
+
+    for name, center in (('levene', 'mean'), ('brown_forsythe', 'median')):
+        f, p, df1, df2 = _levene(x, onehot, center)
+        tables.append(pd.DataFrame(dict(outcome=outcome_col, level=level_col, group='all', check=name,
+                                        n=n.sum(axis=0), statistic=f, df1=df1, df2=df2, p=p)))
+
+    w, chi2, dof, p, epsilon = mauchly(cells)
+    tables.append(pd.DataFrame(dict(outcome=outcomes, level='all', group='all', check='mauchly', n=cells.n.sum(axis=0),
+                                    statistic=w, df1=dof, p=p, epsilon=epsilon)))
+
+    table = pd.concat(tables, ignore_index=True)
+    table['n'] = table['n'].astype(int)
+    table['passed'] = (table['p'] > alpha).where(table['p'].notna())
+    return table.reindex(columns=COLUMNS)
+
+
+def check_wide(df, outcomes, levels=('pre', 'post'), group='Group', groups=None, alpha=0.2):
+    """ check() of a wide table; outcomes / levels as swimbikesit_posthoc.wide_values. """
+    values, labels, groups, outcomes = wide_values(df, outcomes, levels, group, groups)
+    return check(values, labels, groups, levels, outcomes, alpha)
+
+
+#%% decision
+
+def recommend(table, min_n=30, normality='shapiro'):
+    """
+    Model per outcome from a check() table. Normality (normality = 'shapiro' or
+    'dagostino') and homoscedasticity (Brown-Forsythe) are judged on the change scores
+    if present, otherwise on all levels. In order of precedence:
+        - kruskal        : not normal and a group has fewer than min_n subjects
+                           (rank test on the change scores)
+        - welch_anova    : heteroscedastic (Welch ANOVA on the change scores)
+        - mixed_anova_gg : not spherical (Greenhouse-Geisser corrected)
+        - mixed_anova    : all assumptions met
+    Returns one row per outcome with the flags, the smallest group and the model.
+    """
+    rows = []
+    for outcome, checks in table.groupby('outcome', sort=False):
+        decisive = checks.loc[checks['level'] == 'change'] if (checks['level'] == 'change').any() else checks
+        normal = decisive.loc[decisive['check'] == normality, 'passed']
+        homoscedastic = decisive.loc[decisive['check'] == 'brown_forsythe', 'passed']
+        spherical = checks.loc[checks['check'] == 'mauchly', 'passed']
+        min_group = decisive.loc[decisive['check'] == normality, 'n'].min()
+        row = dict(outcome=outcome,
+                   normal=bool(normal.dropna().all()),
+                   homoscedastic=bool(homoscedastic.dropna().all()),
+                   spherical=bool(spherical.dropna().all()),
+                   min_n=int(min_group),
+                   epsilon=float(checks.loc[checks['check'] == 'mauchly', 'epsilon'].iloc[0]))
+        if not row['normal'] and row['min_n'] < min_n:
+            row['model'] = 'kruskal'
+        elif not row['homoscedastic']:
+            row['model'] = 'welch_anova'
+        elif not row['spherical']:
+            row['model'] = 'mixed_anova_gg'
+        else:
+            row['model'] = 'mixed_anova'
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('outcome')
+
+
+def _welch(x, onehot):
+    """ Welch ANOVA F, df1, df2, p and np2 per column across groups; x : subjects x columns, NaN = missing. """
+    valid = ~np.isnan(x)
+    x0 = np.where(valid, x, 0)
+    n = onehot.T @ valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (onehot.T @ x0) / n
+        ss = onehot.T @ np.where(valid, x0 - onehot @ np.nan_to_num(mean), 0) ** 2
+        present = n > 1
+        k = present.sum(axis=0)
+        w = np.where(present, n / (ss / (n - 1)), 0)
+        grand = np.nansum(w * mean, axis=0) / w.sum(axis=0)
+        a = np.nansum(w * (mean - grand) ** 2, axis=0) / (k - 1)
+        tmp = np.where(present, (1 - w / w.sum(axis=0)) ** 2 / (n - 1), 0).sum(axis=0)
+        f = a / (1 + 2 * (k - 2) / (k ** 2 - 1) * tmp)
+        df2 = (k ** 2 - 1) / (3 * tmp)
+        ss_between = np.nansum(n * (mean - x0.sum(axis=0) / n.sum(axis=0)) ** 2, axis=0)
+        np2 = ss_between / (ss_between + ss.sum(axis=0))
+    return f, k - 1, df2, stats.f.sf(f, k - 1, df2), np2
+
+
+def robust_interaction(df, outcomes, models, levels=('pre', 'post'), group='Group', groups=None):
+    """
+    Recommended robust test of the Group x Block interaction (one-way test of the
+    change scores last - first level) for every outcome whose model is kruskal or
+    welch_anova. outcomes, levels : as check_wide; models : recommend() table.
+    Returns one row per tested outcome with test, n, statistic, df1, df2, p and effect size.
+    """
+    values, labels, groups, names = wide_values(df, outcomes, levels, group, groups)
+    keep = pd.Series(labels).isin(groups).to_numpy()
+    change = pd.DataFrame(values[keep, -1] - values[keep, 0], columns=names)
+    change[group] = labels[keep]
+    columns = ['outcome', 'test', 'n', 'statistic', 'df1', 'df2', 'p', 'effect_size', 'effect_size_type']
+
+    tables = []
+    kruskal = [m for m in names if models.loc[m, 'model'] == 'kruskal']
+    if kruskal:
+        h = kruskal_batch(change, kruskal, group, groups)
+        tables.append(pd.DataFrame({'outcome': kruskal, 'test': 'kruskal', 'n': h['n'], 'statistic': h['H'],
+                                    'df1': h['df'], 'df2': np.nan, 'p': h['p'], 'effect_size': h['epsilon2'],
+                                    'effect_size_type': 'epsilon2'}))
+    welch = [m for m in names if models.loc[m, 'model'] == 'welch_anova']
+    if welch:
+        x = change[welch].to_numpy(dtype=float)
+        f, df1, df2, p, np2 = _welch(x, _onehot(labels[keep], groups))
+        tables.append(pd.DataFrame({'outcome': welch, 'test': 'welch_anova', 'n': (~np.isnan(x)).sum(axis=0),
+                                    'statistic': f, 'df1': df1, 'df2': df2, 'p': p, 'effect_size': np2,
+                                    'effect_size_type': 'np2'}))
+    # mixed_anova_gg only arises with more than two levels: Greenhouse-Geisser corrected mixed ANOVA
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    table = pd.concat(tables, ignore_index=True)
+    return table.iloc[np.argsort([names.index(o) for o in table['outcome']], kind='stable')].reset_index(drop=True)
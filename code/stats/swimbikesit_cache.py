@@ -0,0 +1,237 @@
+"""
+Persistent memoisation of expensive statistical calls.
+
+Wrap a function with `cached` and its return value is stored on disk, keyed on a
+stable hash of the DataFrame inputs and arguments. Re-running a Spyder cell on
+identical data then returns the stored result instead of refitting.
+
+The cache lives in SWIMBIKESIT_CACHE (default: ~/.swimbikesit_cache) and is capped
+at SWIMBIKESIT_CACHE_MB megabytes (default: 512). When the cap is exceeded the least
+recently used entries are evicted first.
+
+Usage:
+    from swimbikesit_cache import mixed_anova, fit_mixedlm, cache_info, clear_cache
+
+    my_aov = mixed_anova(data = df_long, dv = 'standardized_score', within = 'Block',
+                         between = 'Group', subject = 'ID')
+"""
+
+import os
+import sys
+import hashlib
+import pickle
+import functools
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import statsmodels.formula.api as smf
+
+from swimbikesit_trace import span
+
+
+CACHE_DIR = os.environ.get('SWIMBIKESIT_CACHE', os.path.join(os.path.expanduser('~'), '.swimbikesit_cache'))
+CACHE_MAX_BYTES = int(float(os.environ.get('SWIMBIKESIT_CACHE_MB', 512)) * 1024 ** 2)
+
+_SUFFIX = '.pkl'
+
+
+#%% hashing
+
+def _update_hash(h, obj):
+    """
+    Feed a stable byte representation of obj into the hash object h.
+    DataFrames and Series are hashed on values, index, column names and dtypes
+    (including the categories and order of categorical columns).
+    """
+    if isinstance(obj, pd.DataFrame):
+        h.update(b'DataFrame')
+        h.update(repr(list(obj.columns)).encode())
+        for col in obj.columns:
+            _update_dtype(h, obj[col].dtype)
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, pd.Series):
+        h.update(b'Series')
+        h.update(repr(obj.name).encode())
+        _update_dtype(h, obj.dtype)
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, pd.Index):
+        h.update(b'Index')
+        h.update(pd.util.hash_pandas_object(obj).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(b'ndarray')
+        h.update(str(obj.dtype).encode())
+        h.update(repr(obj.shape).encode())
+        if obj.dtype == object:
+            h.update(repr(obj.tolist()).encode())
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'dict')
+        for key in sorted(obj, key=repr):
+            _update_hash(h, key)
+            _update_hash(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(type(obj).__name__.encode())
+        for item in obj:
+            _update_hash(h, item)
+    elif callable(obj):
+        # function identity plus the version of its package, so that results of
+        # e.g. an older pingouin release are not served after an upgrade
+        module = getattr(obj, '__module__', None) or ''
+        package = sys.modules.get(module.partition('.')[0])
+        h.update(module.encode())
+        h.update(getattr(obj, '__qualname__', repr(obj)).encode())
+        h.update(str(getattr(package, '__version__', '')).encode())
+    else:
+        h.update(type(obj).__name__.encode())
+        h.update(repr(obj).encode())
+
+
+def _update_dtype(h, dtype):
+    h.update(str(dtype).encode())
+    if isinstance(dtype, pd.CategoricalDtype):
+        h.update(repr(list(dtype.categories)).encode())
+        h.update(repr(dtype.ordered).encode())
+
+
+def hash_inputs(*args, **kwargs):
+    """
+    Return a hex digest identifying the given arguments.
+    Equal data gives an equal digest across sessions and machines.
+    """
+    h = hashlib.sha1()
+    _update_hash(h, args)
+    _update_hash(h, kwargs)
+    return h.hexdigest()
+
+
+#%% storage
+
+def _entry_path(name, key):
+    return os.path.join(CACHE_DIR, f'{name}-{key}{_SUFFIX}')
+
+
+def _entries():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entries = []
+    for file_name in os.listdir(CACHE_DIR):
+        if not file_name.endswith(_SUFFIX):
+            continue
+        path = os.path.join(CACHE_DIR, file_name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        name, _, key = file_name[:-len(_SUFFIX)].rpartition('-')
+        entries.append((path, name, key, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def _evict(max_bytes):
+    """ Delete least recently used entries until the cache fits into max_bytes. """
+    entries = sorted(_entries(), key=lambda e: e[4])
+    total = sum(e[3] for e in entries)
+    for path, _, _, size, _ in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        result = pickle.load(f)
+    os.utime(path)                                  # mark as recently used
+    return result
+
+
+def _store(path, result):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        # unpicklable result -> just don't cache it
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    _evict(CACHE_MAX_BYTES)
+
+
+#%% public API
+
+def cached(func=None, *, name=None):
+    """
+    Memoise func on disk.
+    Can be used as a decorator (@cached or @cached(name='...')) or as a wrapper
+    around an existing function, e.g. mixed_anova = cached(pg.mixed_anova).
+    name : label for the cache entries (defaults to the function name)
+    """
+    if func is None:
+        return functools.partial(cached, name=name)
+
+    label = name or getattr(func, '__name__', 'call')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(label, 'cache') as s:
+            key = hash_inputs(func, args, kwargs)
+            path = _entry_path(label, key)
+            if os.path.exists(path):
+                try:
+                    result = _load(path)
+                except Exception:
+                    # corrupt or incompatible entry -> recompute
+                    result = None
+                else:
+                    wrapper.hits += 1
+                    s.set(cache='hit')
+                    return result
+            wrapper.misses += 1
+            s.set(cache='miss')
+            result = func(*args, **kwargs)
+            _store(path, result)
+            return result
+
+    wrapper.hits = 0
+    wrapper.misses = 0
+    return wrapper
+
+
+def cache_info():
+    """
+    Return a DataFrame with one row per cache entry (function, key, size, last use),
+    most recently used first.
+    """
+    info = pd.DataFrame(_entries(), columns=['path', 'function', 'key', 'bytes', 'last_used'])
+    info['last_used'] = pd.to_datetime(info['last_used'], unit='s')
+    return info.drop(columns='path').sort_values('last_used', ascending=False).reset_index(drop=True)
+
+
+def clear_cache(function=None):
+    """
+    Purge the cache.
+    function : only delete entries of this function name (e.g. 'mixed_anova')
+    """
+    for path, name, _, _, _ in _entries():
+        if function is None or name == function:
+            os.remove(path)
+
+
+#%% cached versions of the expensive calls used in the analysis scripts
+
+def _fit_mixedlm(formula, data, groups, **fit_kwargs):
+    return smf.mixedlm(formula, data=data, groups=groups).fit(**fit_kwargs)
+
+
+mixed_anova = cached(pg.mixed_anova)
+sphericity = cached(pg.sphericity)
+normality = cached(pg.normality)
+homoscedasticity = cached(pg.homoscedasticity)
+fit_mixedlm = cached(_fit_mixedlm, name='mixedlm')
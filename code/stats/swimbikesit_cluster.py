@@ -0,0 +1,231 @@
+"""
+Cluster-mass permutation test over ERP time courses (and optionally channels).
+
+Instead of collapsing every ERP to one window mean, the test statistic is computed
+at every time point (and channel), neighbouring supra-threshold points are merged
+into clusters and the cluster masses (sum of the statistic) are compared with the
+largest cluster masses obtained under permutation (Maris & Oostenveld, 2007).
+
+Tests:
+    'groups'    : group comparison of the change scores (post - pre ERPs per subject).
+                  With two blocks this is the Group x Block interaction of the mixed
+                  ANOVA: t-map for two groups, F-map for more. Group labels are permuted.
+    'onesample' : change (or difference wave) against 0, e.g. SME = Hit - Miss.
+                  Signs of the subject waves are flipped.
+
+Statistic maps of a whole chunk of permutations come from one matrix product of the
+(permutation x subject) design with the (subject x points) data; clusters along time
+are found by vectorised run detection. With a channel adjacency matrix clusters may
+also extend across neighbouring channels (connected components). Chunks of
+permutations are spread across processes.
+
+Usage:
+    from swimbikesit_cluster import cluster_test
+
+    change = erps_post - erps_pre                      # subjects x (channels x) time points
+    clusters, stat_map, null = cluster_test(change, groups = df['Group'], times = times,
+                                            n_permutations = 5000)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse, stats
+from scipy.sparse.csgraph import connected_components
+
+
+#%% statistic maps
+
+def _group_maps(X, sumsq, onehot, n):
+    """
+    t (two groups: last vs. first) or F (more groups) maps of the change scores for a
+    batch of group assignments.
+    X : (subjects x points), sumsq : total sum of squares per point,
+    onehot : (permutations x subjects x groups), n : group sizes
+    """
+    N, k = X.shape[0], len(n)
+    sums = onehot.transpose(0, 2, 1) @ X                    # permutations x groups x points
+    explained = (sums ** 2 / n[None, :, None]).sum(axis=1)
+    within = sumsq - explained
+    if k == 2:
+        diff = sums[:, 1] / n[1] - sums[:, 0] / n[0]
+        return diff / np.sqrt(within / (N - 2) * (1 / n[0] + 1 / n[1]))
+    between = explained - X.sum(axis=0) ** 2 / N
+    return (between / (k - 1)) / (within / (N - k))
+
+
+def _onesample_maps(X, sumsq, signs):
+    """ One-sample t maps for a batch of sign flips (permutations x subjects). """
+    N = len(X)
+    mean = signs @ X / N
+    var = (sumsq - N * mean ** 2) / (N - 1)
+    return mean / np.sqrt(var / N)
+
+
+#%% clusters
+
+def _runs(mask, values):
+    """
+    Clusters of consecutive True values along the last axis of mask
+    (permutations x channels x time). Returns the permutation index and the mass of
+    every cluster plus the run label of every point (-1 outside clusters).
+    """
+    start = mask.copy()
+    start[..., 1:] &= ~mask[..., :-1]
+    labels = np.cumsum(start.ravel()).reshape(mask.shape) - 1
+    labels[~mask] = -1
+    n_runs = int(start.sum())
+    mass = np.bincount(labels[mask], weights=values[mask], minlength=n_runs)
+    perm = np.broadcast_to(np.arange(mask.shape[0])[:, None, None], mask.shape)[start]
+    return perm, mass, labels
+
+
+def _components(mask, values, lattice):
+    """ Clusters across time and adjacent channels of one (channels x time) map. """
+    points = np.flatnonzero(mask.ravel())
+    labels = np.full(mask.size, -1)
+    if len(points) == 0:
+        return np.zeros(0), labels.reshape(mask.shape)
+    _, comp = connected_components(lattice[points][:, points], directed=False)
+    labels[points] = comp
+    mass = np.bincount(comp, weights=values.ravel()[points])
+    return mass, labels.reshape(mask.shape)
+
+
+def _lattice(adjacency, n_times):
+    """ Neighbourhood graph of all (channel, time) points. """
+    time_adj = sparse.diags([np.ones(n_times - 1), np.ones(n_times - 1)], [-1, 1])
+    channel_adj = sparse.csr_matrix(np.asarray(adjacency, dtype=float))
+    return (sparse.kron(channel_adj, sparse.identity(n_times)) +
+            sparse.kron(sparse.identity(channel_adj.shape[0]), time_adj)).tocsr()
+
+
+def _max_masses(maps, threshold, tail, lattice):
+    """ Largest absolute cluster mass of every map in the batch (permutations x channels x time). """
+    out = np.zeros(len(maps))
+    signs = [1, -1] if tail == 0 else [tail]
+    for sign in signs:
+        mask = maps * sign > threshold
+        if lattice is None:
+            perm, mass, _ = _runs(mask, maps)
+            np.maximum.at(out, perm, np.abs(mass))
+        else:
+            for p in range(len(maps)):
+                mass, _ = _components(mask[p], maps[p], lattice)
+                if len(mass):
+                    out[p] = max(out[p], np.abs(mass).max())
+    return out
+
+
+#%% permutations
+
+_shared = {}
+
+
+def _init_worker(data):
+    _shared.update(data)
+
+
+def _null_chunk(task):
+    n_perm, seed = task
+    rng = np.random.default_rng(seed)
+    X, sumsq, shape = _shared['X'], _shared['sumsq'], _shared['shape']
+    if _shared['test'] == 'groups':
+        codes = _shared['codes']
+        perms = np.stack([rng.permutation(codes) for _ in range(n_perm)])
+        onehot = (perms[:, :, None] == np.arange(len(_shared['n']))[None, None, :]).astype(float)
+        maps = _group_maps(X, sumsq, onehot, _shared['n'])
+    else:
+        signs = rng.choice([-1.0, 1.0], size=(n_perm, X.shape[0]))
+        maps = _onesample_maps(X, sumsq, signs)
+    maps = maps.reshape((n_perm,) + shape)
+    return _max_masses(maps, _shared['threshold'], _shared['tail'], _shared['lattice'])
+
+
+def cluster_test(X, groups=None, times=None, test='groups', n_permutations=5000, alpha_cluster=0.05,
+                 tail=0, adjacency=None, channels=None, seed=0, chunk_size=100, n_jobs=None):
+    """
+    Cluster-mass permutation test.
+    X : (subjects x time points) or (subjects x channels x time points) array, e.g.
+        change scores post - pre; subjects with missing values are dropped
+    groups : group label per subject (test = 'groups'); with two groups the t-map is
+             last minus first group in sorted order (or the order of a categorical)
+    test : 'groups' or 'onesample'
+    alpha_cluster : point-wise threshold for cluster formation (t or F quantile)
+    tail : 0 (two-sided), 1 or -1 (t maps only; F maps are always one-sided)
+    adjacency : optional (channels x channels) boolean matrix of neighbouring channels;
+                without it every channel is clustered along time on its own
+    channels : optional channel labels for the cluster table
+    chunk_size : permutations per task, n_jobs : worker processes (1 = no pool)
+
+    Returns (clusters, stat_map, null_max): one row per observed cluster with sign,
+    channel (or -1 if clusters span channels), start / end time, mass and p; the
+    observed statistic map; and the maximum cluster mass of every permutation.
+    """
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 2:
+        X = X[:, None, :]
+    keep = ~np.isnan(X).any(axis=(1, 2))
+    X = X[keep]
+    n_subjects, n_channels, n_times = X.shape
+    shape = (n_channels, n_times)
+    Xf = X.reshape(n_subjects, -1)
+    sumsq = (Xf ** 2).sum(axis=0)
+    times = np.arange(n_times) if times is None else np.asarray(times)
+
+    shared = {'X': Xf, 'sumsq': sumsq, 'shape': shape, 'test': test,
+              'lattice': None if adjacency is None else _lattice(adjacency, n_times)}
+    if test == 'groups':
+        labels = pd.Categorical(np.asarray(groups)[keep])
+        labels = labels.remove_unused_categories()
+        codes = labels.codes
+        n = np.bincount(codes).astype(float)
+        dof = (len(n) - 1, n_subjects - len(n))
+        if len(n) == 2:
+            threshold = stats.t.ppf(1 - alpha_cluster / (2 if tail == 0 else 1), dof[1])
+        else:
+            threshold, tail = stats.f.ppf(1 - alpha_cluster, *dof), 1
+        onehot = (codes[:, None] == np.arange(len(n))[None, :]).astype(float)[None]
+        observed = _group_maps(Xf, sumsq, onehot, n)[0]
+        shared.update({'codes': codes, 'n': n})
+    elif test == 'onesample':
+        threshold = stats.t.ppf(1 - alpha_cluster / (2 if tail == 0 else 1), n_subjects - 1)
+        observed = _onesample_maps(Xf, sumsq, np.ones((1, n_subjects)))[0]
+    else:
+        raise ValueError(f"unknown test: {test}")
+    shared.update({'threshold': threshold, 'tail': tail})
+    observed = observed.reshape(shape)
+
+    # null distribution of the maximum cluster mass
+    chunks = [chunk_size] * (n_permutations // chunk_size) + ([n_permutations % chunk_size] if n_permutations % chunk_size else [])
+    tasks = list(zip(chunks, np.random.SeedSequence(seed).spawn(len(chunks))))
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        _init_worker(shared)
+        null_max = [_null_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(shared,)) as pool:
+            null_max = list(pool.map(_null_chunk, tasks))
+    null_max = np.concatenate(null_max)
+
+    # observed clusters
+    rows = []
+    for sign in ([1, -1] if tail == 0 else [tail]):
+        mask = observed * sign > threshold
+        if shared['lattice'] is None:
+            _, mass, labels = _runs(mask[None], observed[None])
+            labels = labels[0]
+        else:
+            mass, labels = _components(mask, observed, shared['lattice'])
+        for cluster, cluster_mass in enumerate(mass):
+            chans, points = np.nonzero(labels == cluster)
+            rows.append({'sign': sign, 'channel': int(chans[0]) if len(np.unique(chans)) == 1 else -1,
+                         'start': times[points.min()], 'end': times[points.max()], 'n_points': len(points),
+                         'mass': cluster_mass,
+                         'p': (1 + (null_max >= abs(cluster_mass)).sum()) / (n_permutations + 1)})
+    clusters = pd.DataFrame(rows, columns=['sign', 'channel', 'start', 'end', 'n_points', 'mass', 'p'])
+    if channels is not None:
+        clusters['channel'] = [channels[c] if c >= 0 else 'multiple' for c in clusters['channel']]
+    stat_map = observed[0] if n_channels == 1 else observed
+    return clusters.sort_values('p').reset_index(drop=True), stat_map, null_max
@@ -0,0 +1,118 @@
+"""
+Run-wide multiple-comparison correction.
+
+Every test recorded in the results store (swimbikesit_results) can be tagged with
+an analysis family (record(..., family = '04b_Interaction')). At the end of a run,
+correct() adjusts the p-values of all requested families in one vectorised call
+and writes the adjusted values back to the store (columns p_adj and correction).
+Only the records of the current run (swimbikesit_results.RUN_ID) form a family, so
+results of earlier runs left in the store do not change the family size.
+
+Methods: 'bonferroni', 'holm', 'fdr_bh' (Benjamini-Hochberg), 'fdr_by'
+(Benjamini-Yekutieli) and 'maxT' (single-step max-T permutation, needs the
+permutation null distribution of the test statistics).
+
+Usage:
+    import swimbikesit_correction as correction
+
+    adjusted = correction.correct('holm', families = ['04b_Interaction'])
+"""
+
+import numpy as np
+import pandas as pd
+
+import swimbikesit_results as results
+
+
+METHODS = ['bonferroni', 'holm', 'fdr_bh', 'fdr_by', 'maxT']
+
+
+#%% adjustment
+
+def adjust(p, family, method):
+    """
+    Adjust p-values within every family at once.
+    p : array of raw p-values
+    family : array of family labels (same length as p)
+    method : 'bonferroni', 'holm', 'fdr_bh' or 'fdr_by'
+    Returns the adjusted p-values in the original order.
+    """
+    tab = pd.DataFrame({'p': np.asarray(p, dtype=float), 'family': np.asarray(family)})
+    grouped = tab.groupby('family', sort=False)['p']
+    m = grouped.transform('size').to_numpy(dtype=float)
+
+    if method == 'bonferroni':
+        return np.minimum(tab['p'].to_numpy() * m, 1)
+
+    if method == 'holm':
+        tab = tab.sort_values(['family', 'p'], kind='mergesort')
+        rank = tab.groupby('family', sort=False).cumcount().to_numpy() + 1
+        m_sorted = m[tab.index]
+        tab['adj'] = tab['p'] * (m_sorted - rank + 1)
+        tab['adj'] = tab.groupby('family', sort=False)['adj'].cummax().clip(upper=1)
+        return tab['adj'].sort_index().to_numpy()
+
+    if method in ('fdr_bh', 'fdr_by'):
+        tab = tab.sort_values(['family', 'p'], ascending=[True, False], kind='mergesort')
+        m_sorted = m[tab.index]
+        rank = m_sorted - tab.groupby('family', sort=False).cumcount().to_numpy()
+        tab['adj'] = tab['p'] * m_sorted / rank
+        if method == 'fdr_by':
+            harmonic = tab.groupby('family', sort=False)['p'].transform(lambda s: (1 / np.arange(1, len(s) + 1)).sum())
+            tab['adj'] *= harmonic
+        tab['adj'] = tab.groupby('family', sort=False)['adj'].cummin().clip(upper=1)
+        return tab['adj'].sort_index().to_numpy()
+
+    raise ValueError(f"unknown method: {method}")
+
+
+def maxt_adjust(observed, null):
+    """
+    Single-step max-T permutation adjustment (Westfall & Young).
+    observed : test statistics of the family (n_tests)
+    null : statistics of the same tests under n_perm permutations (n_perm x n_tests)
+    Returns p_adj = (1 + #(max |null| >= |observed|)) / (n_perm + 1) per test.
+    """
+    max_null = np.abs(np.asarray(null, dtype=float)).max(axis=1)
+    observed = np.abs(np.asarray(observed, dtype=float))
+    exceed = (max_null[:, None] >= observed[None, :]).sum(axis=0)
+    return (exceed + 1) / (len(max_null) + 1)
+
+
+#%% correction of recorded results
+
+def correct(method, families=None, null=None, run=None, db=None):
+    """
+    Adjust the p-values of the latest results of every family and write them back.
+    method : one of METHODS
+    families : families to correct (default: all tagged families)
+    run : run whose records are corrected (default: the current run; 'all' = the
+          latest records of all runs)
+    null : for 'maxT' only, dict family -> (n_perm x n_tests) null statistics, with
+           the tests in the order of the returned table for that family
+    Returns the corrected records.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method}")
+
+    res = results.latest(db=db) if families is None else results.latest(db=db, family=list(families))
+    if run != 'all':
+        res = res[res['run_id'] == (run or results.RUN_ID)]
+    res = res[(res['family'] != '') & res['p'].notna()].sort_values(['family', 'id']).reset_index(drop=True)
+
+    if method == 'maxT':
+        if null is None:
+            raise ValueError("method 'maxT' needs the permutation null statistics")
+        res['p_adj'] = np.nan
+        for family, rows in res.groupby('family').groups.items():
+            res.loc[rows, 'p_adj'] = maxt_adjust(res.loc[rows, 'statistic'], null[family])
+    else:
+        res['p_adj'] = adjust(res['p'], res['family'], method)
+    res['correction'] = method
+
+    con = results.connect(db)
+    with con:
+        con.executemany('UPDATE results SET p_adj = ?, correction = ? WHERE id = ?',
+                        zip(res['p_adj'].astype(float), res['correction'], res['id'].astype(int)))
+    con.close()
+    return res
@@ -0,0 +1,141 @@
+"""
+Correlation engine for outcome x covariate matrices.
+
+Correlates every outcome column (e.g. change scores of recall, accuracy and RT) with
+every covariate column (age, years of training, PANAS, TLX, HR intensity, ...) at
+once. Pearson correlations of all pairs come from masked matrix products, so missing
+values are handled pairwise (each pair uses the subjects with both values). Spearman
+correlations are Pearson correlations of the ranks, partial correlations are
+computed on the residuals after regressing out the control variables. Bootstrap
+confidence intervals resample subjects for all pairs and replicates in one batch.
+
+Usage:
+    from swimbikesit_correlation import correlate
+
+    corr = correlate(df, outcomes = ['change_recall', 'change_acc'], covariates = ['age', 'yot'],
+                     method = 'spearman', group = 'Group', n_boot = 2000)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+#%% core
+
+def _pairwise_pearson(Y, X):
+    """
+    Pearson r and n of every column pair of Y (..., subjects, p) and X (..., subjects, q)
+    using the subjects with both values. Leading axes are batch axes.
+    """
+    my, mx = ~np.isnan(Y), ~np.isnan(X)
+    Y0, X0 = np.where(my, Y, 0), np.where(mx, X, 0)
+    my, mx = my.astype(float), mx.astype(float)
+    t = lambda A: np.swapaxes(A, -1, -2)
+
+    n = t(my) @ mx
+    sy, sx = t(Y0) @ mx, t(my) @ X0
+    syy, sxx = t(Y0 ** 2) @ mx, t(my) @ X0 ** 2
+    sxy = t(Y0) @ X0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sxy - sy * sx) / np.sqrt((n * syy - sy ** 2) * (n * sxx - sx ** 2))
+    return np.clip(r, -1, 1), n
+
+
+def _rank(A):
+    """ Average ranks along the subject axis (-2), NaN stays NaN. """
+    return stats.rankdata(A, axis=-2, nan_policy='omit')
+
+
+def _residualize(A, Z):
+    """
+    Residuals of every column of A (..., subjects, p) after least squares regression
+    on Z (..., subjects, k) plus intercept, fitted on the non-missing subjects of each column.
+    """
+    Z = np.concatenate([np.ones(Z.shape[:-1] + (1,)), Z], axis=-1)
+    out = np.full_like(A, np.nan)
+    for col in range(A.shape[-1]):
+        a = A[..., col]
+        w = (~np.isnan(a)).astype(float)
+        Zw = Z * w[..., None]
+        beta = np.linalg.solve(np.swapaxes(Zw, -1, -2) @ Z, (np.swapaxes(Zw, -1, -2) @ np.nan_to_num(a)[..., None]))
+        out[..., col] = np.where(w > 0, a - (Z @ beta)[..., 0], np.nan)
+    return out
+
+
+def _correlate(Y, X, Z, method):
+    """ r and n matrices (..., p, q) for the chosen method. """
+    if Z is not None:
+        keep = ~np.isnan(Z).any(axis=-1)
+        Y = np.where(keep[..., None], Y, np.nan)
+        X = np.where(keep[..., None], X, np.nan)
+        Z = np.nan_to_num(Z)
+    if method == 'spearman':
+        Y, X = _rank(Y), _rank(X)
+        if Z is not None:
+            Z = _rank(Z)
+    elif method != 'pearson':
+        raise ValueError(f"unknown method: {method}")
+    if Z is not None:
+        Y, X = _residualize(Y, Z), _residualize(X, Z)
+    return _pairwise_pearson(Y, X)
+
+
+def _exact_spearman(Y, X, r):
+    """ Re-rank pairs whose pairwise subset differs from the columns' own subsets. """
+    my, mx = ~np.isnan(Y), ~np.isnan(X)
+    for i in range(Y.shape[1]):
+        for j in range(X.shape[1]):
+            both = my[:, i] & mx[:, j]
+            if (both != my[:, i]).any() or (both != mx[:, j]).any():
+                r[i, j] = stats.spearmanr(Y[both, i], X[both, j]).statistic if both.sum() > 2 else np.nan
+    return r
+
+
+#%% public API
+
+def correlate(df, outcomes, covariates, method='pearson', control=None, group=None,
+              n_boot=0, ci=0.95, seed=0):
+    """
+    Correlate every outcome with every covariate.
+    df : wide table (one row per subject)
+    method : 'pearson' or 'spearman'
+    control : columns to partial out (partial correlation; subjects missing any of them are dropped)
+    group : optional grouping column, adds one block of rows per group (group 'all' = everyone)
+    n_boot : bootstrap replicates for percentile confidence intervals (0 = none)
+    Returns a long table with group, outcome, covariate, n, r, p (and ci_low, ci_high).
+    """
+    outcomes, covariates = list(outcomes), list(covariates)
+    subsets = [('all', np.ones(len(df), dtype=bool))]
+    if group is not None:
+        labels = df[group]
+        levels = labels.cat.categories if isinstance(labels.dtype, pd.CategoricalDtype) else pd.unique(labels.dropna())
+        subsets += [(level, (labels == level).to_numpy()) for level in levels]
+
+    rng = np.random.default_rng(seed)
+    k = 0 if control is None else len(control)
+    tables = []
+    for label, rows in subsets:
+        Y = df.loc[rows, outcomes].to_numpy(dtype=float)
+        X = df.loc[rows, covariates].to_numpy(dtype=float)
+        Z = None if control is None else df.loc[rows, list(control)].to_numpy(dtype=float)
+
+        r, n = _correlate(Y, X, Z, method)
+        if method == 'spearman' and Z is None:
+            r = _exact_spearman(Y, X, r)
+        dof = n - 2 - k
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = r * np.sqrt(dof / (1 - r ** 2))
+        p = 2 * stats.t.sf(np.abs(t), dof)
+
+        table = pd.DataFrame({'group': label, 'outcome': np.repeat(outcomes, len(covariates)),
+                              'covariate': np.tile(covariates, len(outcomes)),
+                              'n': n.ravel().astype(int), 'r': r.ravel(), 'p': p.ravel()})
+
+        if n_boot:
+            idx = rng.integers(0, len(Y), size=(n_boot, len(Y)))
+            r_boot, _ = _correlate(Y[idx], X[idx], None if Z is None else Z[idx], method)
+            low, high = np.nanquantile(r_boot, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+            table['ci_low'], table['ci_high'] = low.ravel(), high.ravel()
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
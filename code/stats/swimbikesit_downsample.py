@@ -0,0 +1,201 @@
+"""
+Downsampling of time series for plotting.
+
+A 2.15 inch panel saved at 300 dpi is about 650 pixels wide, but the HR panels draw
+1112 samples per line (plus the CI band), and per-subject plots draw one such line
+per subject. Reducing every line to a few points per pixel column keeps the visible
+shape and makes the SVGs smaller and faster to render.
+
+    - lttb: Largest-Triangle-Three-Buckets (Steinarsson, 2013); keeps the points
+      spanning the largest triangles, i.e. peaks and turning points
+    - minmax: minimum and maximum of every bucket (exact envelope)
+    - envelope: band (e.g. CI) reduced to the lowest lower and highest upper bound
+      per bucket, so the band never gets narrower
+
+All functions work along the last axis and are vectorised over any leading axes
+(e.g. all subject lines at once); they return sample indices so that other arrays
+of the same shape can be gathered with them.
+
+lineplot() is a drop-in for the HR panels of 01 (sns.lineplot with hue): group mean
+with bootstrapped 95 % CI, both downsampled to the pixel width of the axes.
+
+Usage:
+    from swimbikesit_downsample import lttb, lineplot
+
+    idx = lttb(hr, n_out = 650)                # hr: subjects x samples
+    ax = lineplot(data = df_pre, x = 'time', y = 'heart_rate', hue = 'Group', palette = palette)
+"""
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+#%% buckets
+
+def _buckets(start, stop, n_buckets):
+    """
+    Padded (buckets x max bucket length) sample indices splitting [start, stop) into
+    n_buckets contiguous buckets, and the mask of the valid entries.
+    """
+    edges = np.floor(np.linspace(start, stop, n_buckets + 1)).astype(int)
+    lengths = np.diff(edges)
+    offsets = np.arange(lengths.max())
+    mask = offsets[None, :] < lengths[:, None]
+    idx = np.minimum(edges[:-1, None] + offsets[None, :], stop - 1)
+    return idx, mask, edges
+
+
+#%% downsampling
+
+def lttb(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    y : (..., n) array, NaN allowed (e.g. shorter recordings padded with NaN)
+    n_out : number of points to keep (first and last point included)
+    x : optional (n,) sample positions shared by all lines (default 0 .. n-1)
+    Returns (..., n_out) indices along the last axis.
+    """
+    y = np.asarray(y, dtype=float)
+    n = y.shape[-1]
+    lead = y.shape[:-1]
+    if n_out >= n or n_out < 3:
+        return np.broadcast_to(np.arange(n), lead + (n,)).copy()
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+
+    idx, mask, edges = _buckets(1, n - 1, n_out - 2)
+    # average point of every bucket (the last "bucket" is the last sample)
+    valid = ~np.isnan(y)
+    y0 = np.where(valid, y, 0)
+    counts = np.add.reduceat(valid, edges[:-1], axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y_avg = np.add.reduceat(y0, edges[:-1], axis=-1) / counts
+        x_avg = np.add.reduceat(np.where(valid, x, 0), edges[:-1], axis=-1) / counts
+    y_avg = np.concatenate([y_avg, y[..., -1:]], axis=-1)
+    x_avg = np.concatenate([x_avg, np.broadcast_to(x[-1], lead + (1,))], axis=-1)
+
+    selected = np.empty(lead + (n_out,), dtype=int)
+    selected[..., 0] = 0
+    selected[..., -1] = n - 1
+    a = np.zeros(lead, dtype=int)
+    for b in range(n_out - 2):
+        cand = idx[b][mask[b]]
+        x_a = x[a][..., None]
+        y_a = np.take_along_axis(y, a[..., None], axis=-1)
+        x_c, y_c = x_avg[..., b + 1, None], y_avg[..., b + 1, None]
+        area = np.abs((x_a - x_c) * (y[..., cand] - y_a) - (x_a - x[cand]) * (y_c - y_a))
+        a = cand[np.argmax(np.nan_to_num(area, nan=-np.inf), axis=-1)]
+        selected[..., b + 1] = a
+    return selected
+
+
+def minmax(y, n_buckets):
+    """
+    Min / max decimation: index of the minimum and the maximum of every bucket, in
+    sample order. y : (..., n) array. Returns (..., 2 * n_buckets) indices.
+    """
+    y = np.asarray(y, dtype=float)
+    n = y.shape[-1]
+    if 2 * n_buckets >= n:
+        return np.broadcast_to(np.arange(n), y.shape).copy()
+    idx, mask, _ = _buckets(0, n, n_buckets)
+    values = y[..., idx]
+    i_min = np.argmin(np.where(mask, np.nan_to_num(values, nan=np.inf), np.inf), axis=-1)
+    i_max = np.argmax(np.where(mask, np.nan_to_num(values, nan=-np.inf), -np.inf), axis=-1)
+    buckets = np.arange(n_buckets)
+    i_min, i_max = idx[buckets, i_min], idx[buckets, i_max]
+    return np.sort(np.stack([i_min, i_max], axis=-1), axis=-1).reshape(y.shape[:-1] + (2 * n_buckets,))
+
+
+def envelope(lower, upper, n_buckets, x=None):
+    """
+    Band reduced to n_buckets: bucket centre positions, lowest lower and highest
+    upper bound per bucket. lower, upper : (..., n) arrays.
+    """
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    n = lower.shape[-1]
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    if n_buckets >= n:
+        return x, lower, upper
+    idx, mask, _ = _buckets(0, n, n_buckets)
+    with np.errstate(invalid='ignore'):
+        lo = np.where(mask, lower[..., idx], np.nan)
+        hi = np.where(mask, upper[..., idx], np.nan)
+    x_mid = np.array([x[i[m]].mean() for i, m in zip(idx, mask)])
+    # keep the first and last sample so the band spans the whole line
+    x_mid[0], x_mid[-1] = x[0], x[-1]
+    return x_mid, np.nanmin(lo, axis=-1), np.nanmax(hi, axis=-1)
+
+
+#%% plotting
+
+def pixel_width(ax, dpi=300):
+    """ Width of the axes in pixels when the figure is saved at dpi. """
+    return max(int(round(ax.get_window_extent().width / ax.figure.dpi * dpi)), 3)
+
+
+def _wide(data, x, y):
+    """ (observations x positions) matrix of y, one column per unique x. """
+    positions = np.sort(data[x].unique())
+    col = np.searchsorted(positions, data[x].to_numpy())
+    row = data.groupby(x, observed=True).cumcount().to_numpy()
+    values = np.full((row.max() + 1, len(positions)), np.nan)
+    values[row, col] = data[y].to_numpy(dtype=float)
+    return positions, values
+
+
+def bootstrap_ci(values, n_boot=1000, ci=95, seed=None):
+    """
+    Mean and percentile bootstrap CI of every column of an (observations x positions)
+    matrix (NaN = no observation), all columns and resamples in one matrix product.
+    """
+    rng = np.random.default_rng(seed)
+    valid = ~np.isnan(values)
+    n = len(values)
+    counts = rng.multinomial(n, np.full(n, 1 / n), size=n_boot).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        boot = (counts @ np.where(valid, values, 0)) / (counts @ valid)
+        mean = np.nanmean(values, axis=0)
+    low, high = np.nanpercentile(boot, [(100 - ci) / 2, (100 + ci) / 2], axis=0)
+    return mean, low, high
+
+
+def lineplot(data, x, y, hue, palette=None, hue_order=None, ax=None, n_boot=1000, ci=95, seed=None,
+             dpi=300, points_per_pixel=1, units=None):
+    """
+    Mean line with bootstrapped CI band per hue level (as sns.lineplot), downsampled
+    with LTTB (line) and envelope decimation (band) to the pixel width of the axes.
+    dpi : resolution the figure will be saved at
+    units : optional column identifying lines (e.g. 'ID'); then every line is drawn
+            (downsampled together) instead of mean and CI
+    Returns the axes (with a legend titled hue, like seaborn).
+    """
+    ax = ax or plt.gca()
+    if hue_order is None:
+        column = data[hue]
+        hue_order = list(column.cat.categories) if isinstance(column.dtype, pd.CategoricalDtype) else sorted(column.dropna().unique())
+    colors = palette if palette is not None else plt.rcParams['axes.prop_cycle'].by_key()['color']
+    n_points = pixel_width(ax, dpi) * points_per_pixel
+
+    for level, color in zip(hue_order, colors):
+        subset = data[data[hue] == level]
+        if subset.empty:
+            continue
+        if units is not None:
+            lines = subset.pivot_table(index=units, columns=x, values=y, observed=True)
+            positions, values = lines.columns.to_numpy(dtype=float), lines.to_numpy(dtype=float)
+            idx = lttb(values, n_points, positions)
+            for line, (i, row) in enumerate(zip(idx, values)):
+                ax.plot(positions[i], row[i], color=color, label=str(level) if line == 0 else '_nolegend_')
+            continue
+        positions, values = _wide(subset, x, y)
+        mean, low, high = bootstrap_ci(values, n_boot, ci, seed)
+        x_band, low, high = envelope(low, high, n_points, positions)
+        ax.fill_between(x_band, low, high, color=color, alpha=0.2, linewidth=0)
+        idx = lttb(mean, n_points, positions)
+        ax.plot(positions[idx], mean[idx], color=color, label=str(level))
+
+    ax.legend(title=hue)
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return ax
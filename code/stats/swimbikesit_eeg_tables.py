@@ -0,0 +1,113 @@
+"""
+Reshaping of the EEG amplitude and latency tables.
+
+Amplitudes_GNG.txt, Latencies_GNG.txt and Amplitudes_SME.txt have one column per
+Condition_Block (e.g. Go_Pre, NoGo_Post, Hit_Pre, Miss_Post). The header is compiled
+once into a static mapping column -> (condition, block); the values are gathered into
+a (subject x condition x block) array and long tables are built from integer codes
+(pd.Categorical.from_codes), without splitting strings per row.
+
+Derived contrasts (e.g. SME = Hit - Miss, NoGo - Go) are computed on the array and
+appended as additional conditions.
+
+Usage:
+    from swimbikesit_eeg_tables import to_array, add_contrasts, to_long
+
+    eeg = add_contrasts(to_array(df), {'SME': ('Hit', 'Miss')})
+    df_long = to_long(eeg, conditions = ['SME'], value_name = 'Amplitude')
+"""
+
+import re
+import functools
+import collections
+import numpy as np
+import pandas as pd
+
+from swimbikesit_trace import traced
+
+
+COLUMN_PATTERN = re.compile(r'^(?P<condition>[A-Za-z0-9]+)_(?P<block>Pre|Post)$')
+
+BLOCK_ORDER = ['Pre', 'Post']
+
+GROUP_ORDER = ['sit', 'bike', 'swim']
+
+CONTRASTS = {'SME': ('Hit', 'Miss'), 'NoGo-Go': ('NoGo', 'Go')}
+
+ConditionBlocks = collections.namedtuple('ConditionBlocks', ['values', 'subjects', 'groups', 'conditions', 'blocks'])
+
+
+#%% schema
+
+@functools.lru_cache(maxsize=32)
+def compile_schema(columns):
+    """
+    Map the Condition_Block columns of a header (tuple of column names) to
+    condition and block indices.
+    Returns (value columns, conditions, blocks, condition index, block index).
+    """
+    matches = [(column, COLUMN_PATTERN.match(column)) for column in columns]
+    matches = [(column, match) for column, match in matches if match is not None]
+    conditions = list(dict.fromkeys(match['condition'] for _, match in matches))
+    blocks = [block for block in BLOCK_ORDER if any(match['block'] == block for _, match in matches)]
+    value_columns = tuple(column for column, _ in matches)
+    cond_idx = np.array([conditions.index(match['condition']) for _, match in matches])
+    block_idx = np.array([blocks.index(match['block']) for _, match in matches])
+    return value_columns, tuple(conditions), tuple(blocks), cond_idx, block_idx
+
+
+#%% reshaping
+
+@traced(category='reshape')
+def to_array(df, id_col='ID', group_col='Group'):
+    """
+    Gather the Condition_Block columns of df into a (subject x condition x block)
+    array. Condition / block combinations missing from the header are NaN.
+    """
+    value_columns, conditions, blocks, cond_idx, block_idx = compile_schema(tuple(df.columns))
+    values = np.full((len(df), len(conditions), len(blocks)), np.nan)
+    values[:, cond_idx, block_idx] = df[list(value_columns)].to_numpy(dtype=float)
+    groups = df[group_col].to_numpy() if group_col in df.columns else None
+    return ConditionBlocks(values, df[id_col].to_numpy(), groups, list(conditions), list(blocks))
+
+
+def add_contrasts(data, contrasts=CONTRASTS):
+    """
+    Append difference conditions to the array.
+    contrasts : dict name -> (condition, subtracted condition), e.g. {'SME': ('Hit', 'Miss')};
+                contrasts whose conditions are not in the data are skipped
+    """
+    names, diffs = [], []
+    for name, (plus, minus) in contrasts.items():
+        if plus in data.conditions and minus in data.conditions:
+            names.append(name)
+            diffs.append(data.values[:, data.conditions.index(plus)] - data.values[:, data.conditions.index(minus)])
+    if not names:
+        return data
+    values = np.concatenate([data.values, np.stack(diffs, axis=1)], axis=1)
+    return data._replace(values=values, conditions=data.conditions + names)
+
+
+@traced(category='reshape')
+def to_long(data, conditions=None, value_name='Amplitude', group_order=GROUP_ORDER):
+    """
+    Long table with columns ID, Group, Block, Condition and the value, ordered by
+    condition, block and subject (as pd.melt over the Condition_Block columns).
+    Group, Block and Condition are ordered categoricals.
+    conditions : conditions to include (default: all)
+    """
+    conditions = list(conditions or data.conditions)
+    c = [data.conditions.index(condition) for condition in conditions]
+    n_subjects, n_blocks, n_conditions = len(data.subjects), len(data.blocks), len(conditions)
+    n_rows = n_subjects * n_blocks * n_conditions
+
+    subject_codes = np.tile(np.arange(n_subjects), n_blocks * n_conditions)
+    long = pd.DataFrame({'ID': data.subjects[subject_codes]})
+    if data.groups is not None:
+        long['Group'] = pd.Categorical(data.groups[subject_codes], categories=group_order, ordered=True)
+    long['Block'] = pd.Categorical.from_codes(np.tile(np.repeat(np.arange(n_blocks), n_subjects), n_conditions),
+                                              categories=data.blocks, ordered=True)
+    long['Condition'] = pd.Categorical.from_codes(np.repeat(np.arange(n_conditions), n_blocks * n_subjects),
+                                                  categories=conditions, ordered=True)
+    long[value_name] = data.values[:, c, :].transpose(1, 2, 0).reshape(n_rows)
+    return long
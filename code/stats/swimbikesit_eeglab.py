@@ -0,0 +1,225 @@
+"""
+Reader for EEGLAB epoch files (.set header + .fdt data) with ROI window metrics.
+
+The .set header is read with scipy.io.loadmat, the float32 .fdt payload is memory
+mapped (channels x time points x trials, Fortran order), so ROI x time window x
+trial means, trial counts and ERPs only touch the samples they need instead of
+loading whole recordings as pop_loadset does.
+
+build_tables() reproduces the amplitude / latency tables of
+swimbikesit_preproc_06b_ERP_GNG.m and swimbikesit_preproc_05b_ERP_SME.m
+(Amplitudes_GNG.txt, Latencies_GNG.txt, Amplitudes_SME.txt): per file the ERP of
+the ROI channels, its mean in the component window and the latency of the peak
+(minimum for the N2, maximum for the P3) in the latency window. The latency window
+is the component window unless set separately: Latencies_GNG.txt is written by the
+first pass of the GNG script, which searches the N2 peak in 220-300 ms, before the
+amplitudes are taken in 244-324 ms.
+
+Usage:
+    import swimbikesit_eeglab as eeglab
+
+    tables = eeglab.build_tables('Q:/.../derivatives/ana_05_epo-gng/', eeglab.GNG, groups = group_of_id)
+    eeglab.write_tables(tables, 'Q:/.../derivatives/', 'GNG')
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import scipy.io
+
+
+# condition: ROI channels, window [ms] (inclusive), peak polarity, optional
+# latency_window [ms] of the peak search (default: window)
+GNG = {
+    'tokens': {'circle': 'NoGo', 'square': 'Go'},
+    'components': {
+        'Go':   {'channels': ['Pz'], 'window': (300, 600), 'peak': 'max'},     # P3
+        'NoGo': {'channels': ['Fz'], 'window': (244, 324), 'latency_window': (220, 300), 'peak': 'min'},     # N2
+    },
+}
+
+SME = {
+    'tokens': {'hit': 'Hit', 'miss': 'Miss'},
+    'components': {
+        'Hit':  {'channels': ['P3', 'Pz', 'P4'], 'window': (440, 840), 'peak': 'max'},
+        'Miss': {'channels': ['P3', 'Pz', 'P4'], 'window': (440, 840), 'peak': 'max'},
+    },
+}
+
+BLOCK_TOKENS = {'pre': 'Pre', 'post': 'Post'}
+
+
+#%% reading
+
+def read_header(set_path):
+    """
+    Header of an EEGLAB .set file.
+    Returns a dict with nbchan, pnts, trials, srate, times (ms), labels and data
+    (path of the .fdt file, or the data array if it is stored inside the .set file).
+    Files saved in MATLAB's -v7.3 (HDF5) format are not supported by loadmat.
+    """
+    mat = scipy.io.loadmat(set_path, squeeze_me=True, struct_as_record=False)
+    if 'EEG' in mat:                                # saved as one struct
+        eeg = mat['EEG']
+        get = lambda field: getattr(eeg, field, None)
+    else:                                           # pop_saveset: one variable per field
+        get = mat.get
+
+    header = {field: int(get(field)) for field in ('nbchan', 'pnts', 'trials')}
+    header['srate'] = float(get('srate'))
+    times = np.atleast_1d(np.asarray(get('times'), dtype=float))
+    if times.size != header['pnts']:
+        times = (float(get('xmin')) + np.arange(header['pnts']) / header['srate']) * 1000
+    header['times'] = np.round(times, 6)
+    chanlocs = np.atleast_1d(get('chanlocs'))
+    header['labels'] = [str(chan.labels) for chan in chanlocs]
+
+    data = get('data')
+    if isinstance(data, str):
+        data = os.path.join(os.path.dirname(set_path), data)
+    header['data'] = data
+    return header
+
+
+def open_data(header):
+    """ Memory-mapped (channels x time points x trials) view of the epoch data. """
+    shape = (header['nbchan'], header['pnts'], header['trials'])
+    if isinstance(header['data'], str):
+        return np.memmap(header['data'], dtype='<f4', mode='r', shape=shape, order='F')
+    return np.asarray(header['data'], dtype=np.float32).reshape(shape, order='F')
+
+
+def write_set(set_path, data, srate, xmin, labels):
+    """
+    Write a minimal EEGLAB .set/.fdt pair (e.g. synthetic data for checks).
+    data : (channels x time points x trials) array
+    xmin : epoch start in seconds
+    """
+    data = np.asarray(data, dtype='<f4')
+    if data.ndim == 2:
+        data = data[:, :, None]
+    nbchan, pnts, trials = data.shape
+    fdt_name = os.path.splitext(os.path.basename(set_path))[0] + '.fdt'
+    data.ravel(order='F').tofile(os.path.join(os.path.dirname(set_path), fdt_name))
+    chanlocs = np.zeros(nbchan, dtype=[('labels', object)])
+    chanlocs['labels'] = labels
+    scipy.io.savemat(set_path, {
+        'nbchan': nbchan, 'pnts': pnts, 'trials': trials, 'srate': float(srate), 'xmin': float(xmin),
+        'xmax': float(xmin + (pnts - 1) / srate), 'times': (xmin + np.arange(pnts) / srate) * 1000,
+        'chanlocs': chanlocs, 'data': fdt_name,
+    })
+
+
+#%% metrics
+
+def _window(times, window):
+    """ Index slice of the time points from window[0] to window[1] ms (inclusive). """
+    start = int(np.argmin(np.abs(times - window[0])))
+    stop = int(np.argmin(np.abs(times - window[1])))
+    return slice(start, stop + 1)
+
+
+def _channels(header, channels):
+    missing = [chan for chan in channels if chan not in header['labels']]
+    if missing:
+        raise KeyError(f'channels not in data: {missing}')
+    return sorted(header['labels'].index(chan) for chan in channels)
+
+
+def roi_trials(data, header, channels, window):
+    """ Mean over the ROI channels and the time window for every trial (n_trials,). """
+    return data[_channels(header, channels), _window(header['times'], window), :].mean(axis=(0, 1))
+
+
+def roi_erp(data, header, channels):
+    """ ERP of the ROI: mean over trials and ROI channels (n_time_points,). """
+    return data[_channels(header, channels), :, :].mean(axis=2).mean(axis=0)
+
+
+def window_metrics(erp, times, window, peak='max'):
+    """
+    Mean amplitude of an ERP in the window and latency [ms] of its peak there.
+    erp : (..., n_time_points) array, the metrics are computed along the last axis
+    peak : 'max' or 'min'
+    """
+    window = _window(times, window)
+    segment = erp[..., window]
+    position = segment.argmax(axis=-1) if peak == 'max' else segment.argmin(axis=-1)
+    return segment.mean(axis=-1), times[window][position]
+
+
+def file_metrics(set_path, components, tokens):
+    """
+    Condition, block, trial count, ERP, window amplitude and peak latency of one
+    .set file. Condition and block are taken from tokens in the file name.
+    """
+    name = os.path.basename(set_path).lower()
+    condition = next((cond for token, cond in tokens.items() if token in name), None)
+    block = next((blk for token, blk in BLOCK_TOKENS.items() if token in name), None)
+    if condition is None or block is None:
+        return None
+
+    header = read_header(set_path)
+    data = open_data(header)
+    component = components[condition]
+    erp = roi_erp(data, header, component['channels'])
+    amplitude, _ = window_metrics(erp, header['times'], component['window'], component['peak'])
+    _, latency = window_metrics(erp, header['times'], component.get('latency_window', component['window']),
+                                component['peak'])
+    return {'condition': condition, 'block': block, 'trials': header['trials'], 'times': header['times'],
+            'erp': erp, 'amplitude': float(amplitude), 'latency': float(latency)}
+
+
+#%% tables
+
+def build_tables(epoch_dir, paradigm, groups=None):
+    """
+    Amplitude, latency and trial count tables of all subjects.
+    epoch_dir : directory with one folder per subject (folder name = ID) holding the .set files
+    paradigm : GNG or SME (file name tokens and component definitions)
+    groups : optional dict ID -> group
+    Returns a dict with the tables 'amplitudes', 'latencies', 'trials' (columns ID,
+    Group, <Condition>_<Block>) and the ERPs ('erps': subjects x conditions x blocks x
+    time points, 'times', 'conditions', 'blocks').
+    """
+    conditions = list(paradigm['components'])
+    blocks = list(BLOCK_TOKENS.values())
+    columns = [f'{cond}_{block}' for block in blocks for cond in conditions]
+    subjects = sorted(entry for entry in os.listdir(epoch_dir) if os.path.isdir(os.path.join(epoch_dir, entry)))
+
+    values = {key: np.full((len(subjects), len(columns)), np.nan) for key in ('amplitudes', 'latencies', 'trials')}
+    erps, times = {}, None
+    for s, subject in enumerate(subjects):
+        sub_dir = os.path.join(epoch_dir, subject)
+        for file_name in sorted(f for f in os.listdir(sub_dir) if f.endswith('.set')):
+            metrics = file_metrics(os.path.join(sub_dir, file_name), paradigm['components'], paradigm['tokens'])
+            if metrics is None:
+                continue
+            col = columns.index(f"{metrics['condition']}_{metrics['block']}")
+            values['amplitudes'][s, col] = metrics['amplitude']
+            values['latencies'][s, col] = metrics['latency']
+            values['trials'][s, col] = metrics['trials']
+            erps[s, conditions.index(metrics['condition']), blocks.index(metrics['block'])] = metrics['erp']
+            times = metrics['times']
+
+    tables = {}
+    for key, array in values.items():
+        table = pd.DataFrame(array, columns=columns)
+        table.insert(0, 'ID', subjects)
+        table.insert(1, 'Group', [groups.get(subject) for subject in subjects] if groups is not None else np.nan)
+        tables[key] = table
+
+    erp_array = np.full((len(subjects), len(conditions), len(blocks), 0 if times is None else len(times)), np.nan)
+    for index, erp in erps.items():
+        erp_array[index] = erp
+    tables.update({'erps': erp_array, 'times': times, 'conditions': conditions, 'blocks': blocks})
+    return tables
+
+
+def write_tables(tables, path_out, name):
+    """
+    Write the tables as the MATLAB scripts do (comma separated):
+    Amplitudes_<name>.txt, Latencies_<name>.txt and TrialCounts_<name>.txt.
+    """
+    for key, prefix in (('amplitudes', 'Amplitudes'), ('latencies', 'Latencies'), ('trials', 'TrialCounts')):
+        tables[key].to_csv(os.path.join(path_out, f'{prefix}_{name}.txt'), sep=',', index=False)
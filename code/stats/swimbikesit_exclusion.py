@@ -0,0 +1,186 @@
+"""
+Declarative exclusion rules.
+
+Exclusion criteria are declared once as rules on the columns of the wide (one row
+per subject) tables instead of being re-derived and hard-coded as row positions in
+every script. A rule flags a subject if any of its columns
+    'below'   : is smaller than the threshold (e.g. accuracy < 0.5)
+    'above'   : is larger than the threshold (e.g. HR dropout > 20 %)
+    'mad'     : deviates more than threshold robust SDs (1.4826 * MAD) from the
+                median, optionally within each group
+    'missing' : is missing (e.g. no EEG amplitudes)
+or, for 'expr', if the pandas expression in columns is true.
+
+All rules are evaluated together: the values of all rule columns are compared with
+their thresholds as one (subjects x columns) matrix, which is cached on the hash of
+the data and the rules. Both the (subjects x rules) boolean matrix and the audit
+table (which rule and column value excluded whom) are reduced from it.
+
+Usage:
+    import swimbikesit_exclusion as exclusion
+
+    df, audit = exclusion.apply(df, [exclusion.ACCURACY])
+    print(audit)
+"""
+
+import collections
+import numpy as np
+import pandas as pd
+
+from swimbikesit_cache import cached
+
+
+Rule = collections.namedtuple('Rule', ['name', 'kind', 'columns', 'threshold', 'by'], defaults=(None, None))
+
+KINDS = ['below', 'above', 'mad', 'missing', 'expr']
+
+# accuracy < 0.5 in the pre or post Go/NoGo block (reproduces the exclusions of 03, 04a, 04b)
+ACCURACY = Rule('accuracy', 'below', ('accuracy_pre', 'accuracy_post'), 0.5)
+
+# no behavioural data, i.e. excluded during data collection (not in performance_behav.txt;
+# reproduces the first exclusions of 01 and 02 on sub_info / the questionnaires)
+NO_BEHAV = Rule('no_behav', 'missing', ('recall_pre', 'recall_post'))
+
+# incomplete NASA TLX (reproduces the TLX exclusion of 02)
+TLX_INCOMPLETE = Rule('tlx_incomplete', 'missing', ('tlx-1', 'tlx-2', 'tlx-3', 'tlx-4', 'tlx-5'))
+
+# RT more than 3 robust SDs from the group median
+RT_MAD = Rule('rt_mad', 'mad', ('RT_pre', 'RT_post'), 3, by='Group')
+
+# more than 20 % of the HR samples missing (columns of swimbikesit_tables.hr_features with hr_dir)
+HR_DROPOUT = Rule('hr_dropout', 'above', ('hr_dropout_pre', 'hr_dropout_int', 'hr_dropout_post'), 0.2)
+
+# no Go/NoGo or SME amplitudes (columns of swimbikesit_tables.load_table)
+MISSING_EEG = Rule('missing_eeg', 'missing', ('amp_gng_Go_Pre', 'amp_gng_Go_Post', 'amp_gng_NoGo_Pre',
+                                              'amp_gng_NoGo_Post', 'amp_sme_Hit_Pre', 'amp_sme_Hit_Post',
+                                              'amp_sme_Miss_Pre', 'amp_sme_Miss_Post'))
+
+DEFAULT_RULES = [ACCURACY]
+
+
+#%% evaluation
+
+def _robust_z(values, groups):
+    """ Absolute deviation from the (group) median in units of 1.4826 * MAD, column-wise. """
+    z = np.full_like(values, np.nan)
+    for level in pd.unique(groups):
+        rows = groups == level
+        median = np.nanmedian(values[rows], axis=0)
+        mad = 1.4826 * np.nanmedian(np.abs(values[rows] - median), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z[rows] = np.abs(values[rows] - median) / mad
+    return z
+
+
+def _column_flags(df, rules):
+    """
+    Values and flags of every rule column (subjects x columns) and the rule each
+    column belongs to.
+    """
+    blocks, lower, upper, owner, labels = [], [], [], [], []
+    for r, rule in enumerate(rules):
+        if rule.kind not in KINDS:
+            raise ValueError(f"unknown rule kind: {rule.kind}")
+        if rule.kind == 'expr':
+            values = df.eval(rule.columns).to_numpy(dtype=float)[:, None]
+            columns = [rule.columns]
+        else:
+            columns = [rule.columns] if isinstance(rule.columns, str) else list(rule.columns)
+            missing = [col for col in columns if col not in df.columns]
+            if missing:
+                raise KeyError(f"rule {rule.name}: columns not in data: {missing}")
+            values = df[columns].to_numpy(dtype=float)
+        if rule.kind == 'mad':
+            groups = np.zeros(len(df)) if rule.by is None else df[rule.by].to_numpy()
+            values = _robust_z(values, groups)
+        blocks.append(values)
+        threshold = 0.5 if rule.kind == 'expr' else rule.threshold
+        lower += [threshold if rule.kind == 'below' else -np.inf] * len(columns)
+        upper += [threshold if rule.kind in ('above', 'mad', 'expr') else np.inf] * len(columns)
+        owner += [r] * len(columns)
+        labels += columns
+
+    values = np.concatenate(blocks, axis=1)
+    kinds = np.repeat([rule.kind for rule in rules], [block.shape[1] for block in blocks])
+    with np.errstate(invalid='ignore'):
+        flags = (values < np.array(lower)) | (values > np.array(upper))
+    flags |= np.isnan(values) & (kinds == 'missing')
+    return values, flags, np.array(owner), labels
+
+
+_column_flags_cached = cached(_column_flags, name='exclusion_flags')
+
+
+def _columns(df, rules):
+    """ Columns the rules read (the data part of the cache key). """
+    needed = set()
+    for rule in rules:
+        if rule.kind == 'expr':
+            return list(df.columns)
+        needed.update([rule.columns] if isinstance(rule.columns, str) else rule.columns)
+        if rule.by is not None:
+            needed.add(rule.by)
+    return [col for col in df.columns if col in needed]
+
+
+def _flags(df, rules):
+    """ Cached column values and flags of the rules (see _column_flags). """
+    return _column_flags_cached(df[_columns(df, rules)], rules)
+
+
+def _rule_matrix(df, rules, flags, owner):
+    """ Boolean (subjects x rules) matrix from the column flags. """
+    starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+    matrix = np.logical_or.reduceat(flags, starts, axis=1)
+    return pd.DataFrame(matrix, index=df.index, columns=[rule.name for rule in rules])
+
+
+def _audit(df, rules, values, flags, owner, labels, id_col):
+    rows, cols = np.nonzero(flags)
+    ids = df[id_col].to_numpy() if id_col in df.columns else df.index.to_numpy()
+    return pd.DataFrame({'ID': ids[rows],
+                         'rule': [rules[owner[c]].name for c in cols],
+                         'column': [labels[c] for c in cols],
+                         'value': values[rows, cols],
+                         'threshold': [rules[owner[c]].threshold for c in cols]},
+                        index=df.index[rows])
+
+
+#%% public API
+
+def evaluate(df, rules=DEFAULT_RULES):
+    """
+    Boolean (subjects x rules) matrix: True where the rule excludes the subject.
+    df : wide table, one row per subject (index is kept)
+    rules : list of Rule
+    """
+    rules = list(rules)
+    values, flags, owner, labels = _flags(df, rules)
+    return _rule_matrix(df, rules, flags, owner)
+
+
+def audit(df, rules=DEFAULT_RULES, id_col='ID'):
+    """
+    One row per excluding rule column and subject: ID, rule, column, value
+    (robust z for 'mad' rules) and threshold, in the order of the table.
+    """
+    rules = list(rules)
+    return _audit(df, rules, *_flags(df, rules), id_col)
+
+
+def apply(df, rules=DEFAULT_RULES, id_col='ID'):
+    """
+    Drop every subject excluded by any rule.
+    Returns the remaining rows (original index) and the audit table, both from one
+    (cached) evaluation of the rules.
+    """
+    rules = list(rules)
+    values, flags, owner, labels = _flags(df, rules)
+    matrix = _rule_matrix(df, rules, flags, owner)
+    return df.loc[~matrix.any(axis=1).to_numpy()], _audit(df, rules, values, flags, owner, labels, id_col)
+
+
+def excluded_ids(df, rules=DEFAULT_RULES, id_col='ID'):
+    """ IDs of the excluded subjects, e.g. to filter other tables of the same subjects. """
+    matrix = evaluate(df, rules)
+    return df.loc[matrix.any(axis=1).to_numpy(), id_col].tolist()
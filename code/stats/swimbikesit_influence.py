@@ -0,0 +1,122 @@
+"""
+Leave-one-subject-out (jackknife) influence on the Group x Block interaction.
+
+With two blocks the Group x Block interaction of the mixed ANOVA is the one-way
+ANOVA of the change scores (post - pre) between the groups, and the planned
+comparison is Cohen's d of the change scores. F, p, np2 and d do not depend on the
+baseline standardisation of the scripts (shift by the group pre mean, division by
+the pooled pre SD), so they are computed from the raw change scores.
+
+All of them only need the per-group counts, sums and sums of squares of the change
+scores. Removing subject i of group g downdates those of group g by (1, x_i, x_i^2),
+so the statistics of all N leave-one-out samples of all outcomes follow from one
+(N + 1) x groups x outcomes array, without refitting any model. Subjects missing an
+outcome are left out of that outcome (as mixed_anova does) and get NaN there.
+
+Usage:
+    from swimbikesit_influence import influence
+
+    table = influence(df, measures = ['recall', 'accuracy'], group = 'Group', groups = ['sit', 'bike'])
+    table.loc[table['flips']]                  # subjects whose removal changes significance
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+#%% statistics from group sums
+
+def change_matrix(df, measures, pre='pre', post='post'):
+    """ (subjects x measures) change scores <measure>_<post> - <measure>_<pre> of a wide table. """
+    return np.column_stack([df[f'{m}_{post}'].to_numpy(dtype=float) - df[f'{m}_{pre}'].to_numpy(dtype=float)
+                            for m in measures])
+
+
+def anova_from_sums(n, s, q):
+    """
+    One-way ANOVA and Cohen's d (last vs. first group) from group counts n, sums s and
+    sums of squares q, all (..., groups, outcomes). Returns F, p, np2, d (..., outcomes).
+    """
+    k = n.shape[-2]
+    n_total = n.sum(axis=-2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        between = (s ** 2 / n).sum(axis=-2)
+        ss_between = between - s.sum(axis=-2) ** 2 / n_total
+        ss_within = q.sum(axis=-2) - between
+        df_within = n_total - k
+        f = (ss_between / (k - 1)) / (ss_within / df_within)
+        p = stats.f.sf(f, k - 1, df_within)
+        np2 = ss_between / (ss_between + ss_within)
+        mean = s / n
+        # pooled SD (ddof = 1) of the two groups; only defined for two groups
+        d = (mean[..., -1, :] - mean[..., 0, :]) / np.sqrt(ss_within / df_within) if k == 2 else np.full_like(f, np.nan)
+    return f, p, np2, d
+
+
+def jackknife(change, codes):
+    """
+    Interaction statistics of the full sample and of every leave-one-out sample.
+    change : (subjects x outcomes) change scores, NaN = missing
+    codes : group index per subject (0 .. k-1; Cohen's d compares k-1 with 0)
+    Returns F, p, np2, d as (subjects + 1, outcomes) arrays; row 0 is the full sample,
+    row i + 1 the sample without subject i.
+    """
+    change = np.asarray(change, dtype=float)
+    codes = np.asarray(codes)
+    valid = ~np.isnan(change)
+    # centre every outcome so the sums of squares stay well conditioned
+    x = np.where(valid, change - np.nanmean(change, axis=0), 0)
+    onehot = (codes[:, None] == np.arange(codes.max() + 1)[None, :]).astype(float)   # subjects x groups
+
+    n = onehot.T @ valid                                         # groups x outcomes
+    s = onehot.T @ x
+    q = onehot.T @ x ** 2
+    # downdate: the group of subject i loses (1, x_i, x_i^2)
+    n_loo = n[None] - onehot[:, :, None] * valid[:, None, :]     # subjects x groups x outcomes
+    s_loo = s[None] - onehot[:, :, None] * x[:, None, :]
+    q_loo = q[None] - onehot[:, :, None] * x[:, None, :] ** 2
+
+    f, p, np2, d = anova_from_sums(np.concatenate([n[None], n_loo]), np.concatenate([s[None], s_loo]),
+                                     np.concatenate([q[None], q_loo]))
+    # removing a subject without data leaves the sample unchanged -> not an influence
+    for stat in (f, p, np2, d):
+        stat[1:][~valid] = np.nan
+    return f, p, np2, d
+
+
+#%% table
+
+def influence(df, measures, group='Group', id_col='ID', groups=None, pre='pre', post='post', alpha=0.05):
+    """
+    Leave-one-subject-out influence of every subject on the interaction of every measure.
+    df : wide table with <measure>_<pre> / <measure>_<post> columns, one row per subject
+    groups : group order (first = control, last = treatment for Cohen's d); default sorted
+    Returns a long table with outcome, ID, group, the leave-one-out F, p, np2 and cohen_d,
+    their change against the full sample (delta_*) and whether p crosses alpha (flips).
+    """
+    groups = list(groups) if groups is not None else sorted(df[group].dropna().unique())
+    df = df.loc[df[group].isin(groups)]
+    codes = df[group].map({g: i for i, g in enumerate(groups)}).to_numpy()
+    f, p, np2, d = jackknife(change_matrix(df, measures, pre, post), codes)
+
+    n_subjects = len(df)
+    table = pd.DataFrame({'outcome': np.repeat(measures, n_subjects),
+                          id_col: np.tile(df[id_col].to_numpy(), len(measures)),
+                          group: np.tile(df[group].to_numpy(), len(measures))})
+    for name, stat in (('F', f), ('p', p), ('np2', np2), ('cohen_d', d)):
+        table[name] = stat[1:].T.ravel()
+        table[f'delta_{name}'] = (stat[1:] - stat[0]).T.ravel()
+    full_significant = np.repeat(p[0] < alpha, n_subjects)
+    table['flips'] = table['p'].notna() & ((table['p'] < alpha) != full_significant)
+    return table
+
+
+def summary(table):
+    """ Per outcome: number of subjects, largest |delta| of F / np2 / d and the number of flips. """
+    return table.dropna(subset=['F']).groupby('outcome', sort=False).agg(
+        n=('F', 'size'),
+        max_abs_delta_F=('delta_F', lambda x: x.abs().max()),
+        max_abs_delta_np2=('delta_np2', lambda x: x.abs().max()),
+        max_abs_delta_d=('delta_cohen_d', lambda x: x.abs().max()),
+        flips=('flips', 'sum'))
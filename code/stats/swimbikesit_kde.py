@@ -0,0 +1,136 @@
+"""
+Binned kernel density estimation via FFT.
+
+sns.kdeplot evaluates the Gaussian kernel of every data point at every grid point,
+which is too slow for sample-level HR data (every second of every recording, several
+hundred thousand points per group). Here the data are first distributed onto a
+regular grid by linear binning (each point splits its weight between the two
+neighbouring grid points) and the binned counts are convolved with the kernel via
+FFT, so the cost is linear in the number of points plus n_grid * log(n_grid).
+
+Bandwidths follow scipy.stats.gaussian_kde / seaborn (Scott's or Silverman's rule on
+the effective sample size of the weights, times bw_adjust). Weights allow e.g. giving
+every subject the same total weight regardless of the length of the recording.
+
+Usage:
+    from swimbikesit_kde import kde, kdeplot
+
+    grid, density = kde(values, weights = w)
+    ax = kdeplot(data = samples, x = 'rel_hr', hue = 'Group', weights = 'weight', palette = palette)
+"""
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from scipy.signal import fftconvolve
+
+
+#%% estimation
+
+def linear_binning(x, grid, weights=None):
+    """ Weights of the points x distributed linearly onto the two closest points of a regular grid. """
+    x = np.asarray(x, dtype=float)
+    weights = np.ones_like(x) if weights is None else np.asarray(weights, dtype=float)
+    delta = grid[1] - grid[0]
+    position = (x - grid[0]) / delta
+    left = np.clip(np.floor(position).astype(int), 0, len(grid) - 2)
+    share = np.clip(position - left, 0, 1)
+    counts = np.bincount(left, weights=weights * (1 - share), minlength=len(grid))
+    counts += np.bincount(left + 1, weights=weights * share, minlength=len(grid))
+    return counts[:len(grid)]
+
+
+def bandwidth(x, weights=None, method='scott', adjust=1):
+    """ Kernel standard deviation as in scipy.stats.gaussian_kde (bw_method 'scott' / 'silverman' or a factor). """
+    x = np.asarray(x, dtype=float)
+    weights = np.ones_like(x) if weights is None else np.asarray(weights, dtype=float)
+    weights = weights / weights.sum()
+    n_eff = 1 / np.sum(weights ** 2)
+    mean = np.sum(weights * x)
+    std = np.sqrt(np.sum(weights * (x - mean) ** 2) / (1 - np.sum(weights ** 2)))
+    if method == 'scott':
+        factor = n_eff ** (-1 / 5)
+    elif method == 'silverman':
+        factor = (n_eff * 3 / 4) ** (-1 / 5)
+    else:
+        factor = float(method)
+    return factor * std * adjust
+
+
+def kde(x, weights=None, grid=None, n_grid=2048, bw_method='scott', bw_adjust=1, cut=3):
+    """
+    Gaussian KDE of x on a regular grid.
+    grid : evaluation grid (regular); default n_grid points from min - cut * bw to max + cut * bw
+    Returns (grid, density); the density integrates to 1 over the real line.
+    """
+    x = np.asarray(x, dtype=float)
+    keep = ~np.isnan(x)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        keep &= ~np.isnan(weights)
+        weights = weights[keep]
+    x = x[keep]
+    bw = bandwidth(x, weights, bw_method, bw_adjust)
+    if grid is None:
+        grid = np.linspace(x.min() - cut * bw, x.max() + cut * bw, n_grid)
+    grid = np.asarray(grid, dtype=float)
+    delta = grid[1] - grid[0]
+
+    counts = linear_binning(x, grid, weights)
+    half = min(int(np.ceil(4 * bw / delta)), len(grid) - 1)
+    offsets = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (np.sqrt(2 * np.pi) * bw)
+    density = fftconvolve(counts, kernel, mode='same')
+    return grid, np.clip(density, 0, None) / counts.sum()
+
+
+def kde_groups(data, x, hue, weights=None, common_norm=True, common_grid=True, n_grid=2048, **kwargs):
+    """
+    KDE per group of a long table.
+    weights : optional column of weights
+    common_norm : scale each density by the share of its group in the total weight (as seaborn)
+    Returns a long table with hue, x and density.
+    """
+    column = data[hue]
+    levels = list(column.cat.categories) if isinstance(column.dtype, pd.CategoricalDtype) else sorted(column.dropna().unique())
+    values = data[x].to_numpy(dtype=float)
+    w = data[weights].to_numpy(dtype=float) if weights is not None else np.ones(len(data))
+
+    grid = None
+    if common_grid:
+        bw = max(bandwidth(values[(column == level).to_numpy()], w[(column == level).to_numpy()],
+                           kwargs.get('bw_method', 'scott'), kwargs.get('bw_adjust', 1))
+                 for level in levels if (column == level).sum() > 1)
+        cut = kwargs.get('cut', 3)
+        grid = np.linspace(np.nanmin(values) - cut * bw, np.nanmax(values) + cut * bw, n_grid)
+
+    total = np.nansum(w)
+    tables = []
+    for level in levels:
+        rows = (column == level).to_numpy()
+        if rows.sum() < 2:
+            continue
+        level_grid, density = kde(values[rows], w[rows], grid=grid, n_grid=n_grid, **kwargs)
+        if common_norm:
+            density = density * np.nansum(w[rows]) / total
+        tables.append(pd.DataFrame({hue: level, x: level_grid, 'density': density}))
+    table = pd.concat(tables, ignore_index=True)
+    table[hue] = pd.Categorical(table[hue], categories=levels, ordered=isinstance(column.dtype, pd.CategoricalDtype) and column.cat.ordered)
+    return table
+
+
+#%% plotting
+
+def kdeplot(data, x, hue, weights=None, palette=None, fill=True, alpha=0.5, ax=None, common_norm=True, **kwargs):
+    """ Per-group densities drawn like sns.kdeplot(..., hue = hue, fill = fill). Returns the axes. """
+    ax = ax or plt.gca()
+    table = kde_groups(data, x, hue, weights, common_norm=common_norm, **kwargs)
+    colors = palette if palette is not None else plt.rcParams['axes.prop_cycle'].by_key()['color']
+    for (level, group), color in zip(table.groupby(hue, observed=True), colors):
+        if fill:
+            ax.fill_between(group[x], group['density'], color=color, alpha=alpha, linewidth=0)
+        ax.plot(group[x], group['density'], color=color, label=str(level))
+    ax.legend(title=hue)
+    ax.set_xlabel(x)
+    ax.set_ylabel('Density')
+    return ax
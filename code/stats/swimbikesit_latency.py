@@ -0,0 +1,132 @@
+"""
+Batched ERP peak and latency measures.
+
+All functions take an ERP array whose last axis is time (e.g. subjects x conditions
+x time points, as returned by swimbikesit_eeglab.build_tables) and measure every
+waveform in one vectorised call:
+    - peak latency and amplitude in a search window (min for N2, max for P3)
+    - fractional area latency (default 50 %): time at which the given fraction of
+      the component area in the window is reached, linearly interpolated
+    - peak-centred mean amplitude (default +/- 50 ms around the individual peak)
+
+With jackknife = True the latencies are measured on the leave-one-subject-out grand
+averages (Ulrich & Miller, 2001) and turned back into individual scores
+(n * mean(J) - (n - 1) * J_i, Smulders, 2010), which can go into the usual tests.
+
+Usage:
+    import swimbikesit_eeglab as eeglab
+    from swimbikesit_latency import erp_measures
+
+    nogo = eeglab.GNG['components']['NoGo']    # N2: peak search window of Latencies_GNG.txt
+    res = erp_measures(tables['erps'], tables['times'], window = nogo['latency_window'], peak = nogo['peak'])
+    res['fal']                                 # subjects x conditions x blocks, in ms
+"""
+
+import numpy as np
+
+
+#%% helpers
+
+def _window(times, window):
+    times = np.asarray(times, dtype=float)
+    mask = (times >= window[0]) & (times <= window[1])
+    return times[mask], mask
+
+
+def _oriented(segment, peak):
+    """ Component as a positive deflection (sign flipped for negative components). """
+    if peak == 'max':
+        return segment
+    if peak == 'min':
+        return -segment
+    raise ValueError(f"unknown peak: {peak}")
+
+
+#%% measures
+
+def peak_latency(erps, times, window, peak='min'):
+    """ Latency [ms] and amplitude of the peak of every waveform within the window. """
+    t, mask = _window(times, window)
+    segment = erps[..., mask]
+    missing = np.isnan(segment).all(axis=-1)
+    position = np.argmax(np.nan_to_num(_oriented(segment, peak), nan=-np.inf), axis=-1)
+    amplitude = np.take_along_axis(segment, position[..., None], axis=-1)[..., 0]
+    return np.where(missing, np.nan, t[position]), amplitude
+
+
+def fractional_area_latency(erps, times, window, peak='min', fraction=0.5):
+    """
+    Time [ms] at which the area of the component (the part of the waveform with the
+    polarity of the peak) within the window reaches the given fraction of its total.
+    """
+    t, mask = _window(times, window)
+    area = np.clip(_oriented(erps[..., mask], peak), 0, None)
+    cumulative = np.cumsum(area, axis=-1)
+    target = fraction * cumulative[..., -1:]
+
+    above = cumulative >= target
+    index = np.argmax(above, axis=-1)
+    previous = np.maximum(index - 1, 0)
+    c_hi = np.take_along_axis(cumulative, index[..., None], axis=-1)[..., 0]
+    c_lo = np.where(index > 0, np.take_along_axis(cumulative, previous[..., None], axis=-1)[..., 0], 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(c_hi > c_lo, (target[..., 0] - c_lo) / (c_hi - c_lo), 1)
+    # each sample covers +/- half a sampling interval around its time point
+    dt = t[1] - t[0]
+    latency = t[index] - dt / 2 + share * dt
+    return np.where(cumulative[..., -1] > 0, latency, np.nan)
+
+
+def peak_mean_amplitude(erps, times, latency, half_width=50):
+    """ Mean amplitude within +/- half_width ms around the given (per waveform) latency. """
+    times = np.asarray(times, dtype=float)
+    inside = np.abs(times - np.asarray(latency)[..., None]) <= half_width
+    with np.errstate(invalid='ignore'):
+        return np.where(inside, erps, 0).sum(axis=-1) / inside.sum(axis=-1)
+
+
+#%% jackknife
+
+def _leave_one_out(erps):
+    """ Grand averages without each subject (axis 0), ignoring missing subjects. """
+    valid = ~np.isnan(erps)
+    total = np.nansum(erps, axis=0)
+    count = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, (total - np.nan_to_num(erps)) / (count - 1), np.nan)
+
+
+def _retrieve(jack):
+    """ Individual scores from jackknife subaverage scores (subjects on axis 0). """
+    n = np.sum(~np.isnan(jack), axis=0)
+    return n * np.nanmean(jack, axis=0) - (n - 1) * jack
+
+
+#%% all measures
+
+def erp_measures(erps, times, window, peak='min', fraction=0.5, half_width=50, jackknife=False):
+    """
+    Peak latency / amplitude, fractional area latency and peak-centred mean amplitude
+    of every waveform.
+    erps : (subjects x ... x time points) array
+    window : search window in ms, e.g. (220, 300) for the N2 (GNG latency_window)
+    peak : 'min' (negative component) or 'max'
+    jackknife : latencies from leave-one-subject-out averages, retrieved as
+                individual scores (amplitudes are always measured on the subject ERPs)
+    Returns a dict of arrays with the shape of erps without the time axis:
+    'peak_latency', 'peak_amplitude', 'fal', 'peak_mean'.
+    """
+    erps = np.asarray(erps, dtype=float)
+    latency, amplitude = peak_latency(erps, times, window, peak)
+    res = {'peak_latency': latency, 'peak_amplitude': amplitude,
+           'fal': fractional_area_latency(erps, times, window, peak, fraction),
+           'peak_mean': peak_mean_amplitude(erps, times, latency, half_width)}
+
+    if jackknife:
+        sub_averages = _leave_one_out(erps)
+        missing = np.isnan(erps).all(axis=-1)
+        jack_peak = np.where(missing, np.nan, peak_latency(np.nan_to_num(sub_averages), times, window, peak)[0])
+        jack_fal = np.where(missing, np.nan, fractional_area_latency(np.nan_to_num(sub_averages), times, window, peak, fraction))
+        res['peak_latency'] = _retrieve(jack_peak)
+        res['fal'] = _retrieve(jack_fal)
+    return res
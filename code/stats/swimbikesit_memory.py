@@ -0,0 +1,245 @@
+"""
+Per-stage memory accounting of the analysis pipeline.
+
+Every stage (context manager `stage`, or `begin` / `end` around the cells of a
+script) records
+    - peak bytes: highest Python heap use (tracemalloc) above the level at the
+      start of the stage
+    - retained bytes: heap growth still allocated when the stage ends
+    - peak and end RSS of the process, sampled by a background thread (covers
+      numpy / pandas buffers allocated outside the Python heap)
+    - the top allocation sites (file:line) of the memory retained by the stage.
+Stages can be nested; the peak of an inner stage also counts for the outer one.
+
+A stage with a memory budget raises MemoryBudgetExceeded when its peak exceeds the
+budget, and check() fails a whole run against a dict of budgets, so benchmarks of a
+larger cohort stop at the step that grows too much.
+
+Profiling is off by default (begin / end / stage do nothing). Set SWIMBIKESIT_MEMORY=1
+or call enable() to switch it on; tracemalloc slows the code down considerably.
+
+Usage:
+    import swimbikesit_memory as memory
+
+    memory.enable()
+    memory.begin('hr_ingest', budget_mb = 200)
+    ...                                        # cells of the stage
+    memory.end()
+    with memory.stage('plot'):
+        ...
+    print(memory.report())
+    memory.top_sites('hr_ingest')
+"""
+
+import os
+import time
+import contextlib
+import threading
+import tracemalloc
+import pandas as pd
+
+
+ENV_VAR = 'SWIMBIKESIT_MEMORY'
+
+MB = 1024 ** 2
+
+_enabled = False
+_frames = 1
+_interval = 0.01
+_stack = []
+_records = []
+
+# allocation sites of the profiler itself (left out of top_sites)
+_OWN_FILES = {tracemalloc.__file__, __file__, threading.__file__}
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """ A stage used more memory than its budget. """
+
+
+#%% RSS
+
+def _rss():
+    """ Resident set size of the process in bytes (None if it cannot be read). """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class _Sampler(threading.Thread):
+    """ Samples the RSS every interval seconds and keeps the maximum. """
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = _rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        rss = _rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        return self.peak
+
+
+#%% stages
+
+def _update_peaks():
+    """ Carry the tracemalloc peak since the last reset into all open stages. """
+    peak = tracemalloc.get_traced_memory()[1]
+    for entry in _stack:
+        entry['peak'] = max(entry['peak'], peak)
+
+
+def begin(name, budget_mb=None):
+    """
+    Start a stage (no-op while profiling is disabled).
+    budget_mb : optional limit for the peak memory of the stage (tracemalloc peak
+                or RSS growth, whichever is larger), checked by end()
+    """
+    if not _enabled:
+        return
+    _update_peaks()
+    # the snapshot itself lives on the traced heap -> measure after taking it
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    current = tracemalloc.get_traced_memory()[0]
+    sampler = _Sampler(_interval)
+    sampler.start()
+    _stack.append({'name': name, 'budget_mb': budget_mb, 'start': current, 'peak': current,
+                   'snapshot': snapshot, 'rss_start': sampler.peak, 'sampler': sampler,
+                   'time': time.perf_counter()})
+
+
+def end(top=10):
+    """
+    Close the innermost stage and record its memory use.
+    top : number of allocation sites kept for top_sites()
+    Raises MemoryBudgetExceeded if the stage had a budget and exceeded it.
+    """
+    if not _enabled or not _stack:
+        return None
+    _update_peaks()
+    entry = _stack.pop()
+    rss_peak = entry['sampler'].stop()
+    current = tracemalloc.get_traced_memory()[0]
+    stats = tracemalloc.take_snapshot().compare_to(entry['snapshot'], 'lineno')
+    stats = [stat for stat in stats if stat.size_diff > 0 and stat.traceback[0].filename not in _OWN_FILES]
+    sites = [{'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+              'size_mb': stat.size_diff / MB, 'count': stat.count_diff} for stat in stats[:top]]
+
+    rss_start = entry['rss_start']
+    record = {'stage': entry['name'], 'depth': len(_stack),
+              'seconds': time.perf_counter() - entry['time'],
+              'peak_mb': (entry['peak'] - entry['start']) / MB,
+              'retained_mb': (current - entry['start']) / MB,
+              'rss_peak_mb': None if rss_peak is None else rss_peak / MB,
+              'rss_growth_mb': None if rss_peak is None or rss_start is None else (rss_peak - rss_start) / MB,
+              'budget_mb': entry['budget_mb'], 'sites': sites}
+    _records.append(record)
+
+    if entry['budget_mb'] is not None:
+        used = max(record['peak_mb'], record['rss_growth_mb'] or 0)
+        if used > entry['budget_mb']:
+            raise MemoryBudgetExceeded(f"stage {entry['name']}: {used:.1f} MB > budget {entry['budget_mb']} MB")
+    return record
+
+
+@contextlib.contextmanager
+def stage(name, budget_mb=None):
+    """ Context manager around begin() / end(); the budget is only checked on a normal exit. """
+    begin(name, budget_mb)
+    try:
+        yield
+    except BaseException:
+        if _enabled and _stack:
+            _stack[-1]['budget_mb'] = None          # don't mask the original error
+            end()
+        raise
+    end()
+
+
+#%% switching on / off
+
+def enable(frames=1, interval=0.01):
+    """
+    Switch profiling on.
+    frames : traceback depth stored by tracemalloc (top_sites only uses the innermost frame)
+    interval : RSS sampling interval in seconds
+    """
+    global _enabled, _frames, _interval
+    _frames, _interval = frames, interval
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _enabled = True
+
+
+def disable():
+    """ Switch profiling off (open stages are discarded). """
+    global _enabled
+    _enabled = False
+    for entry in _stack:
+        entry['sampler'].stop()
+    _stack.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """ Discard all recorded stages. """
+    _records.clear()
+
+
+#%% reports
+
+def report():
+    """ One row per finished stage (in the order they ended); memory in MB. """
+    columns = ['stage', 'depth', 'seconds', 'peak_mb', 'retained_mb', 'rss_peak_mb', 'rss_growth_mb', 'budget_mb']
+    return pd.DataFrame([{col: record[col] for col in columns} for record in _records], columns=columns)
+
+
+def top_sites(name):
+    """ Allocation sites with the most memory retained by the (last run of the) stage. """
+    records = [record for record in _records if record['stage'] == name]
+    if not records:
+        raise KeyError(f'no recorded stage {name}')
+    return pd.DataFrame(records[-1]['sites'], columns=['site', 'size_mb', 'count'])
+
+
+def check(budgets):
+    """
+    Fail if any recorded stage exceeded its budget.
+    budgets : dict stage -> MB (peak of the Python heap or RSS growth)
+    Returns the report of the checked stages.
+    """
+    table = report()
+    table = table[table['stage'].isin(budgets)].copy()
+    table['budget_mb'] = table['stage'].map(budgets)
+    used = table[['peak_mb', 'rss_growth_mb']].astype(float).max(axis=1)
+    failed = table.loc[used > table['budget_mb'], 'stage'].tolist()
+    if failed:
+        raise MemoryBudgetExceeded(f'stages over budget: {failed}')
+    return table
+
+
+if os.environ.get(ENV_VAR):
+    enable()
@@ -0,0 +1,155 @@
+"""
+Batched fitting of nested linear mixed models.
+
+fit_batch takes one shared long table, a list of outcome columns and a chain of
+nested right-hand-side formulas (e.g. 'Group * Block', 'Group * Block + age',
+'Group * Block * age'). Design matrices are built once per formula and reused for
+all outcomes, each model is warm-started from the random-effects covariance of its
+parent model, and the outcome chains are fitted in parallel processes.
+
+All models of a chain are fitted by maximum likelihood (reml=False) on the same rows,
+so that the likelihood-ratio tests between neighbouring models are valid.
+
+Usage:
+    from swimbikesit_models import fit_batch
+
+    coefs, lrt = fit_batch(df_long, outcomes = ['standardized_score'],
+                           formulas = ['Group * Block', 'Group * Block + age', 'Group * Block * age'],
+                           groups = 'ID')
+"""
+
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from patsy import dmatrix
+from scipy import stats
+from statsmodels.regression.mixed_linear_model import MixedLM, MixedLMParams
+
+from swimbikesit_trace import traced
+
+
+#%% design matrices
+
+def build_designs(data, formulas):
+    """
+    Build the fixed-effects design matrix for every formula once.
+    Returns a dict formula -> DataFrame (rows with missing predictors are dropped,
+    the index of data is kept).
+    """
+    return {rhs: dmatrix(rhs, data, return_type='dataframe') for rhs in formulas}
+
+
+def _common_rows(data, outcome, designs, formulas):
+    """ Row labels that are complete for the outcome and every model of the chain. """
+    rows = data.index[data[outcome].notna()]
+    for rhs in formulas:
+        rows = rows.intersection(designs[rhs].index)
+    return rows
+
+
+#%% fitting
+
+def _warm_start(parent, k_fe):
+    """
+    Start values for a child model: the parent's random-effects covariance. MixedLM
+    optimises the profile likelihood of the unscaled covariance (cov_re / scale) and
+    profiles out the fixed effects, so only the unscaled covariance is carried over.
+    """
+    if parent is None:
+        return None
+    return MixedLMParams.from_components(fe_params=np.zeros(k_fe), cov_re=parent['cov_re_unscaled'])
+
+
+def _fit_chain(task):
+    """
+    Fit all models of one outcome chain in order (runs in a worker process).
+    task : (outcome, endog, groups, [(formula, exog, exog_names), ...], fit_kwargs)
+    """
+    outcome, endog, groups, models, fit_kwargs = task
+    fits, parent = [], None
+    for rhs, exog, exog_names in models:
+        model = MixedLM(endog, exog, groups)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            try:
+                res = model.fit(start_params=_warm_start(parent, len(exog_names)), reml=False, **fit_kwargs)
+            except np.linalg.LinAlgError:
+                # bad warm start -> fall back to a cold start
+                res = model.fit(reml=False, **fit_kwargs)
+        fe_params = pd.Series(res.fe_params, index=exog_names)
+        k_fe = len(exog_names)
+        bse = pd.Series(np.asarray(res.bse)[:k_fe], index=exog_names)
+        parent = {'cov_re_unscaled': np.asarray(res.cov_re_unscaled)}
+        fits.append({'outcome': outcome, 'formula': rhs, 'fe_params': fe_params, 'bse': bse,
+                     'llf': res.llf, 'k_params': k_fe + model.k_re2 + model.k_vc, 'n_obs': int(res.nobs), 'converged': res.converged})
+    return fits
+
+
+@traced(category='stats')
+def fit_batch(data, outcomes, formulas, groups='ID', n_jobs=None, **fit_kwargs):
+    """
+    Fit every outcome x formula combination with a random intercept per subject.
+    data : long table with one row per subject and block
+    outcomes : list of dependent variable columns in data
+    formulas : right-hand sides of the models, each nested in the next one
+    groups : subject column
+    n_jobs : number of worker processes (default: one per CPU, 1 = no pool)
+    fit_kwargs : passed on to MixedLM.fit (e.g. method = 'lbfgs')
+
+    Returns (coefs, lrt):
+        coefs : one row per outcome, formula and term (coef, se, z, p, 95% CI, llf)
+        lrt : likelihood-ratio test of each model against its parent
+    """
+    designs = build_designs(data, formulas)
+    tasks = []
+    for outcome in outcomes:
+        rows = _common_rows(data, outcome, designs, formulas)
+        endog = data.loc[rows, outcome].to_numpy(dtype=float)
+        group_labels = data.loc[rows, groups].to_numpy()
+        models = [(rhs, designs[rhs].loc[rows].to_numpy(), list(designs[rhs].columns)) for rhs in formulas]
+        tasks.append((outcome, endog, group_labels, models, fit_kwargs))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        chains = [_fit_chain(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as pool:
+            chains = list(pool.map(_fit_chain, tasks))
+
+    return _coef_table(chains), _lrt_table(chains)
+
+
+#%% tidy output
+
+def _coef_table(chains):
+    z_crit = stats.norm.ppf(0.975)
+    tables = []
+    for fits in chains:
+        for fit in fits:
+            table = pd.DataFrame({'coef': fit['fe_params'], 'se': fit['bse']})
+            table['z'] = table['coef'] / table['se']
+            table['p'] = 2 * stats.norm.sf(np.abs(table['z']))
+            table['ci_low'] = table['coef'] - z_crit * table['se']
+            table['ci_high'] = table['coef'] + z_crit * table['se']
+            table.insert(0, 'term', table.index)
+            table.insert(0, 'formula', fit['formula'])
+            table.insert(0, 'outcome', fit['outcome'])
+            table['llf'] = fit['llf']
+            table['n_obs'] = fit['n_obs']
+            table['converged'] = fit['converged']
+            tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def _lrt_table(chains):
+    rows = []
+    for fits in chains:
+        for parent, child in zip(fits[:-1], fits[1:]):
+            lr = 2 * (child['llf'] - parent['llf'])
+            df_diff = child['k_params'] - parent['k_params']
+            rows.append({'outcome': child['outcome'], 'parent': parent['formula'], 'formula': child['formula'],
+                         'llf_parent': parent['llf'], 'llf': child['llf'], 'lr': lr, 'df': df_diff,
+                         'p': stats.chi2.sf(max(lr, 0), df_diff)})
+    return pd.DataFrame(rows, columns=['outcome', 'parent', 'formula', 'llf_parent', 'llf', 'lr', 'df', 'p'])
@@ -0,0 +1,254 @@
+"""
+Multiverse (specification-curve) analysis of the confirmatory pre/post effects.
+
+The scripts fix a number of analysis choices: the accuracy cutoff (0.50), the
+exclusion list, the groups compared (sit vs. bike or all three), the baseline
+standardisation (pooled pre SD / per group / none) and the model (mixed ANOVA or
+mixedlm). run() evaluates the Group x Block interaction of every outcome for every
+combination of these options:
+    - anova   : interaction F, p and np2 of the mixed ANOVA, computed as the one-way
+                ANOVA of the change scores (identical with two blocks)
+    - mixedlm : likelihood-ratio test of Group * Block against Group + Block with a
+                random intercept per subject (all available rows, ML fits)
+The estimate of every branch is the difference in mean change (mixedlm: the
+interaction coefficient) of the contrast groups, in units of the scaled DV (raw:
+ms, words, ...; pooled / group: pre SDs). The curve is ranked by std_estimate, the
+same difference in pooled pre SDs of the sample (raw estimates divided by the pooled
+pre SD), so that branches of all scales are ordered by effect and not by unit.
+
+Shared work is done once: the analytic table comes from swimbikesit_tables
+(persisted), all exclusion rules of the grid are evaluated in one cached call, and
+branches that end up with the same subjects (e.g. cutoffs that exclude nobody
+else) share one evaluation. The distinct samples are spread across processes.
+
+Usage:
+    import swimbikesit_tables as tables
+    import swimbikesit_multiverse as multiverse
+
+    table = tables.load_table('Q:/data/projects/mek_sports01/eegl/derivatives/')
+    curve = multiverse.run(table, accuracy_cutoffs = [None, 0.4, 0.5, 0.6])
+    multiverse.summary(curve)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import swimbikesit_exclusion as exclusion
+from swimbikesit_influence import anova_from_sums
+from swimbikesit_models import fit_batch
+
+
+#%% options
+
+# outcome: (pre, post) columns or pandas expressions on the analytic table
+OUTCOMES = {
+    'recall':         ('recall_pre', 'recall_post'),
+    'accuracy':       ('accuracy_pre', 'accuracy_post'),
+    'RT':             ('RT_pre', 'RT_post'),
+    'SME':            ('amp_sme_Hit_Pre - amp_sme_Miss_Pre', 'amp_sme_Hit_Post - amp_sme_Miss_Post'),
+    'NoGo_amplitude': ('amp_gng_NoGo_Pre', 'amp_gng_NoGo_Post'),
+    'NoGo_latency':   ('lat_gng_NoGo_Pre', 'lat_gng_NoGo_Post'),
+}
+
+# None = no accuracy exclusion
+ACCURACY_CUTOFFS = [None, 0.40, 0.45, 0.50, 0.55, 0.60]
+
+# exclusions applied in addition to the accuracy cutoff
+EXCLUSIONS = {
+    'none':               [],
+    'rt_mad':             [exclusion.RT_MAD],
+    'missing_eeg':        [exclusion.MISSING_EEG],
+    'rt_mad+missing_eeg': [exclusion.RT_MAD, exclusion.MISSING_EEG],
+}
+
+GROUPS = {'sit-bike': ('sit', 'bike'), 'sit-bike-swim': ('sit', 'bike', 'swim')}
+
+# raw scores, z-scores with the pooled pre SD (as the scripts), z-scores per group
+SCALES = ['raw', 'pooled', 'group']
+
+MODELS = ['anova', 'mixedlm']
+
+COLUMNS = ['outcome', 'accuracy_cutoff', 'exclusion', 'groups', 'scale', 'model', 'n',
+           'statistic', 'df1', 'df2', 'p', 'np2', 'estimate', 'std_estimate', 'significant', 'rank']
+
+
+#%% one sample
+
+def _scale(pre, post, onehot, scale):
+    """
+    Pre / post scores (subjects x outcomes) shifted by the group pre mean and divided by
+    the pre SD. Also returns the SD per outcome if it is common to all groups (raw: 1).
+    """
+    if scale == 'raw':
+        return pre, post, np.ones(pre.shape[1])
+    valid = ~np.isnan(pre)
+    n = onehot.T @ valid
+    mean = (onehot.T @ np.where(valid, pre, 0)) / n
+    offset = onehot @ mean
+    var = (onehot.T @ np.where(valid, pre - offset, 0) ** 2) / (n - 1)
+    if scale == 'pooled':
+        # np.std (ddof = 0) per group, weighted by n - 1
+        sd = np.sqrt(((n - 1) * var * (n - 1) / n).sum(axis=0) / (n.sum(axis=0) - onehot.shape[1]))
+        return (pre - offset) / sd, (post - offset) / sd, sd
+    if scale == 'group':
+        sd = onehot @ np.sqrt(var)
+        return (pre - offset) / sd, (post - offset) / sd, None
+    raise ValueError(f'unknown scale: {scale}')
+
+
+def _anova(pre, post, onehot, contrast):
+    change = post - pre
+    valid = ~np.isnan(change)
+    x = np.where(valid, change - np.nanmean(change, axis=0), 0)
+    n, s, q = onehot.T @ valid, onehot.T @ x, onehot.T @ x ** 2
+    f, p, np2, _ = anova_from_sums(n, s, q)
+    k = onehot.shape[1]
+    mean = s / n
+    return pd.DataFrame({'n': n.sum(axis=0), 'statistic': f, 'df1': k - 1, 'df2': n.sum(axis=0) - k, 'p': p,
+                         'np2': np2, 'estimate': mean[contrast[1]] - mean[contrast[0]]})
+
+
+def _mixedlm(pre, post, ids, labels, groups, outcomes, contrast):
+    n_subjects = len(ids)
+    long = pd.DataFrame({'ID': np.tile(ids, 2),
+                         'Group': pd.Categorical(np.tile(labels, 2), categories=groups),
+                         'Block': pd.Categorical.from_codes(np.repeat([0, 1], n_subjects), categories=['pre', 'post'])})
+    for j, outcome in enumerate(outcomes):
+        long[outcome] = np.concatenate([pre[:, j], post[:, j]])
+    coefs, lrt = fit_batch(long, outcomes, ['Group + Block', 'Group * Block'], groups='ID', n_jobs=1)
+
+    full = coefs.loc[coefs['formula'] == 'Group * Block'].set_index(['outcome', 'term'])['coef']
+    def interaction(outcome, g):
+        return 0.0 if g == 0 else full.get((outcome, f'Group[T.{groups[g]}]:Block[T.post]'), np.nan)
+    lrt = lrt.set_index('outcome').reindex(outcomes)
+    available = ~np.isnan(pre) | ~np.isnan(post)
+    return pd.DataFrame({'n': available.sum(axis=0), 'statistic': lrt['lr'].to_numpy(), 'df1': lrt['df'].to_numpy(),
+                         'df2': np.nan, 'p': lrt['p'].to_numpy(), 'np2': np.nan,
+                         'estimate': [interaction(o, contrast[1]) - interaction(o, contrast[0]) for o in outcomes]})
+
+
+def _run_sample(task):
+    """ All outcomes x scales x models of one sample (runs in a worker process). """
+    sample, pre, post, ids, labels, groups, outcomes, scales, models, contrast = task
+    codes = pd.Categorical(labels, categories=groups).codes
+    onehot = (codes[:, None] == np.arange(len(groups))[None, :]).astype(float)
+    contrast = [groups.index(g) for g in contrast]
+    tables, pooled = [], None
+    _, _, pooled_sd = _scale(pre, post, onehot, 'pooled')
+    for scale in scales:
+        z_pre, z_post, sd = _scale(pre, post, onehot, scale)
+        for model in models:
+            if model == 'anova':
+                res = _anova(z_pre, z_post, onehot, contrast)
+            elif model == 'mixedlm' and sd is not None:
+                # group offsets are absorbed by the Group term and a common SD only rescales
+                # the coefficients -> one fit serves raw and pooled (on the pooled z-scores,
+                # which converge better than e.g. RT in ms)
+                if pooled is None:
+                    p_pre, p_post, _ = _scale(pre, post, onehot, 'pooled')
+                    pooled = _mixedlm(p_pre, p_post, ids, labels, groups, outcomes, contrast)
+                res = pooled.assign(estimate=pooled['estimate'] * pooled_sd / sd)
+            elif model == 'mixedlm':
+                res = _mixedlm(z_pre, z_post, ids, labels, groups, outcomes, contrast)
+            else:
+                raise ValueError(f'unknown model: {model}')
+            # pre SD units for every scale (group: already in SDs, of each group)
+            std_estimate = res['estimate'] / pooled_sd if scale == 'raw' else res['estimate']
+            tables.append(res.assign(std_estimate=std_estimate, outcome=outcomes, scale=scale, model=model,
+                                     sample=sample))
+    return pd.concat(tables, ignore_index=True)
+
+
+#%% grid
+
+def _exclusion_masks(table, accuracy_cutoffs, exclusions):
+    """
+    Excluded subjects (boolean per row of table) of every cutoff x exclusion set, from
+    one evaluation of all rules.
+    """
+    rules = {}
+    for cutoff in accuracy_cutoffs:
+        if cutoff is not None:
+            rule = exclusion.ACCURACY._replace(name=f'accuracy<{cutoff}', threshold=cutoff)
+            rules[rule.name] = rule
+    for rule_set in exclusions.values():
+        for rule in rule_set:
+            rules[rule.name] = rule
+    matrix = exclusion.evaluate(table, list(rules.values())) if rules else pd.DataFrame(index=table.index)
+
+    masks = {}
+    for cutoff in accuracy_cutoffs:
+        for name, rule_set in exclusions.items():
+            names = [rule.name for rule in rule_set] + ([] if cutoff is None else [f'accuracy<{cutoff}'])
+            masks[cutoff, name] = matrix[names].any(axis=1).to_numpy() if names else np.zeros(len(table), dtype=bool)
+    return masks
+
+
+def run(table, outcomes=OUTCOMES, accuracy_cutoffs=ACCURACY_CUTOFFS, exclusions=EXCLUSIONS, groups=GROUPS,
+        scales=SCALES, models=MODELS, contrast=('sit', 'bike'), group_col='Group', id_col='ID', alpha=0.05,
+        n_jobs=None):
+    """
+    Evaluate every combination of the options.
+    table : analytic table (swimbikesit_tables.load_table), one row per subject
+    outcomes : dict name -> (pre, post) columns / expressions
+    accuracy_cutoffs : list of cutoffs (None = no accuracy exclusion)
+    exclusions : dict name -> list of exclusion rules applied in addition
+    groups : dict name -> groups compared (first = reference)
+    contrast : (control, treatment) groups of the estimate
+    n_jobs : worker processes (default: one per CPU, 1 = no pool)
+
+    Returns the specification curve: one row per outcome and branch, ranked by the
+    scale-free std_estimate within every outcome (accuracy_cutoff NaN = no accuracy
+    exclusion).
+    """
+    outcome_names = list(outcomes)
+    pre = np.column_stack([table.eval(expr[0]).to_numpy(dtype=float) for expr in outcomes.values()])
+    post = np.column_stack([table.eval(expr[1]).to_numpy(dtype=float) for expr in outcomes.values()])
+    ids = table[id_col].to_numpy()
+    labels = table[group_col].to_numpy()
+    masks = _exclusion_masks(table, accuracy_cutoffs, exclusions)
+
+    # branches with the same subjects and groups share one sample
+    samples, branches, tasks = {}, [], []
+    for (cutoff, exclusion_name), excluded in masks.items():
+        for groups_name, levels in groups.items():
+            rows = np.flatnonzero(~excluded & np.isin(labels, levels))
+            key = (rows.tobytes(), tuple(levels))
+            if key not in samples:
+                samples[key] = len(samples)
+                tasks.append((samples[key], pre[rows], post[rows], ids[rows], labels[rows], list(levels),
+                              outcome_names, list(scales), list(models), list(contrast)))
+            branches.append({'accuracy_cutoff': np.nan if cutoff is None else cutoff, 'exclusion': exclusion_name,
+                             'groups': groups_name, 'sample': samples[key]})
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        outputs = [_run_sample(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as pool:
+            outputs = list(pool.map(_run_sample, tasks))
+
+    curve = pd.DataFrame(branches).merge(pd.concat(outputs, ignore_index=True), on='sample')
+    curve['significant'] = curve['p'] < alpha
+    curve = curve.sort_values(['outcome', 'std_estimate'], kind='stable', ignore_index=True)
+    curve['rank'] = curve.groupby('outcome').cumcount() + 1
+    return curve[COLUMNS]
+
+
+#%% summaries
+
+def summary(curve, options=('accuracy_cutoff', 'exclusion', 'groups', 'scale', 'model')):
+    """
+    Per outcome and option value: number of branches, share of significant branches,
+    median std_estimate and median p (the bottom panel of a specification curve).
+    """
+    tables = []
+    for option in options:
+        table = curve.groupby(['outcome', curve[option].fillna('none')], sort=False).agg(
+            branches=('p', 'size'), share_significant=('significant', 'mean'),
+            median_std_estimate=('std_estimate', 'median'), median_p=('p', 'median')).reset_index()
+        tables.append(table.rename(columns={option: 'value'}).assign(option=option))
+    table = pd.concat(tables, ignore_index=True)
+    return table[['outcome', 'option', 'value', 'branches', 'share_significant', 'median_std_estimate', 'median_p']]
@@ -0,0 +1,257 @@
+"""
+Pairwise post-hoc t-tests for Group x Block designs from per-cell statistics.
+
+pg.pairwise_ttests runs one t-test per comparison and DV. All of these tests only
+need the per-cell (group x block) sizes, means and the within-subject covariance
+matrix of every group, so the cell statistics are computed once for all outcomes
+(subjects x blocks x outcomes array) and every family of comparisons follows from
+them as array operations:
+    - within  : block pairs, paired t-test over all subjects
+    - between : group pairs on the subject means across blocks
+    - interaction (within_first = True): group pairs within every block, or
+      (within_first = False) paired block pairs within every group
+Between-group tests are Welch or pooled-variance t-tests; 'auto' uses Welch for
+unequal group sizes (as pingouin). Effect sizes are Cohen's d (pooled SD; d_avg for
+paired tests) and Hedges' g. p-values are corrected per outcome and family of
+comparisons with swimbikesit_correction.adjust. Subjects missing a block of an
+outcome are left out of that outcome (listwise, as pingouin). On baseline
+standardised scores the group pairs of the baseline block are zero by construction
+and are left out (baseline = 'pre').
+
+Usage:
+    import swimbikesit_posthoc as posthoc
+
+    cells = posthoc.from_long(heart_rates_long, dv = 'HF', within = 'block', between = 'group', subject = 'ID')
+    table = posthoc.pairwise(cells, test = 'auto', padjust = 'bonferroni')
+    families = results.record_pairwise('01', table, data = heart_rates_long, family = '01_posthoc_{contrast}')
+    correction.correct('bonferroni', families = families)    # p_adj in the store = p_corr
+
+    cells = posthoc.from_wide(df, ['recall', 'accuracy', 'RT'], groups = ['sit', 'bike', 'swim'], standardize = True)
+    table = posthoc.pairwise(cells, test = 'auto', padjust = 'bonferroni', baseline = 'pre')
+"""
+
+import itertools
+import collections
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from swimbikesit_correction import adjust
+
+
+CellStats = collections.namedtuple('CellStats', ['n', 'mean', 'cov', 'groups', 'levels', 'outcomes', 'within', 'between'])
+
+TESTS = ['auto', 'welch', 'pooled']
+
+COLUMNS = ['outcome', 'contrast', 'level', 'A', 'B', 'paired', 'test', 'n_A', 'n_B', 'mean_A', 'mean_B',
+           'T', 'dof', 'p_unc', 'p_corr', 'cohen_d', 'hedges']
+
+
+#%% cell statistics
+
+def _order(column):
+    """ Levels of a column: observed categories in category order, else sorted. """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        present = set(column.dropna().unique())
+        return [level for level in column.cat.categories if level in present]
+    return sorted(column.dropna().unique())
+
+
+def _onehot(labels, groups):
+    return (np.asarray(labels, dtype=object)[:, None] == np.array(groups, dtype=object)[None, :]).astype(float)
+
+
+def cell_stats(values, labels, groups, levels=None, outcomes=None, within='Block', between='Group'):
+    """
+    Per-cell sizes, means and within-subject covariances.
+    values : (subjects x levels x outcomes) array (or subjects x levels for one outcome)
+    labels : group of every subject; subjects in none of the groups are ignored
+    Returns CellStats with n (groups x outcomes), mean (groups x levels x outcomes) and
+    cov (groups x levels x levels x outcomes, ddof = 1).
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 2:
+        values = values[:, :, None]
+    groups = list(groups)
+    levels = list(levels) if levels is not None else list(range(values.shape[1]))
+    outcomes = list(outcomes) if outcomes is not None else list(range(values.shape[2]))
+    onehot = _onehot(labels, groups)
+
+    complete = ~np.isnan(values).any(axis=1) & (onehot.sum(axis=1) > 0)[:, None]          # subjects x outcomes
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # centre every level / outcome so the cross products stay well conditioned
+        centre = np.nanmean(np.where(complete[:, None, :], values, np.nan), axis=0)
+        x = np.where(complete[:, None, :], values - centre, 0)
+        n = onehot.T @ complete
+        mean = np.einsum('sg,slo->glo', onehot, x) / n[:, None, :]
+        cross = np.einsum('sg,slo,smo->glmo', onehot, x, x)
+        cov = (cross - n[:, None, None, :] * mean[:, :, None, :] * mean[:, None, :, :]) / (n - 1)[:, None, None, :]
+    return CellStats(n, mean + centre, cov, groups, levels, outcomes, within, between)
+
+
+def baseline_z(values, labels, groups, baseline=0):
+    """
+    Standardise as the confirmatory scripts: subtract the group mean of the baseline
+    level and divide by the pooled baseline SD (np.std per group, weighted by n - 1).
+    values : (subjects x levels x outcomes); every subject with a baseline value counts.
+    """
+    onehot = _onehot(labels, groups)
+    pre = values[:, baseline, :]
+    valid = ~np.isnan(pre)
+    n = onehot.T @ valid
+    mean = (onehot.T @ np.where(valid, pre, 0)) / n
+    offset = onehot @ mean
+    var0 = (onehot.T @ np.where(valid, pre - offset, 0) ** 2) / n
+    sd = np.sqrt(((n - 1) * var0).sum(axis=0) / (n.sum(axis=0) - len(groups)))
+    return (values - offset[:, None, :]) / sd
+
+
+def from_long(data, dv, within, between, subject, outcome=None):
+    """
+    Cell statistics of a long table (one row per subject and level).
+    outcome : optional column splitting dv into several outcomes (e.g. 'Condition')
+    """
+    levels = _order(data[within])
+    groups = _order(data[between])
+    outcomes = _order(data[outcome]) if outcome is not None else [dv]
+    s_idx, subjects = pd.factorize(data[subject])
+    l_idx = pd.Categorical(data[within], categories=levels).codes
+    o_idx = pd.Categorical(data[outcome], categories=outcomes).codes if outcome is not None else np.zeros(len(data), dtype=int)
+    keep = (l_idx >= 0) & (o_idx >= 0)
+
+    values = np.full((len(subjects), len(levels), len(outcomes)), np.nan)
+    values[s_idx[keep], l_idx[keep], o_idx[keep]] = data[dv].to_numpy(dtype=float)[keep]
+    labels = np.empty(len(subjects), dtype=object)
+    labels[s_idx] = data[between].to_numpy(dtype=object)
+    return cell_stats(values, labels, groups, levels, outcomes, within, between)
+
+
+def wide_values(df, outcomes, levels=('pre', 'post'), group='Group', groups=None, standardize=False):
+    """
+    (subjects x levels x outcomes) array of a wide table (one row per subject).
+    outcomes : list of measures (columns <measure>_<level>) or dict name -> column or
+               pandas expression per level (e.g. {'SME': ('amp_sme_Hit_Pre - amp_sme_Miss_Pre', ...)})
+    standardize : baseline z-scores of the scripts (see baseline_z) instead of raw values
+    Returns (values, group labels, groups, outcome names).
+    """
+    if not isinstance(outcomes, dict):
+        outcomes = {m: [f'{m}_{level}' for level in levels] for m in outcomes}
+    values = np.stack([np.column_stack([(df[expr] if expr in df.columns else df.eval(expr)).to_numpy(dtype=float)
+                                        for expr in exprs]) for exprs in outcomes.values()], axis=-1)
+    labels = df[group].to_numpy(dtype=object)
+    groups = list(groups) if groups is not None else _order(df[group])
+    if standardize:
+        values = baseline_z(values, labels, groups)
+    return values, labels, groups, list(outcomes)
+
+
+def from_wide(df, outcomes, levels=('pre', 'post'), group='Group', groups=None, within='Block', standardize=False):
+    """ Cell statistics of a wide table (arguments as wide_values). """
+    values, labels, groups, outcomes = wide_values(df, outcomes, levels, group, groups, standardize)
+    return cell_stats(values, labels, groups, levels, outcomes, within, group)
+
+
+#%% tests
+
+def _two_sample(m1, v1, n1, m2, v2, n2, test):
+    """ Welch or pooled-variance t-test and Cohen's d (pooled SD) from summary statistics. """
+    if test not in TESTS:
+        raise ValueError(f'unknown test: {test}')
+    m1, v1, n1, m2, v2, n2 = np.broadcast_arrays(m1, v1, n1, m2, v2, n2)
+    welch = (n1 != n2) if test == 'auto' else np.full(n1.shape, test == 'welch')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pooled = ((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2)
+        se2_welch = v1 / n1 + v2 / n2
+        dof_welch = se2_welch ** 2 / ((v1 / n1) ** 2 / (n1 - 1) + (v2 / n2) ** 2 / (n2 - 1))
+        se2 = np.where(welch, se2_welch, pooled * (1 / n1 + 1 / n2))
+        dof = np.where(welch, dof_welch, n1 + n2 - 2)
+        t = (m1 - m2) / np.sqrt(se2)
+        d = (m1 - m2) / np.sqrt(pooled)
+    return t, dof, d, np.where(welch, 'welch', 'pooled')
+
+
+def _paired(ma, mb, vaa, vbb, vab, n):
+    """ Paired t-test and Cohen's d_avg from the means and covariance of the two levels. """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = (ma - mb) / np.sqrt((vaa + vbb - 2 * vab) / n)
+        d = (ma - mb) / np.sqrt((vaa + vbb) / 2)
+    return t, np.broadcast_to(n - 1, t.shape), d, np.full(t.shape, 'paired')
+
+
+def _block(cells, contrast, level, names, a, b, n_a, n_b, m_a, m_b, result):
+    """ Long rows of one family: arrays are (comparisons x outcomes). """
+    t, dof, d, test = result
+    k, o = t.shape
+    n_a, n_b, m_a, m_b = (np.broadcast_to(x, (k, o)) for x in (n_a, n_b, m_a, m_b))
+    return pd.DataFrame({'outcome': np.tile(np.array(cells.outcomes, dtype=object), k),
+                         'contrast': contrast,
+                         'level': np.repeat(np.asarray(level, dtype=object), o),
+                         'A': np.repeat(np.asarray(names, dtype=object)[a], o),
+                         'B': np.repeat(np.asarray(names, dtype=object)[b], o),
+                         'paired': (test == 'paired').ravel(),
+                         'test': test.ravel(), 'n_A': n_a.ravel(), 'n_B': n_b.ravel(),
+                         'mean_A': m_a.ravel(), 'mean_B': m_b.ravel(),
+                         'T': t.ravel(), 'dof': dof.ravel(), 'cohen_d': d.ravel()})
+
+
+def pairwise(cells, test='auto', padjust='bonferroni', within_first=True, baseline=None):
+    """
+    All within, between and interaction pairwise t-tests of every outcome.
+    cells : CellStats (cell_stats / from_long / from_wide)
+    test : 'auto' (Welch for unequal group sizes), 'welch' or 'pooled' for between-group tests
+    padjust : correction per outcome and family ('bonferroni', 'holm', 'fdr_bh', 'fdr_by'; None = none)
+    within_first : interaction as group pairs within every level (True, as pingouin)
+                   or level pairs within every group (False)
+    baseline : level the cells are standardised on (from_wide(..., standardize = True));
+               its group pairs are zero by construction and are left out of the
+               interaction (and of its correction family)
+    Returns one row per outcome and comparison (contrast: within / between factor or
+    '<within> * <between>'; level: the level of the first factor of the interaction).
+    """
+    n, mean, cov = cells.n, cells.mean, cells.cov
+    n_groups, n_levels, _ = mean.shape
+    groups, levels = np.array(cells.groups, dtype=object), np.array(cells.levels, dtype=object)
+    la, lb = (np.array(x, dtype=int) for x in zip(*itertools.combinations(range(n_levels), 2)))
+    ga, gb = (np.array(x, dtype=int) for x in zip(*itertools.combinations(range(n_groups), 2)))
+    blocks = []
+
+    # within: all subjects pooled over the groups (covariance includes the group mean differences)
+    n_all = n.sum(axis=0)
+    m_all = (n[:, None, :] * mean).sum(axis=0) / n_all
+    dev = mean - m_all
+    c_all = (((n - 1)[:, None, None, :] * cov).sum(axis=0)
+             + (n[:, None, None, :] * dev[:, :, None, :] * dev[:, None, :, :]).sum(axis=0)) / (n_all - 1)
+    blocks.append(_block(cells, cells.within, np.full(len(la), '-'), levels, la, lb, n_all, n_all, m_all[la], m_all[lb],
+                         _paired(m_all[la], m_all[lb], c_all[la, la], c_all[lb, lb], c_all[la, lb], n_all)))
+
+    # between: subject means across the levels
+    m_subj = mean.mean(axis=1)
+    v_subj = cov.sum(axis=(1, 2)) / n_levels ** 2
+    blocks.append(_block(cells, cells.between, np.full(len(ga), '-'), groups, ga, gb, n[ga], n[gb], m_subj[ga], m_subj[gb],
+                         _two_sample(m_subj[ga], v_subj[ga], n[ga], m_subj[gb], v_subj[gb], n[gb], test)))
+
+    # interaction
+    if within_first:
+        tested = [i for i, level in enumerate(levels) if level != baseline]
+        l = np.repeat(tested, len(ga))
+        a, b = np.tile(ga, len(tested)), np.tile(gb, len(tested))
+        blocks.append(_block(cells, f'{cells.within} * {cells.between}', levels[l], groups, a, b, n[a], n[b],
+                             mean[a, l], mean[b, l],
+                             _two_sample(mean[a, l], cov[a, l, l], n[a], mean[b, l], cov[b, l, l], n[b], test)))
+    else:
+        g = np.repeat(np.arange(n_groups), len(la))
+        a, b = np.tile(la, n_groups), np.tile(lb, n_groups)
+        blocks.append(_block(cells, f'{cells.between} * {cells.within}', groups[g], levels, a, b, n[g], n[g],
+                             mean[g, a], mean[g, b],
+                             _paired(mean[g, a], mean[g, b], cov[g, a, a], cov[g, b, b], cov[g, a, b], n[g])))
+
+    table = pd.concat(blocks, ignore_index=True)
+    table['hedges'] = table['cohen_d'] * (1 - 3 / (4 * (table['n_A'] + table['n_B']) - 9))
+    table['p_unc'] = 2 * stats.t.sf(np.abs(table['T'].to_numpy(dtype=float)), table['dof'].to_numpy(dtype=float))
+    table['p_corr'] = np.nan
+    if padjust not in (None, 'none'):
+        family = table['outcome'].astype(str) + '|' + table['contrast']
+        table['p_corr'] = adjust(table['p_unc'], family, padjust)
+    order = pd.Categorical(table['outcome'], categories=cells.outcomes).codes
+    table = table.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+    return table[COLUMNS]
@@ -0,0 +1,157 @@
+"""
+Monte Carlo power and sample-size simulation for the sit/bike/swim pre/post design.
+
+Synthetic subjects are drawn from the observed per-group means and pre/post
+covariance of a measure in performance_behav.txt. Every simulated dataset is run
+through the same pipeline as the confirmatory analysis (04a):
+    1) baseline standardisation with the pooled pre SD and the group pre means
+    2) mixed ANOVA Group x Block (interaction effect)
+    3) Welch t-test on the change scores (treatment vs. control) and Cohen's d
+
+With two blocks the Group x Block interaction of the mixed ANOVA is identical to a
+one-way ANOVA on the change scores, so all steps are computed in closed form and
+vectorised over the replicates. Chunks of replicates are spread across processes.
+
+Usage:
+    import swimbikesit_power as power
+
+    design = power.estimate_design(df, 'recall', groups = ['sit', 'bike'])
+    curve = power.power_curve(design, sample_sizes = range(20, 81, 10), n_reps = 5000)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+
+
+#%% design
+
+def estimate_design(df, measure, groups=('sit', 'bike'), group_col='Group'):
+    """
+    Observed mean vector and covariance matrix of (pre, post) per group.
+    df : wide table like performance_behav.txt (after exclusions)
+    measure : prefix of the <measure>_pre / <measure>_post columns (e.g. 'recall')
+    groups : groups to simulate, the first one is the control group
+    """
+    cols = [f'{measure}_pre', f'{measure}_post']
+    design = {}
+    for group in groups:
+        values = df.loc[df[group_col] == group, cols].dropna().to_numpy(dtype=float)
+        design[group] = (values.mean(axis=0), np.cov(values, rowvar=False))
+    return design
+
+
+def simulate(design, n_per_group, n_reps, rng):
+    """
+    Draw n_reps synthetic datasets.
+    Returns (data, codes): data has shape (n_reps, n_subjects, 2) with pre and post
+    scores, codes gives the group index (order of design) of every subject.
+    """
+    data, codes = [], []
+    for code, (mean, cov) in enumerate(design.values()):
+        data.append(rng.multivariate_normal(mean, cov, size=(n_reps, n_per_group)))
+        codes.append(np.full(n_per_group, code))
+    return np.concatenate(data, axis=1), np.concatenate(codes)
+
+
+#%% vectorised pipeline
+
+def _group_stats(x, onehot):
+    """ Per-replicate group sizes, means and variances (ddof=1) of x (reps x subjects). """
+    n = onehot.sum(axis=0)
+    mean = x @ onehot / n
+    var = ((x ** 2) @ onehot - n * mean ** 2) / (n - 1)
+    return n, mean, var
+
+
+def run_pipeline(data, codes, alpha=0.05):
+    """
+    Baseline standardisation, mixed ANOVA interaction and change-score t-test for
+    all replicates at once.
+    data : (n_reps, n_subjects, 2) pre/post scores
+    codes : group index per subject (0 = control, 1 = treatment, ...)
+    Returns a DataFrame with one row per replicate.
+    """
+    onehot = (codes[:, None] == np.unique(codes)[None, :]).astype(float)
+    k = onehot.shape[1]
+    n_total = len(codes)
+    pre, post = data[..., 0], data[..., 1]
+
+    # 1) standardise with pooled pre SD (as in the scripts: np.std with ddof=0, weighted by n-1)
+    n, pre_mean, pre_var = _group_stats(pre, onehot)
+    pre_var0 = pre_var * (n - 1) / n
+    sd_pre = np.sqrt(((n - 1) * pre_var0).sum(axis=1) / (n_total - k))
+    offset = pre_mean @ onehot.T
+    z_pre = (pre - offset) / sd_pre[:, None]
+    z_post = (post - offset) / sd_pre[:, None]
+
+    # 2) Group x Block interaction = one-way ANOVA on the change scores
+    change = z_post - z_pre
+    n, ch_mean, ch_var = _group_stats(change, onehot)
+    grand = change.mean(axis=1)
+    ss_between = (n * (ch_mean - grand[:, None]) ** 2).sum(axis=1)
+    ss_within = ((n - 1) * ch_var).sum(axis=1)
+    f_int = (ss_between / (k - 1)) / (ss_within / (n_total - k))
+    p_int = stats.f.sf(f_int, k - 1, n_total - k)
+    np2 = ss_between / (ss_between + ss_within)
+
+    # 3) Welch t-test and Cohen's d on change scores: treatment (1) vs. control (0)
+    se2 = ch_var[:, 1] / n[1] + ch_var[:, 0] / n[0]
+    t = (ch_mean[:, 1] - ch_mean[:, 0]) / np.sqrt(se2)
+    dof = se2 ** 2 / ((ch_var[:, 1] / n[1]) ** 2 / (n[1] - 1) + (ch_var[:, 0] / n[0]) ** 2 / (n[0] - 1))
+    p_t = 2 * stats.t.sf(np.abs(t), dof)
+    pooled_sd = np.sqrt(((n[0] - 1) * ch_var[:, 0] + (n[1] - 1) * ch_var[:, 1]) / (n[0] + n[1] - 2))
+    d = (ch_mean[:, 1] - ch_mean[:, 0]) / pooled_sd
+
+    return pd.DataFrame({'F': f_int, 'p_interaction': p_int, 'np2': np2,
+                         't': t, 'p_ttest': p_t, 'cohen_d': d,
+                         'significant': (p_int < alpha) & (p_t < alpha)})
+
+
+def _simulate_chunk(task):
+    design, n_per_group, n_reps, seed, alpha = task
+    rng = np.random.default_rng(seed)
+    data, codes = simulate(design, n_per_group, n_reps, rng)
+    res = run_pipeline(data, codes, alpha)
+    return n_per_group, res
+
+
+#%% power curve
+
+def power_curve(design, sample_sizes, n_reps=2000, alpha=0.05, seed=0, chunk_size=1000, n_jobs=None):
+    """
+    Estimate power for every sample size (subjects per group).
+    design : output of estimate_design
+    n_reps : simulated datasets per sample size
+    chunk_size : replicates simulated per task (bounds memory per process)
+    n_jobs : worker processes (default: one per CPU, 1 = no pool)
+
+    Returns one row per sample size with the power of the interaction, of the
+    change-score t-test and of both together, plus mean np2 and Cohen's d.
+    """
+    sample_sizes = list(sample_sizes)
+    seeds = np.random.SeedSequence(seed).spawn(len(sample_sizes))
+    tasks = []
+    for n_per_group, ss in zip(sample_sizes, seeds):
+        chunks = [chunk_size] * (n_reps // chunk_size) + ([n_reps % chunk_size] if n_reps % chunk_size else [])
+        for reps, child in zip(chunks, ss.spawn(len(chunks))):
+            tasks.append((design, n_per_group, reps, child, alpha))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        outputs = [_simulate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            outputs = list(pool.map(_simulate_chunk, tasks))
+
+    res = pd.concat([out.assign(n_per_group=n) for n, out in outputs], ignore_index=True)
+    curve = res.groupby('n_per_group').agg(
+        power_interaction=('p_interaction', lambda p: (p < alpha).mean()),
+        power_ttest=('p_ttest', lambda p: (p < alpha).mean()),
+        power_both=('significant', 'mean'),
+        mean_np2=('np2', 'mean'),
+        mean_d=('cohen_d', 'mean'),
+        n_reps=('F', 'size'))
+    return curve.reset_index()
@@ -0,0 +1,216 @@
+"""
+Queryable results store for the statistical outputs of all analysis scripts.
+
+Every test writes one structured record (stage, test, outcome, effect, groups,
+statistic, df, p, effect size, parameters and a hash of the input data) into a
+local SQLite database instead of only being printed. Summaries and tables are then
+assembled from indexed queries without re-running any statistics.
+
+The database is set by SWIMBIKESIT_RESULTS (default: ~/swimbikesit_results.sqlite).
+Re-running a test on the same data with the same parameters replaces its record.
+Every record is tagged with the id of the run (process) that wrote it (RUN_ID, or
+SWIMBIKESIT_RUN if set), so that a run can be told apart from earlier runs.
+
+Usage:
+    import swimbikesit_results as results
+
+    results.record_anova('04a', 'recall', my_aov, data = df_long)
+    results.record('04a', 'welch_t', 'recall', statistic = tstat, df1 = df_, p = pval,
+                   groups = 'bike-sit', effect_size = cohen_d, effect_size_type = 'cohen_d')
+
+    results.query(stage = '04a', effect = 'Interaction')
+"""
+
+import os
+import json
+import sqlite3
+import datetime
+import numpy as np
+import pandas as pd
+
+from swimbikesit_cache import hash_inputs
+
+
+RESULTS_DB = os.environ.get('SWIMBIKESIT_RESULTS', os.path.join(os.path.expanduser('~'), 'swimbikesit_results.sqlite'))
+
+RUN_ID = os.environ.get('SWIMBIKESIT_RUN') or f'{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}'
+
+COLUMNS = ['stage', 'test', 'outcome', 'effect', 'groups', 'statistic', 'df1', 'df2', 'p',
+           'effect_size', 'effect_size_type', 'params', 'input_hash', 'family', 'run_id', 'created']
+
+KEY = ['stage', 'test', 'outcome', 'effect', 'groups']
+
+# filled in later by swimbikesit_correction
+CORRECTION_COLUMNS = {'p_adj': 'REAL', 'correction': 'TEXT'}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id               INTEGER PRIMARY KEY,
+    stage            TEXT NOT NULL,
+    test             TEXT NOT NULL,
+    outcome          TEXT NOT NULL,
+    effect           TEXT NOT NULL DEFAULT '',
+    groups           TEXT NOT NULL DEFAULT '',
+    statistic        REAL,
+    df1              REAL,
+    df2              REAL,
+    p                REAL,
+    effect_size      REAL,
+    effect_size_type TEXT,
+    params           TEXT NOT NULL DEFAULT '{}',
+    input_hash       TEXT NOT NULL DEFAULT '',
+    family           TEXT NOT NULL DEFAULT '',
+    run_id           TEXT NOT NULL DEFAULT '',
+    p_adj            REAL,
+    correction       TEXT,
+    created          TEXT NOT NULL,
+    UNIQUE (stage, test, outcome, effect, groups, params, input_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_results_stage_outcome ON results (stage, outcome);
+CREATE INDEX IF NOT EXISTS idx_results_test ON results (test);
+CREATE INDEX IF NOT EXISTS idx_results_input_hash ON results (input_hash);
+'''
+
+_MIGRATIONS = {'family': "TEXT NOT NULL DEFAULT ''", 'run_id': "TEXT NOT NULL DEFAULT ''", **CORRECTION_COLUMNS}
+
+
+def connect(db=None):
+    """
+    Open (and if necessary create) the results database.
+    db : path to the SQLite file (defaults to RESULTS_DB)
+    """
+    con = sqlite3.connect(db or RESULTS_DB)
+    con.executescript(_SCHEMA)
+    existing = {row[1] for row in con.execute('PRAGMA table_info(results)')}
+    for column, definition in _MIGRATIONS.items():
+        if column not in existing:                  # databases created before the column existed
+            con.execute(f'ALTER TABLE results ADD COLUMN {column} {definition}')
+    con.execute('CREATE INDEX IF NOT EXISTS idx_results_family ON results (family)')
+    return con
+
+
+def _number(value):
+    if value is None:
+        return None
+    value = float(np.asarray(value).squeeze())
+    return None if np.isnan(value) else value
+
+
+def record(stage, test, outcome, statistic=None, df1=None, df2=None, p=None, effect='', groups='',
+           effect_size=None, effect_size_type=None, params=None, data=None, family='', run=None, db=None):
+    """
+    Write one result record.
+    stage : analysis script the result comes from (e.g. '04a')
+    test : name of the test (e.g. 'mixed_anova', 'welch_t', 'mannwhitneyu')
+    outcome : dependent variable (e.g. 'recall', 'NoGo_latency')
+    effect : model term for multi-row tests (e.g. 'Interaction')
+    groups : compared groups (e.g. 'bike-sit')
+    params : dict of test options, stored as JSON
+    data : input data of the test, only its hash is stored
+    family : multiple-comparison family the p-value belongs to (see swimbikesit_correction)
+    run : run id (default RUN_ID of this process)
+    """
+    row = (stage, test, outcome, effect or '', groups or '',
+           _number(statistic), _number(df1), _number(df2), _number(p),
+           _number(effect_size), effect_size_type,
+           json.dumps(params or {}, sort_keys=True, default=str),
+           hash_inputs(data) if data is not None else '',
+           family or '',
+           run or RUN_ID,
+           datetime.datetime.now().isoformat(timespec='seconds'))
+    with connect(db) as con:
+        con.execute(f'INSERT OR REPLACE INTO results ({", ".join(COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * len(COLUMNS))})', row)
+    con.close()
+
+
+def record_anova(stage, outcome, aov, test='mixed_anova', groups='', params=None, data=None, family='', db=None):
+    """
+    Write one record per row (= effect) of a pingouin ANOVA table.
+    Handles the column names of pg.mixed_anova (DF1, DF2) and pg.anova (ddof1, ddof2).
+    family : may contain '{effect}' to put every ANOVA term into its own family
+             (e.g. '04b_{effect}' -> '04b_Interaction')
+    """
+    df1_col = 'DF1' if 'DF1' in aov.columns else 'ddof1'
+    df2_col = 'DF2' if 'DF2' in aov.columns else 'ddof2'
+    for _, row in aov.iterrows():
+        record(stage, test, outcome, statistic=row['F'], df1=row[df1_col], df2=row[df2_col],
+               p=row['p-unc'], effect=row['Source'], groups=groups,
+               effect_size=row.get('np2'), effect_size_type='np2' if 'np2' in row else None,
+               params=params, data=data, family=family.format(effect=row['Source']), db=db)
+
+
+def record_pairwise(stage, table, outcome=None, params=None, data=None, family='', db=None):
+    """
+    Write one record (test 'pairwise_t') per row of a swimbikesit_posthoc.pairwise table.
+    outcome : name to record instead of the outcome column of the table
+    family : may contain '{outcome}' and '{contrast}' to put every outcome x contrast
+             into its own family, as the p_corr of pairwise (e.g. '04b_posthoc_{outcome}_{contrast}')
+    Returns the families written, for swimbikesit_correction.correct.
+    """
+    families = []
+    for _, row in table.iterrows():
+        effect = row['contrast'] if row['level'] == '-' else f"{row['contrast']} ({row['level']})"
+        name = outcome or row['outcome']
+        families.append(family.format(outcome=name, contrast=row['contrast']))
+        record(stage, 'pairwise_t', name, statistic=row['T'], df1=row['dof'], p=row['p_unc'], effect=effect,
+               groups=f"{row['A']}-{row['B']}", effect_size=row['hedges'], effect_size_type='hedges',
+               params={'test': row['test'], **(params or {})}, data=data, family=families[-1], db=db)
+    return list(dict.fromkeys(families))
+
+
+def query(sql=None, args=(), db=None, **filters):
+    """
+    Return results as a DataFrame.
+    Either pass raw SQL (with ? placeholders and args) or column filters,
+    e.g. query(stage = '04a', test = 'mixed_anova'). List values match any element.
+    """
+    if sql is None:
+        clauses, args = [], []
+        for column, value in filters.items():
+            if column not in COLUMNS and column not in CORRECTION_COLUMNS:
+                raise ValueError(f'unknown column: {column}')
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f'{column} IN ({", ".join("?" * len(value))})')
+                args.extend(value)
+            else:
+                clauses.append(f'{column} = ?')
+                args.append(value)
+        where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+        sql = f'SELECT * FROM results{where} ORDER BY stage, outcome, test, effect, groups'
+    con = connect(db)
+    try:
+        return pd.read_sql_query(sql, con, params=list(args))
+    finally:
+        con.close()
+
+
+def latest(db=None, **filters):
+    """
+    Like query, but only keeps the most recent record per stage, test, outcome,
+    effect and groups (i.e. drops results of earlier data versions). The newest
+    record is the one with the highest id (a replaced record gets a new id); the
+    filters are applied after that, so an outdated record never stands in for a
+    newer one that no longer matches them (e.g. after renaming its family).
+    """
+    for column in filters:
+        if column not in COLUMNS and column not in CORRECTION_COLUMNS:
+            raise ValueError(f'unknown column: {column}')
+    res = query(db=db)
+    res = res.sort_values('id').drop_duplicates(KEY, keep='last')
+    for column, value in filters.items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        res = res[res[column].isin(values)]
+    return res.sort_values(['stage', 'outcome', 'test', 'effect', 'groups']).reset_index(drop=True)
+
+
+def summary_table(db=None, **filters):
+    """
+    Compact report table (one row per result) for printing or export.
+    """
+    res = latest(db=db, **filters)
+    res['df'] = res['df1'].map('{:g}'.format, na_action='ignore')
+    both = res['df2'].notna()
+    res.loc[both, 'df'] = res.loc[both, 'df'] + ', ' + res.loc[both, 'df2'].map('{:g}'.format)
+    return res[['stage', 'outcome', 'test', 'effect', 'groups', 'statistic', 'df', 'p', 'p_adj',
+                'correction', 'effect_size_type', 'effect_size']].round(3)
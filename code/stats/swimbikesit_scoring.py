@@ -0,0 +1,122 @@
+"""
+Questionnaire scoring engine driven by instrument definitions.
+
+An instrument maps every scale to its items and defines the response range, the
+reverse-coded items and the minimum number of answered items needed to score a
+scale (proration: the scale mean is taken over the answered items). All
+instruments are scored for all subjects with one masked matrix product over the
+item matrix, so adding instruments or subjects needs no extra code.
+
+Usage:
+    from swimbikesit_scoring import PANAS, NASA_TLX, score, item_descriptives
+
+    scores = score(df, [PANAS, NASA_TLX])              # columns panas_positive, ...
+    items = item_descriptives(df, ['P1', 'P4'], group = 'group')
+"""
+
+import numpy as np
+import pandas as pd
+
+
+#%% instrument definitions
+
+PANAS = {
+    'name': 'panas',
+    'scales': {
+        'positive': ['P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8', 'P9', 'P10'],
+        'negative': ['N1', 'N2', 'N3', 'N4', 'N5', 'N6', 'N7', 'N8', 'N9', 'N10'],
+    },
+    'range': (1, 5),
+    'reverse': [],
+    'min_items': 8,
+}
+
+NASA_TLX = {
+    'name': 'tlx',
+    'scales': {
+        'raw': ['tlx-1', 'tlx-2', 'tlx-3', 'tlx-4', 'tlx-5'],
+    },
+    'range': (0, 10),
+    'reverse': [],
+    'min_items': 4,
+}
+
+
+#%% scoring
+
+def _key(instruments):
+    """
+    Build the item list and the scoring vectors of all instruments.
+    Returns items, key (items x scales 0/1 matrix), scale names, sign & offset for
+    reverse coding and the minimum number of items per scale.
+    """
+    items, columns, min_items = [], [], []
+    for inst in instruments:
+        for scale, scale_items in inst['scales'].items():
+            columns.append(f"{inst['name']}_{scale}")
+            min_items.append(inst.get('min_items', len(scale_items)))
+            for item in scale_items:
+                if item not in items:
+                    items.append(item)
+
+    key = np.zeros((len(items), len(columns)))
+    sign = np.ones(len(items))
+    offset = np.zeros(len(items))
+    col = 0
+    for inst in instruments:
+        low, high = inst['range']
+        for scale_items in inst['scales'].values():
+            for item in scale_items:
+                key[items.index(item), col] = 1
+            col += 1
+        for item in inst.get('reverse', []):
+            sign[items.index(item)] = -1
+            offset[items.index(item)] = low + high
+    return items, key, columns, sign, offset, np.array(min_items)
+
+
+def score(df, instruments, method='mean'):
+    """
+    Score every scale of every instrument for every subject.
+    df : wide table with one row per subject and one column per item
+    instruments : list of instrument definitions (e.g. [PANAS, NASA_TLX])
+    method : 'mean' (mean of answered items) or 'sum' (prorated sum)
+    Returns a DataFrame with one column per scale (<instrument>_<scale>), scales with
+    fewer than min_items answered items are NaN.
+    """
+    items, key, columns, sign, offset, min_items = _key(instruments)
+
+    X = df[items].to_numpy(dtype=float)
+    answered = ~np.isnan(X)
+    X = np.where(answered, X * sign + offset, 0.0)          # reverse coding, missing -> 0
+
+    sums = X @ key
+    counts = answered.astype(float) @ key
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = sums / counts
+    scores[counts < min_items] = np.nan
+    if method == 'sum':
+        scores = scores * key.sum(axis=0)
+    elif method != 'mean':
+        raise ValueError(f"unknown method: {method}")
+
+    return pd.DataFrame(scores, index=df.index, columns=columns)
+
+
+#%% descriptives
+
+def item_descriptives(df, items, group='group', labels=None):
+    """
+    Mean, SD and n of every item per group in one table.
+    items : item columns
+    group : grouping column
+    labels : optional dict item -> readable label (e.g. {'P1': 'active'})
+    """
+    grouped = df.groupby(group, observed=True)[items]
+    table = pd.concat({'n': grouped.count(), 'mean': grouped.mean(), 'sd': grouped.std()}, axis=1)
+    table = table.stack(level=1, future_stack=True).rename_axis([group, 'item']).reset_index()
+    if labels is not None:
+        table.insert(2, 'label', table['item'].map(labels))
+    order = {item: i for i, item in enumerate(items)}
+    table = table.sort_values(['item', group], key=lambda s: s.map(order) if s.name == 'item' else s)
+    return table.reset_index(drop=True)
@@ -0,0 +1,135 @@
+"""
+Signal detection metrics for the Go/NoGo task.
+
+Takes hit, miss, false alarm and correct rejection counts as arrays (e.g. subjects
+x sub-blocks, as written by swimbikesit_behav_GNG_accuracy.m) and computes accuracy,
+hit / false alarm rates, d', criterion c, beta, A' and B'' in one vectorised pass.
+Go trials are the signal: a hit is a response to a Go stimulus, a false alarm a
+response to a NoGo stimulus.
+
+Corrections for hit / false alarm rates of 0 or 1:
+    'none'      : rates as observed (d' becomes infinite)
+    'loglinear' : (count + 0.5) / (trials + 1) for all rates (Hautus, 1995)
+    'half'      : only extreme rates are replaced by 1/(2N) and 1 - 1/(2N)
+    'matlab'    : as swimbikesit_behav_GNG_accuracy.m (hit rate 1 -> (N-1)/N,
+                  false alarm rate 0 -> 1/N), reproduces the existing tables
+
+Usage:
+    from swimbikesit_sdt import read_counts, sdt, to_wide
+
+    ids, counts = read_counts('GoNoGo_acc_all.xlsx')
+    metrics = sdt(**counts, correction = 'loglinear')
+    df = to_wide(metrics, ids)               # d_prime_pre1 ... d_prime_post4, d_prime_pre, d_prime_post
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+CORRECTIONS = ['none', 'loglinear', 'half', 'matlab']
+
+METRICS = ['accuracy', 'hit_rate', 'fa_rate', 'd_prime', 'c', 'beta', 'A_prime', 'B_doubleprime']
+
+BLOCK_COLUMNS = ['pre1', 'pre2', 'post3', 'post4']
+
+
+#%% rates
+
+def _rates(hits, misses, false_alarms, correct_rejections, correction):
+    n_signal = hits + misses
+    n_noise = false_alarms + correct_rejections
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if correction == 'loglinear':
+            H = np.where(n_signal > 0, (hits + 0.5) / (n_signal + 1), np.nan)
+            F = np.where(n_noise > 0, (false_alarms + 0.5) / (n_noise + 1), np.nan)
+            return H, F
+
+        H = hits / n_signal
+        F = false_alarms / n_noise
+        if correction == 'half':
+            H = np.clip(H, 1 / (2 * n_signal), 1 - 1 / (2 * n_signal))
+            F = np.clip(F, 1 / (2 * n_noise), 1 - 1 / (2 * n_noise))
+        elif correction == 'matlab':
+            H = np.where(H == 1, (n_signal - 1) / n_signal, H)
+            F = np.where(F == 0, 1 / n_noise, F)
+        elif correction != 'none':
+            raise ValueError(f"unknown correction: {correction}")
+    return H, F
+
+
+#%% metrics
+
+def sdt(hits, misses, false_alarms, correct_rejections, correction='loglinear'):
+    """
+    Signal detection metrics of every cell of the count arrays.
+    hits, misses, false_alarms, correct_rejections : arrays of equal shape
+    correction : one of CORRECTIONS (see module docstring)
+    Returns a dict metric -> array (keys: METRICS). Cells without trials are NaN.
+    """
+    hits, misses, false_alarms, correct_rejections = (np.asarray(x, dtype=float) for x in
+                                                      (hits, misses, false_alarms, correct_rejections))
+    H, F = _rates(hits, misses, false_alarms, correct_rejections, correction)
+
+    total = hits + misses + false_alarms + correct_rejections
+    with np.errstate(invalid='ignore', divide='ignore'):
+        accuracy = np.where(total > 0, (hits + correct_rejections) / total, np.nan)
+
+        zH, zF = stats.norm.ppf(H), stats.norm.ppf(F)
+        d_prime = zH - zF
+        c = -(zH + zF) / 2
+        beta = np.exp((zF ** 2 - zH ** 2) / 2)
+
+        # non-parametric sensitivity and bias (Grier, 1971), symmetric for H < F
+        diff = H - F
+        sign = np.sign(diff)
+        A_prime = 0.5 + sign * (diff ** 2 + np.abs(diff)) / (4 * np.maximum(H, F) - 4 * H * F)
+        A_prime = np.where(diff == 0, 0.5, A_prime)
+        B_doubleprime = sign * (H * (1 - H) - F * (1 - F)) / (H * (1 - H) + F * (1 - F))
+
+    return {'accuracy': accuracy, 'hit_rate': H, 'fa_rate': F, 'd_prime': d_prime, 'c': c,
+            'beta': beta, 'A_prime': A_prime, 'B_doubleprime': B_doubleprime}
+
+
+#%% input / output
+
+def read_counts(path, id_col='ID'):
+    """
+    Read the counts table of swimbikesit_behav_GNG_accuracy.m (GoNoGo_acc_all.xlsx
+    or a text export of it, with columns Hits_1 ... Hits_4 etc.).
+    Returns (ids, counts) with counts a dict of subjects x sub-blocks arrays, keyed
+    like the arguments of sdt().
+    """
+    if str(path).endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path, sep=None, engine='python')
+    names = {'hits': 'Hits', 'misses': 'Misses', 'false_alarms': 'FalseAlarms',
+             'correct_rejections': 'CorrRejections'}
+    counts = {}
+    for key, name in names.items():
+        columns = sorted((col for col in df.columns if col.startswith(f'{name}_')), key=lambda col: int(col.rsplit('_', 1)[1]))
+        counts[key] = df[columns].to_numpy(dtype=float)
+    return df[id_col].to_numpy(), counts
+
+
+def to_wide(metrics, ids, metric_names=None, blocks=BLOCK_COLUMNS, id_col='ID'):
+    """
+    Wide table of subjects x sub-blocks metrics in the naming of
+    performance_behav.txt: <metric>_pre1 ... <metric>_post4 plus the means over the
+    pre and post sub-blocks (<metric>_pre, <metric>_post, NaN sub-blocks ignored),
+    ready for the standardisation and ANOVA steps.
+    """
+    wide = pd.DataFrame({id_col: ids})
+    is_pre = np.array([block.startswith('pre') for block in blocks])
+    columns = {}
+    for name in metric_names or METRICS:
+        values = np.asarray(metrics[name], dtype=float)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)    # all-NaN rows
+            columns[f'{name}_pre'] = np.nanmean(values[:, is_pre], axis=1)
+            columns[f'{name}_post'] = np.nanmean(values[:, ~is_pre], axis=1)
+        for i, block in enumerate(blocks):
+            columns[f'{name}_{block}'] = values[:, i]
+    return pd.concat([wide, pd.DataFrame(columns)], axis=1)
@@ -0,0 +1,108 @@
+"""
+Sub-block reshaper for the per-block columns of performance_behav.txt.
+
+Every measure comes with four sub-block columns (<measure>_pre1, _pre2, _post3,
+_post4) next to the pre/post summaries used in the main analyses. The column names
+are parsed once into an index and the values are gathered into one
+(subject x measure x sub-block) array, from which long format is produced on demand.
+
+Known inconsistencies of the column names are handled here:
+    - the phase follows from the block number (1, 2 = pre; 3, 4 = post), so
+      accuracy_pre3 / accuracy_pre4 are treated as post blocks
+    - 'instrusions' is read as 'intrusions'
+
+Usage:
+    from swimbikesit_subblocks import to_array, to_long
+
+    blocks = to_array(df)                                   # blocks.values: subjects x measures x 4
+    df_long = to_long(df, id_vars = ['ID', 'Group'], measures = ['recall', 'accuracy'])
+"""
+
+import re
+import functools
+import collections
+import numpy as np
+import pandas as pd
+
+from swimbikesit_trace import traced
+
+
+COLUMN_PATTERN = re.compile(r'^(?P<measure>.+)_(?:pre|post)(?P<block>[1-9])$')
+
+BLOCK_PHASE = {1: 'pre', 2: 'pre', 3: 'post', 4: 'post'}
+
+ALIASES = {'instrusions': 'intrusions'}
+
+SubBlocks = collections.namedtuple('SubBlocks', ['values', 'subjects', 'measures', 'blocks'])
+
+
+#%% column index
+
+@functools.lru_cache(maxsize=32)
+def _parse(columns):
+    """ (column, measure, block) of every sub-block column in columns (a tuple). """
+    entries = []
+    for column in columns:
+        match = COLUMN_PATTERN.match(column)
+        if match is None:
+            continue
+        measure = ALIASES.get(match['measure'], match['measure'])
+        entries.append((column, measure, int(match['block'])))
+    return tuple(entries)
+
+
+def column_index(columns):
+    """
+    Table of all sub-block columns with their measure, block number and phase.
+    The parsing result is cached per set of column names.
+    """
+    index = pd.DataFrame(list(_parse(tuple(columns))), columns=['column', 'measure', 'block'])
+    index['phase'] = index['block'].map(BLOCK_PHASE)
+    return index
+
+
+#%% reshaping
+
+@traced(category='reshape')
+def to_array(df, measures=None, id_col='ID'):
+    """
+    Gather the sub-block columns of df into one array.
+    measures : measures to include (default: all found, in column order)
+    Returns SubBlocks(values, subjects, measures, blocks) with values of shape
+    (subjects x measures x blocks); missing sub-blocks are NaN.
+    """
+    index = column_index(df.columns)
+    if measures is None:
+        measures = list(pd.unique(index['measure']))
+    else:
+        missing = set(measures) - set(index['measure'])
+        if missing:
+            raise ValueError(f'no sub-block columns for: {sorted(missing)}')
+        index = index[index['measure'].isin(measures)]
+    blocks = np.sort(index['block'].unique())
+
+    m = pd.Index(measures).get_indexer(index['measure'])
+    b = np.searchsorted(blocks, index['block'])
+    values = np.full((len(df), len(measures), len(blocks)), np.nan)
+    values[:, m, b] = df[index['column']].to_numpy(dtype=float)
+
+    subjects = df[id_col].to_numpy() if id_col in df.columns else df.index.to_numpy()
+    return SubBlocks(values, subjects, list(measures), blocks)
+
+
+@traced(category='reshape')
+def to_long(df, id_vars=('ID', 'Group'), measures=None):
+    """
+    Long table with one row per subject and sub-block and one column per measure,
+    plus the block number ('Block') and phase ('Phase', categorical pre < post).
+    id_vars : subject-level columns repeated on every row
+    """
+    blocks = to_array(df, measures)
+    n_subjects, _, n_blocks = blocks.values.shape
+
+    long = df[list(id_vars)].iloc[np.repeat(np.arange(n_subjects), n_blocks)].reset_index(drop=True)
+    long['Block'] = np.tile(blocks.blocks, n_subjects)
+    long['Phase'] = pd.Categorical(long['Block'].map(BLOCK_PHASE), categories=['pre', 'post'], ordered=True)
+    values = blocks.values.transpose(0, 2, 1).reshape(n_subjects * n_blocks, -1)
+    long[blocks.measures] = values
+    return long
@@ -0,0 +1,196 @@
+"""
+Single analytic table with all per-subject data of the study.
+
+Joins sub_info, performance_behav, performance_table, the questionnaires, heart
+rate features and the EEG amplitudes / latencies on an integer subject code
+(sports_07 -> 7). Every source is indexed by that code once and joined on the
+index (hash join), so no analysis depends on the row order of the input files.
+Columns of all sources except sub_info and performance_behav carry a source prefix
+(e.g. amp_gng_NoGo_Post, q_P1, words_per_list_1); their ID and group columns and
+columns that repeat a column of an earlier source are dropped.
+
+The table is built once per version of the input files and persisted in the
+swimbikesit cache (rebuilt automatically when a file changes).
+
+Usage:
+    import swimbikesit_tables as tables
+
+    table = tables.load_table('Q:/data/projects/mek_sports01/eegl/derivatives/')
+    cross = tables.select(table, ['group', 'relInt_int', 'recall_pre', 'recall_post', 'lat_gng_NoGo_Post'])
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from swimbikesit_cache import cached
+from swimbikesit_trace import traced
+
+
+#%% sources
+
+# name: (file name candidates, separator, column prefix)
+SOURCES = {
+    'sub_info':       (['sub_info.txt', 'mek_sports01_sub_info.txt'], '\t', ''),
+    'behav':          (['performance_behav.txt'], '\t', ''),
+    'words':          (['performance_table.txt'], '\t', 'words_'),
+    'questionnaires': (['all_questionnaires.txt', 'mek_sports01_all_questionnaires.txt'], '\t', 'q_'),
+    'amp_gng':        (['Amplitudes_GNG.txt'], ',', 'amp_gng_'),
+    'lat_gng':        (['Latencies_GNG.txt'], ',', 'lat_gng_'),
+    'amp_sme':        (['Amplitudes_SME.txt'], ',', 'amp_sme_'),
+}
+
+HR_BLOCKS = ['pre', 'int', 'post']
+
+# bump when the columns derived in _build change, so persisted tables are rebuilt
+TABLE_VERSION = 2
+
+
+def subject_code(ids):
+    """ Integer subject code of IDs like 'sports_07' (-> 7). """
+    return pd.Series(ids).astype(str).str.extract(r'(\d+)\s*$', expand=False).astype(int).to_numpy()
+
+
+def _find(directories, candidates):
+    for directory in directories:
+        for file_name in candidates:
+            path = os.path.join(directory, file_name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+
+def _read(path, sep):
+    """ Read one source and index it by subject code. """
+    df = pd.read_csv(path, sep=sep)
+    df = df.dropna(subset=['ID'])
+    df = df[df['ID'].astype(str).str.contains(r'\d')]
+    df.index = pd.Index(subject_code(df['ID']), name='subject')
+    if df.index.has_duplicates:
+        raise ValueError(f'duplicate subject IDs in {path}')
+    return df
+
+
+#%% heart rate
+
+def hr_features(sub_info, hr_dir=None):
+    """
+    Heart rate features per subject.
+    From sub_info: HR_max (208 - 0.7 * age) and the relative intensity
+    relInt_<block> = hr_<block> / HR_max * 100 of the pre, int and post blocks.
+    hr_dir : optional directory with one folder per subject holding the HRM csv
+             files (pre, int, post in sorted order, as in 01); adds the mean and
+             max heart rate per block (hr_mean_<block>, hr_peak_<block>) and the
+             share of samples without a heart rate (hr_dropout_<block>).
+    """
+    hr = pd.DataFrame(index=sub_info.index)
+    hr['HR_max'] = 208 - sub_info['age'] * 0.7
+    for block in HR_BLOCKS:
+        hr[f'relInt_{block}'] = sub_info[f'hr_{block}'] / hr['HR_max'] * 100
+
+    if hr_dir is not None:
+        for subject, sub in sub_info['ID'].items():
+            sub_path = os.path.join(hr_dir, sub)
+            if not os.path.isdir(sub_path):
+                continue
+            files = sorted(f for f in os.listdir(sub_path) if f.endswith('.csv'))[:3]
+            for block, file_name in zip(HR_BLOCKS, files):
+                recording = pd.read_csv(os.path.join(sub_path, file_name), sep=',')
+                series = recording.iloc[:, 1].dropna()
+                hr.loc[subject, f'hr_mean_{block}'] = series.mean()
+                hr.loc[subject, f'hr_peak_{block}'] = series.max()
+                hr.loc[subject, f'hr_dropout_{block}'] = 1 - len(series) / len(recording)
+    return hr
+
+
+#%% build
+
+def _build(paths, signatures, hr_dir, hr_signature, version=TABLE_VERSION):
+    """ Join all sources on the subject code (signatures and version only key the cache). """
+    table = None
+    for name, path in paths.items():
+        _, sep, prefix = SOURCES[name]
+        df = _read(path, sep)
+        if name == 'sub_info':
+            df = df.join(hr_features(df, hr_dir))
+        if table is None:
+            table = df
+            continue
+        drop = ['ID']
+        if prefix:
+            drop += [col for col in ('Group', 'group') if col in df.columns]
+        df = df.drop(columns=drop).add_prefix(prefix)
+        df = df.drop(columns=[col for col in df.columns if col in table.columns])
+        table = table.join(df, how='outer')
+    return table.sort_index()
+
+
+_build_cached = cached(_build, name='analytic_table')
+
+
+@traced(category='ingest')
+def load_table(directories, hr_dir=None, sources=None, rebuild=False):
+    """
+    Return the analytic table (one row per subject, index = integer subject code).
+    directories : directory or list of directories holding the source files
+    hr_dir : optional raw data directory with the per-subject HRM files
+    sources : names of SOURCES to include (default: all that are found)
+    rebuild : build the table even if a persisted version exists
+    """
+    if isinstance(directories, str):
+        directories = [directories]
+    paths = {}
+    for name in sources or SOURCES:
+        path = _find(directories, SOURCES[name][0])
+        if path is None:
+            if sources is not None:
+                raise FileNotFoundError(f'no file for source {name} in {directories}')
+            continue
+        paths[name] = path
+    if 'sub_info' not in paths:
+        raise FileNotFoundError(f'sub_info is needed to build the table (searched {directories})')
+    paths = {'sub_info': paths.pop('sub_info'), **paths}
+
+    signatures = [_signature(path) for path in paths.values()]
+    hr_signature = None
+    if hr_dir is not None:
+        hr_signature = [_signature(os.path.join(root, f)) for root, _, files in sorted(os.walk(hr_dir))
+                        for f in sorted(files) if f.endswith('.csv')]
+    if rebuild:
+        return _build(paths, signatures, hr_dir, hr_signature)
+    return _build_cached(paths, signatures, hr_dir, hr_signature, TABLE_VERSION)
+
+
+#%% queries
+
+def select(table, columns=None, subjects=None, where=None):
+    """
+    Column projection (and optional row selection) of the analytic table.
+    columns : columns to keep (default: all)
+    subjects : subject codes or IDs ('sports_07') to keep
+    where : boolean mask or query string evaluated on the table (e.g. "group != 'swim'")
+    """
+    rows = np.ones(len(table), dtype=bool)
+    if subjects is not None:
+        codes = subject_code(subjects) if not np.issubdtype(np.asarray(subjects).dtype, np.integer) else subjects
+        rows &= table.index.isin(codes)
+    if where is not None:
+        rows &= table.eval(where).to_numpy() if isinstance(where, str) else np.asarray(where, dtype=bool)
+    if columns is None:
+        return table.loc[rows]
+    return table.loc[rows, list(columns)]
+
+
+@traced(category='reshape')
+def change_scores(df_long, value, block, pre, post, subject='ID'):
+    """
+    Post - pre difference per subject of a long table, keyed by subject
+    (use e.g. df['ID'].map(change) to attach it without relying on row order).
+    """
+    wide = df_long.pivot_table(index=subject, columns=block, values=value, observed=True)
+    return wide[post] - wide[pre]
@@ -0,0 +1,255 @@
+"""
+Low-overhead timing instrumentation of the analysis pipeline.
+
+Spans (context manager `span` or decorator `traced`) record wall time, CPU time,
+the number of rows of the result and, for functions wrapped with
+swimbikesit_cache.cached, whether the cache was hit. The spans can be exported as
+Chrome trace JSON (open in chrome://tracing or https://ui.perfetto.dev) and
+summarised per span name.
+
+Without touching the scripts, enable() also wraps the usual hot spots of the
+pipeline (CSV parsing, melt / concat / merge, pingouin tests, seaborn plots with
+their bootstrapped CIs and savefig) in spans, grouped into the stages ingest,
+reshape, stats and plot.
+
+Tracing is off by default; span() then returns a shared no-op object and traced
+functions only check one flag, so the instrumentation can stay in place. Set
+SWIMBIKESIT_TRACE to a file name (e.g. trace.json) to trace a whole run: the trace
+is written and the summary printed when Python exits.
+
+Usage:
+    import swimbikesit_trace as trace
+
+    trace.enable()
+    with trace.span('load', 'ingest') as s:
+        df = pd.read_csv(path, sep = '\t')
+        s.set(rows = len(df))
+    trace.summary()
+    trace.write_chrome_trace('trace.json')
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+import importlib
+import pandas as pd
+
+
+ENV_VAR = 'SWIMBIKESIT_TRACE'
+
+# stage: callables wrapped by enable() ('module.attribute' or 'module.Class.method')
+TARGETS = {
+    'ingest':  ['pandas.read_csv', 'pandas.read_excel'],
+    'reshape': ['pandas.melt', 'pandas.concat', 'pandas.merge', 'pandas.DataFrame.merge', 'pandas.DataFrame.pivot_table'],
+    'stats':   ['pingouin.mixed_anova', 'pingouin.rm_anova', 'pingouin.anova', 'pingouin.pairwise_tests',
+                'pingouin.pairwise_ttests', 'pingouin.ttest', 'pingouin.normality', 'pingouin.homoscedasticity',
+                'pingouin.sphericity', 'scipy.stats.pearsonr', 'scipy.stats.ttest_ind'],
+    'plot':    ['seaborn.barplot', 'seaborn.pointplot', 'seaborn.lineplot', 'seaborn.kdeplot', 'seaborn.violinplot',
+                'seaborn.stripplot', 'seaborn.regplot', 'matplotlib.figure.Figure.savefig'],
+}
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = time.perf_counter_ns()
+_patched = {}
+
+
+#%% spans
+
+class _Span:
+    """ One timed region; becomes a Chrome trace 'complete' event on exit. """
+    __slots__ = ('name', 'category', 'args', '_wall', '_cpu')
+
+    def __init__(self, name, category, args):
+        self.name, self.category, self.args = name, category, args
+
+    def set(self, **args):
+        """ Attach values to the span, e.g. rows = len(df) or cache = 'hit'. """
+        self.args.update(args)
+
+    def __enter__(self):
+        self._cpu = time.thread_time_ns()
+        self._wall = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter_ns() - self._wall
+        cpu = time.thread_time_ns() - self._cpu
+        event = {'name': self.name, 'cat': self.category, 'ph': 'X',
+                 'ts': (self._wall - _origin) / 1000, 'dur': wall / 1000,
+                 'pid': os.getpid(), 'tid': threading.get_ident(),
+                 'args': dict(self.args, cpu_ms=cpu / 1e6)}
+        with _lock:
+            _events.append(event)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+def span(name, category='', **args):
+    """
+    Context manager timing the enclosed block (no-op while tracing is disabled).
+    category : pipeline stage, e.g. 'ingest', 'reshape', 'stats', 'plot'
+    args : values stored with the span (rows, cache, ...); more can be added with .set()
+    """
+    if not _enabled:
+        return _NULL
+    return _Span(name, category, args)
+
+
+def _rows(result):
+    """ Number of rows of DataFrame / Series / array results, else None. """
+    shape = getattr(result, 'shape', None)
+    return shape[0] if shape else None
+
+
+def traced(func=None, *, name=None, category=''):
+    """
+    Decorator timing every call of func, with the number of rows of its result.
+    Can be used as @traced, @traced(category='stats') or traced(func, name='...').
+    """
+    if func is None:
+        return functools.partial(traced, name=name, category=category)
+    label = name or getattr(func, '__qualname__', getattr(func, '__name__', 'call'))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _Span(label, category, {}) as s:
+            result = func(*args, **kwargs)
+            rows = _rows(result)
+            if rows is not None:
+                s.args['rows'] = rows
+        return result
+
+    return wrapper
+
+
+#%% switching on / off
+
+def _resolve(target):
+    """ Owner object and attribute name of 'module.attr' or 'module.Class.attr'. """
+    parts = target.split('.')
+    for split in range(len(parts) - 1, 0, -1):
+        try:
+            owner = importlib.import_module('.'.join(parts[:split]))
+        except ImportError:
+            continue
+        for part in parts[split:-1]:
+            owner = getattr(owner, part)
+        return owner, parts[-1]
+    raise ImportError(target)
+
+
+def _patch(targets):
+    for category, names in targets.items():
+        for target in names:
+            if target in _patched:
+                continue
+            try:
+                owner, attr = _resolve(target)
+                original = getattr(owner, attr)
+            except (ImportError, AttributeError):
+                continue
+            setattr(owner, attr, traced(original, name=target, category=category))
+            _patched[target] = (owner, attr, original)
+
+
+def _unpatch():
+    for owner, attr, original in _patched.values():
+        setattr(owner, attr, original)
+    _patched.clear()
+
+
+def enable(targets=TARGETS):
+    """
+    Switch tracing on and wrap the pipeline hot spots in spans.
+    targets : dict stage -> callables to wrap (None = wrap nothing)
+    Functions imported with 'from module import name' before enable() keep their
+    unwrapped version.
+    """
+    global _enabled
+    _enabled = True
+    if targets:
+        _patch(targets)
+
+
+def disable():
+    """ Switch tracing off and restore the wrapped functions. """
+    global _enabled
+    _enabled = False
+    _unpatch()
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """ Discard all recorded spans. """
+    with _lock:
+        _events.clear()
+
+
+#%% export
+
+def events():
+    """ Recorded spans as Chrome trace events (list of dicts). """
+    with _lock:
+        return list(_events)
+
+
+def write_chrome_trace(path):
+    """ Write the spans as Chrome trace JSON. """
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events(), 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+def summary(sort='wall_ms'):
+    """
+    One row per span name: stage, calls, total / mean / max wall time and total CPU
+    time in ms, total rows and cache hits / misses.
+    """
+    rows = [{'name': e['name'], 'stage': e['cat'], 'wall_ms': e['dur'] / 1000, 'cpu_ms': e['args']['cpu_ms'],
+             'rows': e['args'].get('rows'), 'hit': e['args'].get('cache') == 'hit',
+             'miss': e['args'].get('cache') == 'miss'} for e in events()]
+    columns = ['stage', 'calls', 'wall_ms', 'mean_ms', 'max_ms', 'cpu_ms', 'rows', 'cache_hits', 'cache_misses']
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(rows)
+    table = df.groupby('name').agg(stage=('stage', 'first'), calls=('wall_ms', 'size'), wall_ms=('wall_ms', 'sum'),
+                                   mean_ms=('wall_ms', 'mean'), max_ms=('wall_ms', 'max'), cpu_ms=('cpu_ms', 'sum'),
+                                   rows=('rows', 'sum'), cache_hits=('hit', 'sum'), cache_misses=('miss', 'sum'))
+    return table[columns].sort_values(sort, ascending=False)
+
+
+def _write_at_exit(path):
+    write_chrome_trace(path)
+    print(summary().round(2).to_string(), file=sys.stderr)
+    print(f'trace written to {path}', file=sys.stderr)
+
+
+if os.environ.get(ENV_VAR):
+    enable()
+    atexit.register(_write_at_exit, os.environ[ENV_VAR])
@@ -0,0 +1,15 @@
+"""
+The analysis modules live flat in code/stats (the scripts import them by name), so
+the tests put that directory on the import path. The disk cache and the results
+store are redirected to a temporary directory so tests never touch the real ones.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix='swimbikesit_tests_')
+os.environ['SWIMBIKESIT_CACHE'] = os.path.join(_tmp, 'cache')
+os.environ['SWIMBIKESIT_RESULTS'] = os.path.join(_tmp, 'results.sqlite')
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import pytest
+from scipy import stats
+
+import swimbikesit_assumptions as assumptions
+
+
+GROUPS = ['sit', 'bike', 'swim']
+
+
+def _wide(rng, n=(14, 17, 20), levels=('pre', 'post')):
+    labels = np.repeat(GROUPS, n)
+    df = pd.DataFrame({'ID': [f'sports_{i:02d}' for i in range(len(labels))], 'Group': labels})
+    for outcome, skew in (('x', 0), ('y', 4)):
+        for level in levels:
+            df[f'{outcome}_{level}'] = rng.normal(size=len(df)) + skew * rng.exponential(size=len(df))
+    df.loc[3, 'y_post'] = np.nan                            # missing a level: left out of that outcome
+    return df
+
+
+def _change(df, outcome, group):
+    complete = df.loc[df['Group'] == group, [f'{outcome}_pre', f'{outcome}_post']].dropna()
+    return complete[f'{outcome}_post'] - complete[f'{outcome}_pre']
+
+
+def _row(table, outcome, level, group, check):
+    rows = table.loc[(table['outcome'] == outcome) & (table['level'] == level) & (table['group'] == group)
+                     & (table['check'] == check)]
+    assert len(rows) == 1
+    return rows.iloc[0]
+
+
+def test_normality_matches_scipy():
+    df = _wide(np.random.default_rng(0))
+    table = assumptions.check_wide(df, ['x', 'y'], groups=GROUPS)
+    for outcome in ['x', 'y']:
+        for group in GROUPS:
+            sample = _change(df, outcome, group)
+            row = _row(table, outcome, 'change', group, 'shapiro')
+            assert row['n'] == len(sample)
+            assert row['statistic'] == pytest.approx(stats.shapiro(sample).statistic)
+            assert row['p'] == pytest.approx(stats.shapiro(sample).pvalue)
+            row = _row(table, outcome, 'change', group, 'dagostino')
+            assert row['statistic'] == pytest.approx(stats.normaltest(sample).statistic)
+            assert row['p'] == pytest.approx(stats.normaltest(sample).pvalue)
+            row = _row(table, outcome, 'change', group, 'skew')
+            assert row['statistic'] == pytest.approx(stats.skew(sample))
+            assert row['p'] == pytest.approx(stats.skewtest(sample).pvalue)
+            row = _row(table, outcome, 'change', group, 'kurtosis')
+            assert row['statistic'] == pytest.approx(stats.kurtosis(sample))
+            assert row['p'] == pytest.approx(stats.kurtosistest(sample).pvalue)
+
+
+@pytest.mark.parametrize('check, center', [('levene', 'mean'), ('brown_forsythe', 'median')])
+def test_homoscedasticity_matches_scipy(check, center):
+    df = _wide(np.random.default_rng(1))
+    table = assumptions.check_wide(df, ['x', 'y'], groups=GROUPS)
+    for outcome in ['x', 'y']:
+        ref = stats.levene(*[_change(df, outcome, g) for g in GROUPS], center=center)
+        row = _row(table, outcome, 'change', 'all', check)
+        assert row['statistic'] == pytest.approx(ref.statistic)
+        assert row['p'] == pytest.approx(ref.pvalue)
+
+
+def test_mauchly_matches_pingouin():
+    # one group, so the pooled within-group covariance is the sample covariance
+    levels = ('t1', 't2', 't3')
+    rng = np.random.default_rng(2)
+    df = _wide(rng, n=(25, 0, 0), levels=levels)
+    df['x_t3'] += 3 * df['x_t1']                              # unequal variances of the differences
+    table = assumptions.check_wide(df, ['x'], levels=levels, groups=['sit'])
+    row = _row(table, 'x', 'all', 'all', 'mauchly')
+    data = df[[f'x_{level}' for level in levels]]
+    ref = pg.sphericity(data)
+    assert row['statistic'] == pytest.approx(ref.W)
+    assert row['df1'] == ref.dof
+    assert row['p'] == pytest.approx(ref.pval)
+    assert row['epsilon'] == pytest.approx(pg.epsilon(data, correction='gg'))
+
+
+def test_robust_interaction_matches_references():
+    df = _wide(np.random.default_rng(3))
+    models = pd.DataFrame({'model': ['welch_anova', 'kruskal']}, index=pd.Index(['x', 'y'], name='outcome'))
+    table = assumptions.robust_interaction(df, ['x', 'y'], models, groups=GROUPS).set_index('outcome')
+
+    change = pd.concat([_change(df, 'x', g).rename('change').to_frame().assign(Group=g) for g in GROUPS])
+    ref = pg.welch_anova(data=change, dv='change', between='Group').iloc[0]
+    assert table.loc['x', 'test'] == 'welch_anova'
+    assert table.loc['x', 'statistic'] == pytest.approx(ref['F'])
+    assert table.loc['x', 'df2'] == pytest.approx(ref['ddof2'])
+    assert table.loc['x', 'p'] == pytest.approx(ref['p-unc'])
+    assert table.loc['x', 'effect_size'] == pytest.approx(ref['np2'])
+
+    ref = stats.kruskal(*[_change(df, 'y', g) for g in GROUPS])
+    assert table.loc['y', 'test'] == 'kruskal'
+    assert table.loc['y', 'n'] == len(df) - 1
+    assert table.loc['y', 'statistic'] == pytest.approx(ref.statistic)
+    assert table.loc['y', 'p'] == pytest.approx(ref.pvalue)
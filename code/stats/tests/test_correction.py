@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from statsmodels.stats.multitest import multipletests
+
+import swimbikesit_results as results
+import swimbikesit_correction as correction
+
+
+@pytest.mark.parametrize('method', ['bonferroni', 'holm', 'fdr_bh', 'fdr_by'])
+def test_adjust_matches_statsmodels(method):
+    rng = np.random.default_rng(0)
+    p = np.concatenate([rng.uniform(size=12) ** 3, [0.01, 0.01, 0.5]])   # includes ties
+    family = np.array(['a', 'b', 'c'])[rng.integers(0, 3, size=len(p))]
+    adjusted = correction.adjust(p, family, method)
+    for label in np.unique(family):
+        rows = family == label
+        assert adjusted[rows] == pytest.approx(multipletests(p[rows], method=method)[1])
+
+
+def test_maxt_adjust():
+    null = np.array([[0.5, 1.0], [2.5, 0.1], [3.0, 0.2], [0.1, 0.3]])
+    # max |null| per permutation: 1.0, 2.5, 3.0, 0.3
+    assert correction.maxt_adjust([2.0, -1.0], null) == pytest.approx([3 / 5, 4 / 5])
+
+
+def _record(db, outcome, p, family, run, params=None):
+    results.record('99', 't', outcome, p=p, family=family, run=run, params=params, db=db)
+
+
+def test_correct_only_uses_records_of_the_run(tmp_path):
+    db = str(tmp_path / 'results.sqlite')
+    _record(db, 'old', 0.01, 'fam', run='earlier')           # left over from an earlier run
+    _record(db, 'a', 0.01, 'fam', run='current')
+    _record(db, 'b', 0.04, 'fam', run='current')
+    res = correction.correct('bonferroni', families=['fam'], run='current', db=db)
+    assert list(res['outcome']) == ['a', 'b']
+    assert res['p_adj'].tolist() == pytest.approx([0.02, 0.08])
+    assert len(correction.correct('bonferroni', families=['fam'], run='all', db=db)) == 3
+
+
+def test_latest_filters_after_dedup(tmp_path):
+    db = str(tmp_path / 'results.sqlite')
+    _record(db, 'a', 0.01, 'old_name', run='r1', params={'v': 1})
+    _record(db, 'a', 0.03, 'new_name', run='r1', params={'v': 2})  # same key, family renamed
+    assert results.latest(db=db, family='old_name').empty
+    assert results.latest(db=db, family='new_name')['p'].tolist() == [0.03]
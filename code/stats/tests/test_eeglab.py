@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import swimbikesit_eeglab as eeglab
+
+
+SRATE, XMIN = 250.0, -0.2                                    # 4 ms samples, epochs from -200 ms
+LABELS = ['Fz', 'Cz', 'Pz', 'P3', 'P4']
+
+
+def _epochs(rng, trials, pnts=300):
+    return rng.normal(size=(len(LABELS), pnts, trials)).astype(np.float32)
+
+
+def _reference(data, channels, window, peak):
+    """ Window mean and peak latency of the ROI ERP, straight from the array. """
+    times = np.round((XMIN + np.arange(data.shape[1]) / SRATE) * 1000, 6)
+    erp = data[[LABELS.index(c) for c in channels]].mean(axis=2).mean(axis=0)
+    inside = (times >= window[0]) & (times <= window[1])
+    segment = erp[inside]
+    position = segment.argmax() if peak == 'max' else segment.argmin()
+    return segment.mean(), times[inside][position]
+
+
+def test_write_set_round_trip(tmp_path):
+    data = _epochs(np.random.default_rng(0), trials=7)
+    path = str(tmp_path / 'sub_circle_pre.set')
+    eeglab.write_set(path, data, SRATE, XMIN, LABELS)
+
+    header = eeglab.read_header(path)
+    assert (header['nbchan'], header['pnts'], header['trials']) == data.shape
+    assert header['srate'] == SRATE
+    assert header['labels'] == LABELS
+    assert header['times'][:3] == pytest.approx([-200, -196, -192])
+    np.testing.assert_array_equal(eeglab.open_data(header), data)
+
+    trials = eeglab.roi_trials(eeglab.open_data(header), header, ['P3', 'Pz', 'P4'], (440, 840))
+    inside = (header['times'] >= 440) & (header['times'] <= 840)
+    expected = data[[3, 2, 4]][:, inside].mean(axis=(0, 1))
+    assert trials == pytest.approx(expected, rel=1e-5)
+
+
+def test_build_tables_matches_numpy(tmp_path):
+    rng = np.random.default_rng(1)
+    written = {}
+    for subject, n_trials in (('sports_01', 12), ('sports_02', 9)):
+        (tmp_path / subject).mkdir()
+        for token, condition in eeglab.GNG['tokens'].items():
+            for block_token, block in eeglab.BLOCK_TOKENS.items():
+                data = _epochs(rng, n_trials)
+                eeglab.write_set(str(tmp_path / subject / f'{subject}_{token}_{block_token}.set'),
+                                 data, SRATE, XMIN, LABELS)
+                written[subject, condition, block] = data
+
+    tables = eeglab.build_tables(str(tmp_path), eeglab.GNG, groups={'sports_01': 'sit', 'sports_02': 'bike'})
+    assert list(tables['amplitudes']['Group']) == ['sit', 'bike']
+    for (subject, condition, block), data in written.items():
+        component = eeglab.GNG['components'][condition]
+        amplitude, _ = _reference(data, component['channels'], component['window'], component['peak'])
+        _, latency = _reference(data, component['channels'], component.get('latency_window', component['window']),
+                                component['peak'])
+        row = tables['amplitudes']['ID'] == subject
+        column = f'{condition}_{block}'
+        assert tables['amplitudes'].loc[row, column].item() == pytest.approx(amplitude, rel=1e-5)
+        assert tables['latencies'].loc[row, column].item() == pytest.approx(latency)
+        assert tables['trials'].loc[row, column].item() == data.shape[2]
+
+
+def test_nogo_latency_in_first_pass_window(tmp_path):
+    # N2 peak at 236 ms (inside 220-300, before the 244-324 amplitude window) and a
+    # deeper trough at 310 ms that only the amplitude window contains
+    times = np.round((XMIN + np.arange(300) / SRATE) * 1000, 6)
+    erp = -3 * np.exp(-((times - 236) / 8) ** 2) - 5 * np.exp(-((times - 310) / 4) ** 2)
+    data = np.zeros((len(LABELS), len(times), 4), dtype=np.float32)
+    data[LABELS.index('Fz')] = erp[:, None]
+    (tmp_path / 'sports_01').mkdir()
+    eeglab.write_set(str(tmp_path / 'sports_01' / 'sports_01_circle_pre.set'), data, SRATE, XMIN, LABELS)
+
+    tables = eeglab.build_tables(str(tmp_path), eeglab.GNG)
+    assert tables['latencies'].loc[0, 'NoGo_Pre'] == pytest.approx(236)
+    inside = (times >= 244) & (times <= 324)
+    assert tables['amplitudes'].loc[0, 'NoGo_Pre'] == pytest.approx(erp[inside].mean(), rel=1e-5)
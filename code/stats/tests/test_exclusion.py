@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+import swimbikesit_exclusion as exclusion
+
+
+def _table():
+    return pd.DataFrame({'ID': [f'sports_{i:02d}' for i in range(1, 7)],
+                         'Group': ['sit', 'sit', 'sit', 'bike', 'bike', 'bike'],
+                         'accuracy_pre': [0.9, 0.4, 0.8, 0.7, np.nan, 0.3],
+                         'accuracy_post': [0.8, 0.9, 0.45, 0.6, 0.9, 0.2],
+                         'recall_pre': [10, 12, 11, np.nan, 9, 8],
+                         'recall_post': [11, 13, 12, np.nan, 10, 9]})
+
+
+def test_apply_matches_evaluate_and_audit():
+    df = _table()
+    rules = [exclusion.ACCURACY, exclusion.NO_BEHAV]
+    kept, audit = exclusion.apply(df, rules)
+    matrix = exclusion.evaluate(df, rules)
+    assert list(kept['ID']) == ['sports_01', 'sports_05']
+    assert matrix.to_dict('list') == {'accuracy': [False, True, True, False, False, True],
+                                      'no_behav': [False, False, False, True, False, False]}
+    pd.testing.assert_frame_equal(audit, exclusion.audit(df, rules))
+    assert list(zip(audit['ID'], audit['column'])) == [
+        ('sports_02', 'accuracy_pre'), ('sports_03', 'accuracy_post'), ('sports_04', 'recall_pre'),
+        ('sports_04', 'recall_post'), ('sports_06', 'accuracy_pre'), ('sports_06', 'accuracy_post')]
+
+
+def test_excluded_ids():
+    assert exclusion.excluded_ids(_table(), [exclusion.NO_BEHAV]) == ['sports_04']
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from swimbikesit_nonparametric import mannwhitney_batch, kruskal_batch
+
+
+SIZES = [(3, 3), (3, 40), (5, 30), (8, 8), (8, 9), (9, 7), (9, 9), (12, 25), (30, 5)]
+
+
+def _table(n1, n2, rng, discrete=False):
+    values = rng.integers(1, 6, size=(n1 + n2, 3)) if discrete else rng.normal(size=(n1 + n2, 3))
+    df = pd.DataFrame(values.astype(float), columns=['x', 'y', 'z'])
+    df['group'] = ['a'] * n1 + ['b'] * n2
+    df.loc[0, 'y'] = np.nan                                  # missing values are left out per item
+    return df
+
+
+@pytest.mark.parametrize('alternative', ['two-sided', 'greater', 'less'])
+@pytest.mark.parametrize('discrete', [False, True])
+@pytest.mark.parametrize('n1, n2', SIZES)
+def test_mannwhitney_matches_scipy(n1, n2, discrete, alternative):
+    df = _table(n1, n2, np.random.default_rng(n1 * 100 + n2), discrete)
+    table = mannwhitney_batch(df, ['x', 'y', 'z'], 'group', [('a-b', ['a'], ['b'])], alternative=alternative)
+    for row in table.itertuples():
+        a = df.loc[df['group'] == 'a', row.item].dropna()
+        b = df.loc[df['group'] == 'b', row.item].dropna()
+        ref = stats.mannwhitneyu(a, b, alternative=alternative, method='auto')
+        assert row.U == pytest.approx(ref.statistic)
+        assert row.p == pytest.approx(ref.pvalue, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize('discrete', [False, True])
+def test_kruskal_matches_scipy(discrete):
+    rng = np.random.default_rng(1)
+    df = _table(12, 15, rng, discrete)
+    df.loc[20:, 'group'] = 'c'
+    table = kruskal_batch(df, ['x', 'y', 'z'], 'group')
+    for row in table.itertuples():
+        ref = stats.kruskal(*[df.loc[df['group'] == g, row.item].dropna() for g in ['a', 'b', 'c']])
+        assert row.H == pytest.approx(ref.statistic)
+        assert row.p == pytest.approx(ref.pvalue)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import pytest
+
+import swimbikesit_correction as correction
+import swimbikesit_results as results
+from swimbikesit_posthoc import from_long, from_wide, pairwise
+
+
+def _long(n, rng):
+    rows = []
+    for group, size, shift in zip(['sit', 'bike', 'swim'], n, [0, 0.5, 1]):
+        for s in range(size):
+            subject = rng.normal()
+            for block, effect in zip(['pre', 'int', 'post'], [0, shift, 0.3]):
+                rows.append((f'{group}_{s:02d}', group, block, subject + effect + rng.normal()))
+    data = pd.DataFrame(rows, columns=['ID', 'group', 'block', 'HF'])
+    data['block'] = pd.Categorical(data['block'], categories=['pre', 'int', 'post'], ordered=True)
+    data['group'] = pd.Categorical(data['group'], categories=['sit', 'bike', 'swim'], ordered=True)
+    return data
+
+
+@pytest.mark.parametrize('n', [(12, 12, 12), (10, 14, 17)])
+def test_pairwise_matches_pingouin(n):
+    data = _long(n, np.random.default_rng(sum(n)))
+    table = pairwise(from_long(data, dv='HF', within='block', between='group', subject='ID'),
+                     test='auto', padjust='bonferroni')
+    ref = pg.pairwise_tests(data=data, dv='HF', within='block', between='group', subject='ID',
+                            padjust='bonferroni', effsize='hedges')
+    assert len(table) == len(ref)
+    assert list(table['A'].astype(str)) == list(ref['A'].astype(str))
+    assert list(table['B'].astype(str)) == list(ref['B'].astype(str))
+    assert np.allclose(table['T'].astype(float), ref['T'].astype(float))
+    assert np.allclose(table['dof'].astype(float), ref['dof'].astype(float))
+    assert np.allclose(table['p_unc'].astype(float), ref['p-unc'].astype(float))
+    assert np.allclose(table['p_corr'].astype(float), ref['p-corr'].astype(float))
+    assert np.allclose(table['hedges'].astype(float), ref['hedges'].astype(float))
+
+
+def test_baseline_contrasts_left_out():
+    data = _long((10, 14, 17), np.random.default_rng(0))
+    df = data.astype({'group': str, 'block': str}).pivot(index=['ID', 'group'], columns='block', values='HF')
+    df = df.add_prefix('HF_').reset_index().rename(columns={'group': 'Group'})
+    cells = from_wide(df, ['HF'], levels=['pre', 'int', 'post'], groups=['sit', 'bike', 'swim'], standardize=True)
+
+    full = pairwise(cells)
+    interaction = full['contrast'] == 'Block * Group'
+    assert np.allclose(full.loc[interaction & (full['level'] == 'pre'), 'T'].astype(float), 0)
+
+    table = pairwise(cells, baseline='pre')
+    assert len(table) == len(full) - 3
+    assert 'pre' not in set(table.loc[table['contrast'] == 'Block * Group', 'level'])
+    # the correction family of the interaction shrinks with the left-out contrasts
+    kept = table.loc[table['contrast'] == 'Block * Group']
+    assert np.allclose(kept['p_corr'], np.minimum(kept['p_unc'] * 6, 1))
+
+
+def test_recorded_p_adj_matches_p_corr():
+    data = _long((10, 14, 17), np.random.default_rng(1))
+    table = pairwise(from_long(data, dv='HF', within='block', between='group', subject='ID'))
+    families = results.record_pairwise('01', table, params={'padjust': 'bonferroni'}, data=data,
+                                       family='01_posthoc_{contrast}')
+    assert families == ['01_posthoc_block', '01_posthoc_group', '01_posthoc_block * group']
+
+    correction.correct('bonferroni', families=families)
+    stored = results.query(stage='01', test='pairwise_t').set_index(['effect', 'groups'])
+    for row in table.itertuples():
+        effect = row.contrast if row.level == '-' else f'{row.contrast} ({row.level})'
+        assert stored.loc[(effect, f'{row.A}-{row.B}'), 'p_adj'] == pytest.approx(row.p_corr)